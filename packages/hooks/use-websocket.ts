@@ -10,12 +10,23 @@ interface WSEvent {
   port: string
   commodity: string
   timestamp: string
+  seq?: number
+  op?: "insert" | "update" | "delete"
 }
 
+const RECONNECT_DELAY_MS = 3000
+// After a gap in the change sequence, resume almost at once
+const RESUME_DELAY_MS = 250
+
 export function useWebSocket(url?: string) {
   const [lastEvent, setLastEvent] = useState<WSEvent | null>(null)
   const [isConnected, setIsConnected] = useState(false)
+  // Bumped when the server no longer has the changes missed while disconnected:
+  // refetch /api/events, and the stream carries on from there
+  const [resetCount, setResetCount] = useState(0)
   const wsRef = useRef<WebSocket | null>(null)
+  // Latest change sequence number seen; sent as `since` on reconnect so only the delta is replayed
+  const lastSeqRef = useRef<number | null>(null)
 
   useEffect(() => {
     // Construct WebSocket URL from environment or default
@@ -25,48 +36,101 @@ export function useWebSocket(url?: string) {
     // Don't connect in development without backend
     if (!wsUrl.includes("localhost")) return
 
-    try {
-      const ws = new WebSocket(wsUrl)
+    let closed = false
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null
+    // Filtered streams only see the changes they match, so their seqs skip by design
+    const filtered = /[?&](ports|commodities|min_severity)=/.test(wsUrl)
 
-      ws.onopen = () => {
-        console.log("[v0] WebSocket connected")
-        setIsConnected(true)
-      }
+    const connect = () => {
+      const since = lastSeqRef.current
+      const resumeUrl = since === null ? wsUrl : `${wsUrl}${wsUrl.includes("?") ? "&" : "?"}since=${since}`
 
-      ws.onmessage = (event) => {
-        try {
-          const data = JSON.parse(event.data)
-          setLastEvent(data)
-        } catch (e) {
-          console.error("[v0] Failed to parse WebSocket message:", e)
+      try {
+        const ws = new WebSocket(resumeUrl)
+        let resumeNow = false
+
+        // Records a change's seq; false if changes were missed before it
+        const advance = (seq: number) => {
+          const last = lastSeqRef.current
+          if (!filtered && last !== null && seq > last + 1) {
+            // Reconnect straight away with since=last so the server replays the missing changes
+            resumeNow = true
+            ws.close()
+            return false
+          }
+          lastSeqRef.current = Math.max(last ?? 0, seq)
+          return true
         }
-      }
 
-      ws.onerror = (error) => {
-        console.error("[v0] WebSocket error:", error)
-        setIsConnected(false)
-      }
+        ws.onopen = () => {
+          console.log("[v0] WebSocket connected")
+          setIsConnected(true)
+        }
 
-      ws.onclose = () => {
-        console.log("[v0] WebSocket disconnected")
-        setIsConnected(false)
-        // Attempt to reconnect after 3 seconds
-        setTimeout(() => {
-          console.log("[v0] Attempting WebSocket reconnection...")
-        }, 3000)
-      }
+        ws.onmessage = (event) => {
+          // Anything after a gap is replayed once the socket reconnects
+          if (resumeNow) return
+          try {
+            const data = JSON.parse(event.data)
+            if (data.type === "connection") {
+              // A fresh client starts from the server's current position
+              if (lastSeqRef.current === null) lastSeqRef.current = data.seq ?? 0
+            } else if (data.type === "reset") {
+              lastSeqRef.current = data.seq
+              setResetCount((count) => count + 1)
+              return
+            } else if (data.type === "batch") {
+              // Bulk ingest arrives as one message holding the events this stream matches
+              const events: WSEvent[] = data.events
+              let latest: WSEvent | null = null
+              for (const change of events) {
+                if (typeof change.seq === "number" && !advance(change.seq)) break
+                latest = change
+              }
+              if (latest) setLastEvent(latest)
+              return
+            } else if (typeof data.seq === "number" && !advance(data.seq)) {
+              return
+            }
+            setLastEvent(data)
+          } catch (e) {
+            console.error("[v0] Failed to parse WebSocket message:", e)
+          }
+        }
 
-      wsRef.current = ws
+        ws.onerror = (error) => {
+          console.error("[v0] WebSocket error:", error)
+          setIsConnected(false)
+        }
 
-      return () => {
-        if (wsRef.current) {
-          wsRef.current.close()
+        ws.onclose = () => {
+          console.log("[v0] WebSocket disconnected")
+          setIsConnected(false)
+          if (closed) return
+          // Reconnect after 3-6 seconds, resuming from the last change seen; the jitter
+          // spreads out the dashboards that all lose their connection in a deploy
+          reconnectTimer = setTimeout(() => {
+            console.log("[v0] Attempting WebSocket reconnection...")
+            connect()
+          }, resumeNow ? RESUME_DELAY_MS : RECONNECT_DELAY_MS * (1 + Math.random()))
         }
+
+        wsRef.current = ws
+      } catch (error) {
+        console.error("[v0] Failed to create WebSocket:", error)
+      }
+    }
+
+    connect()
+
+    return () => {
+      closed = true
+      if (reconnectTimer) clearTimeout(reconnectTimer)
+      if (wsRef.current) {
+        wsRef.current.close()
       }
-    } catch (error) {
-      console.error("[v0] Failed to create WebSocket:", error)
     }
   }, [url])
 
-  return { lastEvent, isConnected }
+  return { lastEvent, isConnected, resetCount }
 }
@@ -0,0 +1,290 @@
+import asyncio
+import ipaddress
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+
+from auth import verify_token
+from metrics import registry
+
+ADMISSION_ENABLED = os.getenv("TRADEGUARD_ADMISSION", "1") == "1"
+# Requests in flight across all classes; lower-priority classes are shed
+# once the total passes their share of it
+ADMISSION_BUDGET = int(os.getenv("TRADEGUARD_ADMISSION_BUDGET", "64"))
+# Per-client token buckets; load generators running from one address turn them off
+RATE_LIMITS_ENABLED = os.getenv("TRADEGUARD_ADMISSION_RATE_LIMITS", "1") == "1"
+MAX_CLIENTS = 10_000
+# Reverse proxies (addresses or CIDR ranges) whose X-Forwarded-For and
+# X-Real-IP headers name the client; behind infra/nginx.conf, list its address
+TRUSTED_PROXIES = tuple(
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv("TRADEGUARD_TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if proxy.strip()
+)
+
+# name: (share of the budget, concurrency, queue, queue timeout s, client rate/s, client burst)
+COST_CLASSES = {
+    # Cheap indexed reads and cache misses of small payloads
+    "read": (1.0, 48, 128, 2.0, 100.0, 200),
+    # Ingest and forecast batches
+    "write": (0.75, 4, 16, 5.0, 10.0, 20),
+    # bcrypt; the hasher has its own bounded queue behind this
+    "auth": (0.75, 4, 16, 5.0, 1.0, 10),
+    # Aggregations, full-text search and forecasts
+    "analytics": (0.5, 4, 8, 5.0, 5.0, 20),
+}
+
+wait_duration = registry.histogram("tradeguard_admission_wait_seconds", "Time queued for admission, by cost class", ("class",))
+
+class Shed(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Spend a token; 0 if one was available, else seconds until one will be"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class CostClass:
+    """Concurrency limit and bounded FIFO queue for one class of request"""
+
+    def __init__(self, name: str, share: float, concurrency: int, queue: int, timeout: float, rate: float, burst: int):
+        self.name = name
+        self.share = share
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.rate = rate
+        self.burst = burst
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self.max_queued = 0
+        self.admitted = 0
+        self.shed = {"rate_limited": 0, "overloaded": 0, "queue_full": 0, "timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "concurrency": self.concurrency,
+            "queue": self.queue,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+
+class AdmissionController:
+    """Decides, before any work is done, whether a request runs, waits or is shed.
+
+    A request is first charged to its client's token bucket for its cost
+    class (429 when empty). It is then shed with 503 if the requests in
+    flight across all classes have reached its class's share of the
+    budget, so expensive classes give way first and cheap reads keep the
+    last of it. Otherwise it runs if its class is under its concurrency
+    limit, or waits in the class's bounded FIFO queue; a full queue or a
+    wait past the class timeout is shed with 503 rather than queued
+    further. Everything runs on the event loop, so no locks are needed.
+    """
+
+    def __init__(self, budget: int = ADMISSION_BUDGET, classes: dict = COST_CLASSES, rate_limits: bool = RATE_LIMITS_ENABLED):
+        self.budget = budget
+        self.rate_limits = rate_limits
+        self.classes = {name: CostClass(name, *limits) for name, limits in classes.items()}
+        self._routes: list[tuple] = []
+        self._buckets: OrderedDict = OrderedDict()
+        self.in_flight = 0
+
+    def route(self, path: str, cost_class: str, method: str = None):
+        """Charge `path` (with {param} segments) to `cost_class`; None exempts it from admission"""
+        if cost_class is not None and cost_class not in self.classes:
+            raise ValueError(f"Unknown cost class {cost_class!r}")
+        pattern = re.compile("^" + re.sub(r"\{(\w+)\}", r"[^/]+", path) + "$")
+        self._routes.append((pattern, method, cost_class))
+
+    def classify(self, method: str, path: str):
+        for pattern, route_method, cost_class in self._routes:
+            if (route_method is None or route_method == method) and pattern.match(path):
+                return cost_class
+        return "read" if method in ("GET", "HEAD") else "write"
+
+    def _bucket(self, client: str, cost: CostClass) -> TokenBucket:
+        key = (client, cost.name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(cost.rate, cost.burst)
+            if len(self._buckets) > MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    async def acquire(self, cost: CostClass, client: str):
+        if self.rate_limits:
+            wait = self._bucket(client, cost).take()
+            if wait:
+                cost.shed["rate_limited"] += 1
+                raise Shed(429, f"Rate limit for {cost.name} requests exceeded", wait)
+        if self.in_flight >= self.budget * cost.share:
+            cost.shed["overloaded"] += 1
+            raise Shed(503, "Server is overloaded", 1)
+        if cost.in_flight < cost.concurrency:
+            self._admit(cost)
+            return
+        if cost.queued >= cost.queue:
+            cost.shed["queue_full"] += 1
+            raise Shed(503, f"Too many {cost.name} requests queued", 1)
+
+        waiter = asyncio.get_running_loop().create_future()
+        cost._waiters.append(waiter)
+        cost.max_queued = max(cost.max_queued, cost.queued)
+        started = time.perf_counter()
+        try:
+            # release() hands a slot over by resolving the future, already counted as admitted
+            async with asyncio.timeout(cost.timeout):
+                await waiter
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived just as we gave up; pass it on
+                self.release(cost)
+            elif waiter in cost._waiters:
+                cost._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                cost.shed["timeout"] += 1
+                raise Shed(503, f"Timed out waiting to run a {cost.name} request", 1) from None
+            raise
+        finally:
+            wait_duration.observe(time.perf_counter() - started, cost.name)
+
+    def _admit(self, cost: CostClass):
+        cost.in_flight += 1
+        cost.admitted += 1
+        self.in_flight += 1
+
+    def release(self, cost: CostClass):
+        cost.in_flight -= 1
+        self.in_flight -= 1
+        while cost._waiters:
+            waiter = cost._waiters.popleft()
+            if not waiter.done():
+                self._admit(cost)
+                waiter.set_result(None)
+                return
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "budget": self.budget,
+            "in_flight": self.in_flight,
+            "rate_limits": self.rate_limits,
+            "clients": len({client for client, _ in self._buckets}),
+            "classes": {name: cost.stats() for name, cost in self.classes.items()},
+        }
+
+admission = AdmissionController()
+
+def _client(scope) -> str:
+    """A verified bearer token identifies its user across addresses; otherwise the address identifies the client.
+
+    Behind a trusted proxy the address is the one it forwarded.
+
+    Unverified tokens are ignored, so inventing a new one per request does
+    not buy a fresh bucket. Verification is served from the token cache.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            token_data = verify_token(value[7:].decode("latin-1"))
+            if token_data is not None:
+                return f"user:{token_data.user_id}"
+            break
+    client = scope.get("client")
+    return _address(scope, client[0]) if client else "unknown"
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in proxy for proxy in TRUSTED_PROXIES)
+
+def _address(scope, peer: str) -> str:
+    """The client's address, read from forwarding headers only when they were set by trusted proxies.
+
+    X-Forwarded-For is walked from the right, past each trusted proxy; the
+    first other hop is the client, since anything to its left came from the
+    client itself and may be forged.
+    """
+    if not _trusted(peer):
+        return peer
+    forwarded, real_ip = [], None
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            forwarded += [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+        elif name == b"x-real-ip":
+            real_ip = value.decode("latin-1").strip()
+    for hop in reversed(forwarded):
+        if not _trusted(hop):
+            return hop
+    if forwarded:
+        return forwarded[0]
+    return real_ip or peer
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the AdmissionController to HTTP requests.
+
+    WebSockets pass straight through: bounding HTTP work is what keeps the
+    event stream responsive.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = self.controller.classify(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        cost = self.controller.classes[name]
+        try:
+            await self.controller.acquire(cost, _client(scope))
+        except Shed as shed:
+            await self._reject(send, shed)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(cost)
+
+    @staticmethod
+    async def _reject(send, shed: Shed):
+        body = b'{"detail":"' + shed.reason.encode() + b'"}'
+        await send({"type": "http.response.start", "status": shed.status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(shed.retry_after))).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
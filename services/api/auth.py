@@ -1,17 +1,34 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 import os
+from broker import broker
+from cache import TTLCache, change_versions
+from repositories import user_repo
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt runs on its own workers so a login burst cannot starve the DB executor
+HASH_WORKERS = int(os.getenv("TRADEGUARD_HASH_WORKERS", "2"))
+# Hashes allowed to wait for a worker before new ones are rejected
+HASH_QUEUE_LIMIT = int(os.getenv("TRADEGUARD_HASH_QUEUE_LIMIT", "32"))
+AUTH_CACHE_TTL = float(os.getenv("TRADEGUARD_AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = 4096
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+security = HTTPBearer()
 
 class Token(BaseModel):
     access_token: str
@@ -27,6 +44,79 @@ class User(BaseModel):
     email: str
     is_admin: bool = False
 
+class HasherBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+class PasswordHasher:
+    """Bounded pool for bcrypt work, rejecting requests beyond the queue limit"""
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: ThreadPoolExecutor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tradeguard-bcrypt")
+        return self._executor
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HasherBusy("Too many concurrent logins")
+            self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.completed += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self._in_flight,
+                "queued": max(self._in_flight - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+password_hasher = PasswordHasher()
+
+# Decoded tokens by token string, and user rows by id (validated against the
+# users change version, which invalidate_user bumps after a write to the user)
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+user_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+def _relayed_user(message: dict):
+    change_versions.bump("users", [message["id"]])
+
+broker.listen("user", _relayed_user, deliver=False)
+
+def invalidate_user(user_id: int):
+    """Drop the user's cached row in every worker; call after committing a write to the user"""
+    change_versions.bump("users", [user_id])
+    broker.relay({"type": "user", "id": user_id})
+
+async def update_user(user_id: int, **fields) -> bool:
+    """Write user columns (e.g. is_admin) and invalidate the cached row; False if there is no such user"""
+    updated = await user_repo.update(user_id, fields)
+    if updated:
+        invalidate_user(user_id)
+    return updated
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -35,6 +125,14 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the bounded hashing pool"""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the bounded hashing pool"""
+    return await password_hasher.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -42,19 +140,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    
+
+    # JWT requires the subject to be a string
+    if "sub" in to_encode:
+        to_encode["sub"] = str(to_encode["sub"])
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[TokenData]:
-    """Verify and decode JWT token"""
+    """Verify and decode JWT token, reusing recent decodes until they or the token expire"""
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
+        user_id = payload.get("sub")
         if user_id is None:
             return None
-        token_data = TokenData(user_id=user_id)
-    except JWTError:
+        token_data = TokenData(user_id=int(user_id))
+    except (JWTError, ValueError):
         return None
+    token_cache.put(token, token_data, ttl=payload["exp"] - time.time() if "exp" in payload else None)
     return token_data
+
+async def current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    """Dependency resolving the bearer token to its user.
+
+    Token decodes and user rows are served from TTL caches, so routes can
+    adopt it without a JWT decode and a users query per request.
+    """
+    token_data = verify_token(credentials.credentials)
+    
+    if token_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Read before the fetch so a concurrent user write leaves the entry stale
+    version = change_versions.version("users", token_data.user_id)
+    user = user_cache.get(token_data.user_id, version)
+    if user is None:
+        row = await user_repo.get(token_data.user_id)
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+        user = User(id=row["id"], username=row["username"], email=row["email"], is_admin=bool(row["is_admin"]))
+        user_cache.put(token_data.user_id, user, version)
+    return user
@@ -0,0 +1,366 @@
+"""End-to-end latency, throughput and memory of every read route and the event stream.
+
+Usage: python benchmarks/api_suite.py [--sizes 10000,100000] [--concurrency 1,8,32] [--requests 200]
+                                      [--routes /api/events,/ws/events] [--data-dir DIR] [--cache] [--admission]
+                                      [--output results.json] [--baseline baseline.json] [--threshold 0.25]
+
+For each size, a database of that many events is generated with
+synthetic_data.py (kept in --data-dir for reuse, keyed by seed, size and
+day) and copied to a scratch file, which a fresh worker process serves: the
+FastAPI app from main.py, lifespan included, driven in-process through
+httpx's ASGI transport. Every GET route is called with a rotating set of
+realistic parameters at each concurrency level, after a few warm-up calls;
+the response cache is disabled unless --cache is given, so the queries
+themselves are measured, and admission control unless --admission is
+given, so heavy routes are measured rather than shed. /ws/events is measured with in-process WebSocket
+subscribers (as many as the concurrency level) receiving events posted
+one at a time to /api/events/bulk; its latency is post to delivery.
+Login and bulk ingest have their own benchmarks (auth_load.py,
+ingest_throughput.py).
+
+Each route and level reports p50/p95/p99/max latency, throughput, errors
+and the process's peak RSS while it ran, printed as a table and written as
+JSON (to stdout, or --output). With --baseline, results are compared with a
+stored run: a p95 more than --threshold above the baseline's (and at least
+--min-delta-ms slower), a throughput that fell by as much, or new errors
+are regressions, and the exit status is non-zero. Save a run with --output
+on the base revision to use it as the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+STREAM_ROUTE = "/ws/events"
+# Keep background jobs from landing in the measurements
+WORKER_ENV = {
+    "TRADEGUARD_FORECAST_INTERVAL": "86400",
+    "TRADEGUARD_RISK_INTERVAL": "86400",
+    "TRADEGUARD_STREAM_INTERVAL": "86400",
+    # Every simulated client shares one address
+    "TRADEGUARD_ADMISSION_RATE_LIMITS": "0",
+}
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def reset_peak_rss():
+    """Restart the peak RSS high-water mark (Linux); elsewhere peaks stay process-wide"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies, default=0.0), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def scenarios(db_path: Path, seed: int) -> dict:
+    """Route template -> (path, params) variants, drawn from the database being served"""
+    from synthetic_data import COMMODITIES, REAL_PORT_REGIONS
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    # The busiest ports, as clients mostly look at those
+    ports = conn.execute('SELECT id, name, latitude, longitude FROM ports ORDER BY active_events DESC, id LIMIT 8').fetchall()
+    sku_ids = [row[0] for row in conn.execute('SELECT id FROM skus')]
+    max_event = conn.execute('SELECT MAX(id) FROM events').fetchone()[0] or 1
+    conn.close()
+    skus = rng.sample(sku_ids, min(len(sku_ids), 8))
+    events = [rng.randint(1, max_event) for _ in range(8)]
+    commodities = list(COMMODITIES)[:3]
+    regions = sorted(set(REAL_PORT_REGIONS.values()))[:3]
+
+    return {
+        "/api/health": [("/api/health", {})],
+        "/api/events": [("/api/events", {}), ("/api/events", {"limit": 100})]
+                       + [("/api/events", {"commodity": commodity}) for commodity in commodities]
+                       + [("/api/events", {"region": region, "min_severity": 0.5}) for region in regions]
+                       + [("/api/events", {"port": port[1], "tag": "strike"}) for port in ports[:3]],
+        "/api/events/facets": [("/api/events/facets", {})] + [("/api/events/facets", {"commodity": c}) for c in commodities],
+        "/api/events/{event_id}": [(f"/api/events/{event_id}", {}) for event_id in events],
+        "/api/analytics/gtri": [("/api/analytics/gtri", {})],
+        "/api/analytics/trends": [("/api/analytics/trends", {"days": days}) for days in (7, 30, 90)]
+                                 + [("/api/analytics/trends", {"days": 365, "bucket": "week"})],
+        "/api/analytics/ports": [("/api/analytics/ports", {})],
+        "/api/ports": [("/api/ports", {}), ("/api/ports", {"bbox": "-180,-90,180,90", "zoom": 2}),
+                       ("/api/ports", {"bbox": "95,-10,145,40", "zoom": 5})],
+        "/api/ports/near": [("/api/ports/near", {"lat": port[2], "lon": port[3], "radius_km": 1000}) for port in ports],
+        "/api/ports/{port_id}": [(f"/api/ports/{port[0]}", {}) for port in ports],
+        "/api/ports/{port_id}/events": [(f"/api/ports/{port[0]}/events", {}) for port in ports],
+        "/api/ports/{port_id}/skus": [(f"/api/ports/{port[0]}/skus", {}) for port in ports],
+        "/api/sku": [("/api/sku", {})] + [("/api/sku", {"port": port[1]}) for port in ports[:3]],
+        "/api/sku/{sku_id}": [(f"/api/sku/{sku_id}", {}) for sku_id in skus],
+        "/api/forecast/{sku_id}": [(f"/api/forecast/{sku_id}", {}) for sku_id in skus],
+        "/api/news": [("/api/news", {}), ("/api/news", {"limit": 100})],
+        "/api/news/sentiment": [("/api/news/sentiment", {}), ("/api/news/sentiment", {"window": "7d"}),
+                                ("/api/news/sentiment", {"window": "24h", "half_life": 24})],
+        "/api/search": [("/api/search", {"q": q}) for q in ("strike", "congestion Shanghai", "storm*", '"customs backlog"')],
+        STREAM_ROUTE: [(port[1], {}) for port in ports],
+    }
+
+async def measure_route(client, variants: list, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in pending:
+            path, params = variants[index % len(variants)]
+            started = time.perf_counter()
+            response = await client.get(path, params=params)
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 400
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+class InProcessWebSocket:
+    """WebSocket client speaking ASGI straight to the app, recording when each frame is sent"""
+
+    def __init__(self, app, path: str, query: str = ""):
+        self.app = app
+        self.scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+            "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query.encode(),
+            "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80), "subprotocols": [],
+        }
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.frames: list[tuple] = []
+        self.accepted = asyncio.Event()
+        self.task = None
+
+    async def _send(self, message: dict):
+        if message["type"] == "websocket.accept":
+            self.accepted.set()
+        elif message["type"] == "websocket.send":
+            arrival = time.perf_counter()
+            self.frames.append((arrival, json.loads(message.get("text") or message.get("bytes"))))
+        elif message["type"] == "websocket.close":
+            self.accepted.set()
+
+    async def connect(self):
+        self.task = asyncio.create_task(self.app(self.scope, self.incoming.get, self._send))
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        await self.accepted.wait()
+
+    def events(self, titles: dict) -> list[tuple]:
+        """(arrival, message) of each event frame whose title is in `titles`"""
+        return [(arrival, message) for arrival, message in self.frames
+                if message.get("type") == "event" and message.get("title") in titles]
+
+    async def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+async def measure_stream(app, client, ports: list, requests: int, subscribers: int) -> dict:
+    """Post `requests` single-event batches and time their delivery to every subscriber"""
+    sockets = [InProcessWebSocket(app, STREAM_ROUTE) for _ in range(subscribers)]
+    await asyncio.gather(*(socket.connect() for socket in sockets))
+    run = f"{time.time_ns():x}"
+    posted, errors = {}, 0
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    for index in range(requests):
+        title = f"Stream benchmark {run} {index}"
+        event = {"title": title, "summary": "Stream benchmark event", "severity": 0.5, "port": ports[index % len(ports)][0],
+                 "commodity": "Electronics", "timestamp": datetime.utcnow().isoformat() + "Z"}
+        posted[title] = time.perf_counter()
+        response = await client.post("/api/events/bulk", json=[event])
+        errors += response.status_code >= 400 or response.json().get("inserted") != 1
+    # Wait for the fan-out to drain
+    deadline = time.perf_counter() + 10.0
+    while time.perf_counter() < deadline and any(len(socket.events(posted)) < requests for socket in sockets):
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - started
+
+    latencies = [(arrival - posted[message["title"]]) * 1000 for socket in sockets for arrival, message in socket.events(posted)]
+    await asyncio.gather(*(socket.close() for socket in sockets))
+    result = summarize(latencies, elapsed, errors + subscribers * requests - len(latencies))
+    result["subscribers"] = subscribers
+    return result
+
+async def run_worker(args) -> dict:
+    import httpx
+    from main import app
+
+    routes = scenarios(Path(os.environ["TRADEGUARD_DB_PATH"]), args.seed)
+    selected = [route for route in routes if not args.routes or route in args.routes]
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # The stream posts events, so it runs after the read routes
+            for route in sorted(selected, key=lambda route: route == STREAM_ROUTE):
+                results[route] = {}
+                for level in args.concurrency:
+                    if route == STREAM_ROUTE:
+                        results[route][str(level)] = await measure_stream(app, client, routes[route], args.stream_events, level)
+                        continue
+                    await measure_route(client, routes[route], args.warmup, 1)
+                    results[route][str(level)] = await measure_route(client, routes[route], args.requests, level)
+    return results
+
+def database_for(size: int, args) -> tuple[Path, float]:
+    """A generated database of `size` events, reused from --data-dir when present; returns (path, seconds spent)"""
+    from synthetic_data import generate
+
+    end = date.today()
+    path = args.data_dir / f"synthetic-{args.seed}-{size}-{end.isoformat()}.db"
+    if path.exists():
+        return path, 0.0
+    started = time.perf_counter()
+    partial = path.with_suffix(".partial")
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{partial}{suffix}").unlink(missing_ok=True)
+    generate(partial, seed=args.seed, events=size, ports=min(max(size // 2000, 50), 5000), skus=max(size // 100, 500),
+             articles=max(size // 10, 1000), days=365, end=end)
+    partial.rename(path)
+    return path, time.perf_counter() - started
+
+def run_size(size: int, args, scratch: Path) -> dict:
+    db_path, generate_seconds = database_for(size, args)
+    served = scratch / f"serve-{size}.db"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{served}{suffix}").unlink(missing_ok=True)
+    shutil.copyfile(db_path, served)
+    output = scratch / f"results-{size}.json"
+    command = [sys.executable, __file__, "--worker", str(output), "--seed", str(args.seed),
+               "--requests", str(args.requests), "--warmup", str(args.warmup), "--stream-events", str(args.stream_events),
+               "--concurrency", ",".join(map(str, args.concurrency))]
+    if args.routes:
+        command += ["--routes", ",".join(args.routes)]
+    env = {**os.environ, **WORKER_ENV, "TRADEGUARD_DB_PATH": str(served)}
+    if not args.cache:
+        env["TRADEGUARD_CACHE_SIZE"] = "0"
+    if not args.admission:
+        env["TRADEGUARD_ADMISSION"] = "0"
+    # The app logs to stdout, which is kept for the JSON report
+    subprocess.run(command, env=env, stdout=sys.stderr, check=True)
+    return {"db_bytes": os.path.getsize(db_path), "generate_s": round(generate_seconds, 1),
+            "routes": json.loads(output.read_text())}
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list[str]:
+    regressions = []
+    for size, current_size in results["sizes"].items():
+        for route, levels in current_size["routes"].items():
+            for level, current in levels.items():
+                before = baseline.get("sizes", {}).get(size, {}).get("routes", {}).get(route, {}).get(level)
+                if not before:
+                    continue
+                where = f"{route} events={size} c={level}"
+                if (current["p95_ms"] > before["p95_ms"] * (1 + threshold)
+                        and current["p95_ms"] - before["p95_ms"] >= min_delta_ms):
+                    regressions.append(f"{where}: p95 {before['p95_ms']:.2f}ms -> {current['p95_ms']:.2f}ms")
+                if (current["throughput_rps"] * (1 + threshold) < before["throughput_rps"]
+                        and current["mean_ms"] - before["mean_ms"] >= min_delta_ms):
+                    regressions.append(f"{where}: throughput {before['throughput_rps']:.1f}/s -> {current['throughput_rps']:.1f}/s")
+                if current["errors"] > before["errors"]:
+                    regressions.append(f"{where}: errors {before['errors']} -> {current['errors']}")
+    return regressions
+
+def print_table(results: dict):
+    for size, result in results["sizes"].items():
+        print(f"\n{int(size):,} events ({result['db_bytes'] / 2 ** 20:,.0f} MB)", file=sys.stderr)
+        print(f"{'route':<30}{'c':>4}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}{'rss MB':>9}{'errors':>8}", file=sys.stderr)
+        for route, levels in result["routes"].items():
+            for level, stats in levels.items():
+                print(f"{route:<30}{level:>4}{stats['p50_ms']:>8.2f}ms{stats['p95_ms']:>8.2f}ms{stats['p99_ms']:>8.2f}ms"
+                      f"{stats['throughput_rps']:>10.1f}{stats['peak_rss_mb']:>9.1f}{stats['errors']:>8}", file=sys.stderr)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    integers = lambda value: [int(item) for item in value.split(",") if item]
+    parser.add_argument("--sizes", type=integers, default=[10_000, 100_000], help="events per generated database")
+    parser.add_argument("--concurrency", type=integers, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--stream-events", type=int, default=100, help="events posted per stream measurement")
+    parser.add_argument("--routes", type=lambda value: [item for item in value.split(",") if item], default=None,
+                        help="route templates to run (default: all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on")
+    parser.add_argument("--admission", action="store_true", help="keep admission control on (per-client rate limits stay off)")
+    parser.add_argument("--data-dir", type=Path, default=None, help="where generated databases are kept (default: discarded)")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--worker", type=Path, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.worker.write_text(json.dumps(asyncio.run(run_worker(args))))
+        return 0
+
+    results = {
+        "meta": {"started": datetime.utcnow().isoformat() + "Z", "seed": args.seed, "cache": args.cache, "admission": args.admission,
+                 "requests": args.requests, "stream_events": args.stream_events, "concurrency": args.concurrency,
+                 "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "machine": platform.machine(),
+                 "cpus": os.cpu_count()},
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = Path(tmp)
+        args.data_dir = args.data_dir or scratch
+        args.data_dir.mkdir(parents=True, exist_ok=True)
+        for size in args.sizes:
+            print(f"[{size:,} events]", file=sys.stderr)
+            results["sizes"][str(size)] = run_size(size, args, scratch)
+
+    print_table(results)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(report + "\n")
+    else:
+        print(report)
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline} (threshold {args.threshold:.0%})", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Measure login throughput and /api/auth/me latency under a login burst.
+
+Usage: python benchmarks/auth_load.py [--logins 40] [--concurrency 16] [--me-concurrency 8] [--duration 5]
+
+Runs the app in-process against a fresh database with one user. First
+measures /api/auth/me latency alone, then again while `--concurrency`
+clients log in back to back (bcrypt on the hashing pool). Reports logins/sec,
+rejected (503) logins and p50/p95/p99 /api/auth/me latency for both phases.
+Finally makes the user an admin through auth.update_user and fails unless
+the next /api/auth/me, otherwise served from the user cache, shows it.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Every simulated client shares one address; concurrency limits stay on
+os.environ.setdefault("TRADEGUARD_ADMISSION_RATE_LIMITS", "0")
+
+def percentiles(samples: list[float]) -> str:
+    if len(samples) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(samples, n=100)
+    return f"p50={cuts[49] * 1000:.2f}ms p95={cuts[94] * 1000:.2f}ms p99={cuts[98] * 1000:.2f}ms (n={len(samples)})"
+
+async def me_loop(client, token: str, stop: asyncio.Event, samples: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/auth/me", headers=headers)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+        # Fully cached requests never suspend in-process; yield like a network client would
+        await asyncio.sleep(0)
+
+async def login_loop(client, remaining: list, results: dict):
+    while remaining:
+        remaining.pop()
+        response = await client.post("/api/auth/login", json={"username": "bench", "password": "secret"})
+        results[response.status_code] = results.get(response.status_code, 0) + 1
+
+async def bench(path: Path, args) -> int:
+    import httpx
+    import database
+    from auth import update_user
+    from main import app, lifespan
+
+    database.pool.open(path)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            response = await client.post("/api/auth/login", json={"username": "bench", "password": "secret"})
+            token = response.json()["access_token"]
+
+            stop = asyncio.Event()
+            idle = []
+            tasks = [asyncio.create_task(me_loop(client, token, stop, idle)) for _ in range(args.me_concurrency)]
+            await asyncio.sleep(args.duration)
+            stop.set()
+            await asyncio.gather(*tasks)
+            print(f"/api/auth/me idle:        {percentiles(idle)}")
+
+            stop = asyncio.Event()
+            loaded = []
+            results = {}
+            remaining = list(range(args.logins))
+            me_tasks = [asyncio.create_task(me_loop(client, token, stop, loaded)) for _ in range(args.me_concurrency)]
+            start = time.perf_counter()
+            await asyncio.gather(*(login_loop(client, remaining, results) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await asyncio.gather(*me_tasks)
+            print(f"/api/auth/me under logins: {percentiles(loaded)}")
+            print(f"logins: {results.get(200, 0)} ok, {results.get(503, 0)} rejected in {elapsed:.2f}s "
+                  f"({results.get(200, 0) / elapsed:.1f} logins/sec)")
+
+            # The cached row must not outlive a write to the user
+            headers = {"Authorization": f"Bearer {token}"}
+            user_id = response.json()["user_id"]
+            await update_user(user_id, is_admin=1)
+            promoted = (await client.get("/api/auth/me", headers=headers)).json()["is_admin"]
+            print(f"/api/auth/me after update_user: is_admin={promoted}")
+    if not promoted:
+        print("a cached user row outlived update_user")
+        return 1
+    return 0 if results.get(200) else 1
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--me-concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    from auth import get_password_hash
+    from migrations import migrate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        conn = sqlite3.connect(path)
+        migrate(conn)
+        conn.execute(
+            'INSERT INTO users (username, email, hashed_password, is_admin, created_at) VALUES (?, ?, ?, 0, ?)',
+            ("bench", "bench@example.com", get_password_hash("secret"), datetime.utcnow().isoformat()),
+        )
+        conn.commit()
+        conn.close()
+        return asyncio.run(bench(path, args))
+
+if __name__ == "__main__":
+    sys.exit(main())
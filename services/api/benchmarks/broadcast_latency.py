@@ -0,0 +1,168 @@
+"""End-to-end delivery latency of the cross-worker broadcast at 1-16 workers.
+
+Usage: python benchmarks/broadcast_latency.py [--workers 1,2,4,8,16] [--clients 200] [--events 300] [--rate 100]
+
+Each worker is a separate process running the real EventBroker with the
+Unix socket backend, as a uvicorn worker would, and serving its share of
+simulated WebSocket clients. Every worker publishes a share of the events
+on a shared wall-clock schedule, so each event starts in one worker and
+has to reach the clients of all of them. Latency is measured from publish
+to the client's send, split into clients of the publishing worker (local)
+and of the others (relayed). Exits non-zero if any client misses an event.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from broker import EventBroker
+from broadcast import UnixSocketBackend
+
+class SimulatedSocket:
+    def __init__(self, worker: int, local: list, relayed: list):
+        self.worker = worker
+        self.local = local
+        self.relayed = relayed
+
+    async def send_json(self, message: dict):
+        latency = time.time() - message["sent_at"]
+        (self.local if message["origin"] == self.worker else self.relayed).append(latency)
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def summary(samples: list) -> dict:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples, default=0) * 1000, 3),
+    }
+
+async def worker(index: int, workers: int, args):
+    """One simulated uvicorn worker: subscribe clients, publish its share, report latencies"""
+    broker = EventBroker(backend=UnixSocketBackend(args.socket))
+    await broker.start()
+    local, relayed = [], []
+    clients = args.clients // workers + (index < args.clients % workers)
+    tasks = [asyncio.create_task(broker.serve(broker.subscribe(SimulatedSocket(index, local, relayed))))
+             for _ in range(clients)]
+    # Every broker connected to the hub before anyone publishes
+    while not broker.backend.stats()["connected"]:
+        await asyncio.sleep(0.01)
+    print("ready", flush=True)
+    loop = asyncio.get_running_loop()
+    start = float(await loop.run_in_executor(None, sys.stdin.readline))
+
+    interval = 1 / args.rate
+    for event in range(index, args.events, workers):
+        # Yields even when behind schedule, as ingest does between requests
+        await asyncio.sleep(max(start + event * interval - time.time(), 0))
+        broker.publish({"type": "event", "id": event, "port": "Singapore", "commodity": "Oil", "severity": 0.5,
+                        "origin": index, "sent_at": time.time()})
+
+    # Wait until every client has every event, or give up after the drain timeout
+    expected = clients * args.events
+    deadline = time.time() + args.drain
+    while len(local) + len(relayed) < expected and time.time() < deadline:
+        await asyncio.sleep(0.01)
+    stats = broker.stats()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    print(json.dumps({"worker": index, "clients": clients, "expected": expected, "local": local,
+                      "relayed": relayed,
+                      "dropped": stats["dropped"], "evicted": stats["slow_disconnects"], "broadcast": stats["broadcast"]}), flush=True)
+    # Whoever hosts the hub stays up until every worker has reported
+    await loop.run_in_executor(None, sys.stdin.readline)
+    await broker.stop()
+
+def _report(process) -> str:
+    """Next line a worker wrote, skipping its log lines"""
+    while (line := process.stdout.readline()).startswith("[v0]"):
+        pass
+    return line.strip()
+
+def run(workers: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        socket = os.path.join(scratch, "hub.sock")
+        command = [sys.executable, __file__, "--worker", "--socket", socket, "--clients", str(args.clients),
+                   "--events", str(args.events), "--rate", str(args.rate), "--drain", str(args.drain)]
+        processes = [subprocess.Popen([*command, "--index", str(index), "--workers", str(workers)],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                     for index in range(workers)]
+        try:
+            for process in processes:
+                if _report(process) != "ready":
+                    raise SystemExit("A worker failed to start")
+            start = time.time() + 0.2
+            for process in processes:
+                process.stdin.write(f"{start}\n")
+                process.stdin.flush()
+            reports = [json.loads(_report(process)) for process in processes]
+        finally:
+            for process in processes:
+                process.stdin.close()
+                process.wait(timeout=args.drain + 30)
+    local = [value for report in reports for value in report["local"]]
+    relayed = [value for report in reports for value in report["relayed"]]
+    expected = sum(report["expected"] for report in reports)
+    return {
+        "workers": workers,
+        "clients": args.clients,
+        "events": args.events,
+        "expected": expected,
+        "delivered": len(local) + len(relayed),
+        "local": summary(local),
+        "relayed": summary(relayed),
+        "all": summary(local + relayed),
+        "dropped": sum(report["dropped"] for report in reports),
+        "evicted": sum(report["evicted"] for report in reports),
+        "unrelayed": sum(report["broadcast"]["unrelayed"] for report in reports),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4,8,16", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=200, help="simulated clients, split across the workers")
+    parser.add_argument("--events", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=100, help="events per second across all workers")
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to wait for the last deliveries")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--index", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--socket", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(worker(args.index, int(args.workers), args))
+        return
+
+    results = []
+    for workers in (int(value) for value in args.workers.split(",")):
+        result = run(workers, args)
+        results.append(result)
+        print(f"workers={workers:>2} delivered={result['delivered']}/{result['expected']} "
+              f"local p50={result['local']['p50_ms']:.2f}ms p99={result['local']['p99_ms']:.2f}ms "
+              f"relayed p50={result['relayed']['p50_ms']:.2f}ms p99={result['relayed']['p99_ms']:.2f}ms "
+              f"max={result['all']['max_ms']:.2f}ms dropped={result['dropped']} evicted={result['evicted']}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    if any(result["delivered"] < result["expected"] for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Fan-out load test for the WebSocket event broker with simulated clients.
+
+Usage: python benchmarks/broker_load.py [--clients 10000] [--events 200] [--slow 0.01]
+
+Each simulated client runs the broker's real per-subscriber sender task
+against an in-memory socket. A fraction of clients are slow (their sends
+stall), and a quarter subscribe to a single port. Reports publish cost,
+delivery latency percentiles and slow-consumer evictions.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import broker as broker_module
+from broker import EventBroker, SlowConsumer
+
+PORTS = ["Shanghai", "Singapore", "Rotterdam", "Suez", "Santos", "Dubai", "Hamburg", "Los Angeles"]
+
+class SimulatedSocket:
+    def __init__(self, latencies: list, stall: float = 0.0):
+        self.latencies = latencies
+        self.stall = stall
+
+    async def send_json(self, message: dict):
+        if self.stall:
+            await asyncio.sleep(self.stall)
+        self.latencies.append(time.perf_counter() - message["sent_at"])
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+async def run(args):
+    broker_module.SEND_TIMEOUT = args.send_timeout
+    rng = random.Random(args.seed)
+    broker = EventBroker()
+    latencies = []
+    tasks = []
+    slow = 0
+    for _ in range(args.clients):
+        is_slow = rng.random() < args.slow
+        slow += is_slow
+        socket = SimulatedSocket(latencies, stall=args.send_timeout * 2 if is_slow else 0.0)
+        ports = [rng.choice(PORTS)] if rng.random() < 0.25 else None
+        subscription = broker.subscribe(socket, ports=ports)
+        tasks.append(asyncio.create_task(broker.serve(subscription)))
+
+    publish_times = []
+    start = time.perf_counter()
+    for i in range(args.events):
+        message = {"type": "event", "id": i, "port": rng.choice(PORTS), "commodity": "Oil",
+                   "severity": rng.random(), "sent_at": time.perf_counter()}
+        t0 = time.perf_counter()
+        broker.publish(message)
+        publish_times.append(time.perf_counter() - t0)
+        await asyncio.sleep(args.interval)
+
+    # Let fast clients drain, then stop everyone
+    await asyncio.sleep(args.send_timeout * 1.5)
+    elapsed = time.perf_counter() - start
+    stats = broker.stats()
+    for task in tasks:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    evicted = sum(isinstance(result, SlowConsumer) for result in results)
+
+    print(f"clients={args.clients} (slow={slow}) events={args.events} elapsed={elapsed:.2f}s")
+    print(f"publish   p50={percentile(publish_times, 50) * 1000:.2f}ms p99={percentile(publish_times, 99) * 1000:.2f}ms")
+    print(f"delivered={len(latencies)} latency p50={percentile(latencies, 50) * 1000:.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.2f}ms max={max(latencies, default=0) * 1000:.2f}ms")
+    print(f"slow consumers disconnected={evicted} broker stats={stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between published events")
+    parser.add_argument("--slow", type=float, default=0.01, help="fraction of clients whose sends stall")
+    parser.add_argument("--send-timeout", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
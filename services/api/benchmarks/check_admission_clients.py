@@ -0,0 +1,75 @@
+"""Check that clients behind a reverse proxy get their own rate-limit buckets.
+
+Usage: python benchmarks/check_admission_clients.py
+
+Drives AdmissionMiddleware in-process with login requests that all arrive
+from one trusted proxy address, forwarding two different client addresses
+in X-Forwarded-For (and X-Real-IP). Exhausting the first client's auth
+bucket must not rate-limit the second, and X-Forwarded-For sent straight
+from an untrusted address must not buy a fresh bucket. Exits non-zero on
+the first failure.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PROXY = "10.0.0.2"
+os.environ["TRADEGUARD_TRUSTED_PROXIES"] = f"{PROXY}/32"
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def login(middleware, peer: str, headers: list) -> int:
+    scope = {"type": "http", "method": "POST", "path": "/api/auth/login", "client": (peer, 40000),
+             "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await middleware(scope, None, send)
+    return statuses[0]
+
+async def check() -> list[str]:
+    from admission import AdmissionController, AdmissionMiddleware, COST_CLASSES
+
+    controller = AdmissionController(rate_limits=True)
+    controller.route("/api/auth/login", "auth")
+    middleware = AdmissionMiddleware(ok_app, controller)
+    burst = COST_CLASSES["auth"][5]
+    first = [("x-forwarded-for", "203.0.113.7"), ("x-real-ip", "203.0.113.7")]
+    second = [("x-forwarded-for", "198.51.100.4"), ("x-real-ip", "198.51.100.4")]
+
+    failures = []
+    statuses = [await login(middleware, PROXY, first) for _ in range(burst + 1)]
+    if statuses[:burst] != [200] * burst or statuses[burst] != 429:
+        failures.append(f"first client through the proxy: expected {burst} x 200 then 429, got {statuses}")
+    status = await login(middleware, PROXY, second)
+    if status != 200:
+        failures.append(f"second client through the same proxy was limited with {status}")
+    # A client can prepend any address; only the hop the proxy appended counts
+    status = await login(middleware, PROXY, [("x-forwarded-for", "198.51.100.99, 203.0.113.7")])
+    if status != 429:
+        failures.append(f"a forged leading X-Forwarded-For hop bought a fresh bucket ({status})")
+    # Forwarding headers from an address that is not a trusted proxy are ignored
+    direct = [await login(middleware, "192.0.2.1", [("x-forwarded-for", f"203.0.113.{i}")]) for i in range(burst + 1)]
+    if direct[burst] != 429:
+        failures.append(f"X-Forwarded-For from an untrusted address bought fresh buckets: {direct}")
+    return failures
+
+def main() -> int:
+    failures = asyncio.run(check())
+    for failure in failures:
+        print(failure)
+    if failures:
+        return 1
+    print("clients behind one trusted proxy were limited separately; untrusted forwarding headers were ignored")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
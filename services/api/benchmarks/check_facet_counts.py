@@ -0,0 +1,139 @@
+"""Check the maintained facet counters against grouping the matching events.
+
+Usage: python benchmarks/check_facet_counts.py [--operations 5000] [--seed 7]
+
+Applies a random stream of inserts (JSON and legacy comma tag lists, with
+repeated and blank tags), updates of tags and of the commodity, region and
+port columns, and deletes to an in-memory database. Every 100 operations and
+at the end, compares the facets filtered by each single tag, commodity,
+region and port, read from the counters, with the same facets grouped from
+the matching events, and the whole pair counter table with a fresh backfill.
+Then posts events over the tag limits to POST /api/events/bulk in-process and
+checks they are rejected before writing any pair counters. Exits non-zero on
+the first mismatch.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import facets
+from migrations import migrate
+
+PORTS = ["Shanghai", "Singapore", "Rotterdam", "Suez", "Santos"]
+COMMODITIES = ["Oil", "Grains", "Electronics"]
+REGIONS = ["Asia", "Europe", None]
+TAGS = ["strike", "weather", "congestion", "customs", "piracy", "fire"]
+
+def random_tags(rng: random.Random):
+    tags = rng.sample(TAGS, rng.randint(0, 4))
+    if tags and rng.random() < 0.2:
+        tags.append(tags[0])
+    if rng.random() < 0.3:
+        return ", ".join(tags + [""])
+    return json.dumps(tags) if tags or rng.random() < 0.5 else None
+
+def pair_counts(conn) -> list:
+    return conn.execute('SELECT * FROM event_facet_pairs ORDER BY 1, 2, 3, 4').fetchall()
+
+def compare(conn, step: int) -> bool:
+    keys = conn.execute("SELECT dimension, key FROM event_facet_counts ORDER BY dimension, key").fetchall()
+    for dimension, key in keys + [("tag", "unknown"), ("port", "Nowhere")]:
+        event_filter = facets.EventFilter(tags=(key,)) if dimension == "tag" else facets.EventFilter(**{dimension: key})
+        for size in (2, 20):
+            counted = facets.facets(conn, event_filter, size)
+            grouped = facets._result(facets._grouped(conn, event_filter, size))
+            if counted != grouped:
+                print(f"mismatch after operation {step} for {dimension}={key!r} size={size}: counters {counted}, grouped {grouped}")
+                return False
+    maintained = pair_counts(conn)
+    conn.execute('SAVEPOINT rebuild')
+    facets.backfill_pairs(conn)
+    rebuilt = pair_counts(conn)
+    conn.execute('ROLLBACK TO rebuild')
+    conn.execute('RELEASE rebuild')
+    if maintained != rebuilt:
+        print(f"mismatch after operation {step}: pair counters drifted from a fresh backfill "
+              f"({len(set(maintained) ^ set(rebuilt))} rows differ)")
+        return False
+    return True
+
+def check_tag_limits() -> bool:
+    """Events with too many or too long tags are rejected, and write no pair counters"""
+    from models import MAX_EVENT_TAGS, MAX_TAG_LENGTH
+    event = {"title": "tag limits", "summary": "facets", "severity": 0.5, "port": "Suez",
+             "commodity": "Oil", "timestamp": "2025-01-01T00:00:00Z"}
+    payload = [
+        {**event, "tags": [f"tag {i}" for i in range(MAX_EVENT_TAGS + 1)]},
+        {**event, "title": "tag length", "tags": ["x" * (MAX_TAG_LENGTH + 1)]},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TRADEGUARD_DB_PATH"] = str(Path(tmp) / "facets.db")
+        import database
+        from fastapi.testclient import TestClient
+        from main import app
+
+        database.pool.open(Path(os.environ["TRADEGUARD_DB_PATH"]))
+        with TestClient(app) as client:
+            with database.get_db() as conn:
+                seeded = pair_counts(conn)
+            result = client.post("/api/events/bulk", json=payload).json()
+            with database.get_db() as conn:
+                written = len(set(pair_counts(conn)) ^ set(seeded))
+    rejected = [error["index"] for error in result.get("errors", []) if error["error"].startswith("tags")]
+    if result.get("inserted") != 0 or rejected != [0, 1] or written:
+        print(f"over-limit tags were not rejected: {result}, {written} pair counters written")
+        return False
+    return True
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+
+    ids = []
+    for step in range(args.operations):
+        action = rng.random()
+        if ids and action < 0.15:
+            victim = ids.pop(rng.randrange(len(ids)))
+            conn.execute('DELETE FROM events WHERE id = ?', (victim,))
+        elif ids and action < 0.3:
+            column, value = rng.choice([
+                ("tags", random_tags(rng)), ("commodity", rng.choice(COMMODITIES)),
+                ("region", rng.choice(REGIONS)), ("port", rng.choice(PORTS)),
+            ])
+            conn.execute(f'UPDATE events SET {column} = ? WHERE id = ?', (value, rng.choice(ids)))
+        elif ids and action < 0.35:
+            conn.execute('UPDATE events SET tags = ?, port = ?, commodity = ? WHERE id = ?',
+                         (random_tags(rng), rng.choice(PORTS), rng.choice(COMMODITIES), rng.choice(ids)))
+        else:
+            cursor = conn.execute(
+                'INSERT INTO events (title, summary, severity, port, commodity, region, tags, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (f"facets {step}", "facets", rng.random(), rng.choice(PORTS), rng.choice(COMMODITIES), rng.choice(REGIONS),
+                 random_tags(rng), f"2025-01-{rng.randint(1, 28):02d}T00:00:00Z"),
+            )
+            ids.append(cursor.lastrowid)
+
+        if (step + 1) % 100 == 0 or step == args.operations - 1:
+            if not compare(conn, step):
+                return 1
+
+    print(f"{args.operations} operations, counters matched the grouped facets and a fresh backfill throughout")
+    if not check_tag_limits():
+        return 1
+    print("events over the tag limits were rejected without writing pair counters")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
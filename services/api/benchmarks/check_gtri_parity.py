@@ -0,0 +1,78 @@
+"""Check the incremental GTRI engine against the recompute-on-read formula.
+
+Usage: python benchmarks/check_gtri_parity.py [--operations 20000] [--seed 7]
+
+Applies a random stream of inserts (including timestamp ties and
+out-of-order backfills) and deletes to an in-memory events table, and after
+every operation compares the engine snapshot with the original formula
+evaluated over the newest 100 rows. Exits non-zero on the first mismatch.
+"""
+import argparse
+import itertools
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gtri import GTRIEngine, legacy_index
+from migrations import migrate
+
+PORTS = ["Shanghai", "Singapore", "Rotterdam", "Suez", "Santos", "Dubai", "Hamburg", "Los Angeles"]
+
+def reference(conn) -> dict:
+    rows = conn.execute('SELECT severity, port FROM events ORDER BY timestamp DESC, id DESC LIMIT 100').fetchall()
+    return legacy_index(rows)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    engine = GTRIEngine()
+    engine.rebuild(conn)
+
+    ids = []
+    # Titles are unique so coarse-timestamp ties never collide on the (port, timestamp, title) natural key
+    serial = itertools.count()
+    for step in range(args.operations):
+        # Alternate growth and delete-heavy phases so the reserve refill path runs
+        delete_rate = 0.9 if (step // 500) % 2 else 0.3
+        if ids and rng.random() < delete_rate:
+            victims = set(rng.sample(ids, min(len(ids), rng.randint(1, 5))))
+            ids = [i for i in ids if i not in victims]
+            conn.executemany('DELETE FROM events WHERE id = ?', [(v,) for v in victims])
+            engine.on_delete(conn, victims)
+        else:
+            inserted = []
+            for _ in range(rng.randint(1, 20)):
+                event = {
+                    # Coarse timestamps so ties are common
+                    "timestamp": f"2025-01-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00Z",
+                    "severity": rng.choice([round(rng.random(), 2), rng.random()]),
+                    "port": rng.choice(PORTS),
+                }
+                cursor = conn.execute(
+                    'INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                    (f"parity {next(serial)}", "parity", event["severity"], event["port"], "Oil", event["timestamp"]),
+                )
+                event["id"] = cursor.lastrowid
+                ids.append(event["id"])
+                inserted.append(event)
+            engine.on_insert(inserted)
+
+        expected, actual = reference(conn), engine.snapshot()
+        if expected != actual:
+            print(f"mismatch after operation {step}: expected {expected}, got {actual}")
+            return 1
+
+    print(f"{args.operations} operations, engine matched the reference formula after every one")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
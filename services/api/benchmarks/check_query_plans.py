@@ -0,0 +1,119 @@
+"""Fail if any route query regresses to a full table scan or a sort.
+
+Usage: python benchmarks/check_query_plans.py
+
+Builds a migrated throwaway database, calls every GET route in-process with
+tracing enabled on the pooled connections, and runs EXPLAIN QUERY PLAN on
+each SELECT that was executed. Exits non-zero on:
+
+* a temp B-tree for ORDER BY / GROUP BY / DISTINCT (an unindexed sort)
+* a plain table SCAN on a statement with a WHERE clause
+* a non-covering index SCAN on a statement with a WHERE clause
+"""
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Extra query strings worth planning beyond each route's defaults
+ROUTE_PARAMS = {
+    "/api/analytics/trends": [{"days": 3650}],
+    "/api/events": [{"tag": ["strike", "port"]}, {"commodity": "Oil"}, {"region": "Asia"}, {"min_severity": 0.5}],
+    "/api/events/facets": [{"commodity": "Oil"}, {"tag": "strike"}],
+    "/api/news/sentiment": [{"window": "7d", "half_life": 24}],
+    "/api/ports": [{"bbox": "-10,20,80,60"}, {"bbox": "170,-60,-170,60", "zoom": 3}],
+    "/api/ports/near": [{"lat": 51.9, "lon": 4.5, "radius_km": 1000}],
+    "/api/search": [{"q": "port"}, {"q": "port*", "port": "Shanghai", "since": "2025-01-01", "until": "2025-12-31"}],
+}
+
+# Sorts that no index can serve: ranking by a computed BM25 score, bounded by
+# the candidate LIMIT in the subquery, and grouping R*Tree hits into map
+# clustering cells computed from their coordinates
+EXPECTED_SORTS = [
+    re.compile(r"ORDER BY score DESC LIMIT (\?|\d+)\s*$"),
+    re.compile(r"GROUP BY CAST\(\(p\.latitude \+ 90\.0\)"),
+]
+
+SAMPLE_PORT = ("Shanghai", "China", 31.23, 121.47, 0.5, 1)
+
+def collect_statements() -> list[str]:
+    import database
+    from fastapi.routing import APIRoute
+    from fastapi.testclient import TestClient
+
+    statements = []
+    connect = database.pool._connect
+
+    def traced_connect():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    database.pool._connect = traced_connect
+
+    from main import app
+    with TestClient(app, raise_server_exceptions=False) as client:
+        with database.get_db() as conn:
+            conn.execute('INSERT INTO ports (name, country, latitude, longitude, risk_score, active_events) VALUES (?, ?, ?, ?, ?, ?)', SAMPLE_PORT)
+            conn.commit()
+        statements.clear()
+
+        for route in app.routes:
+            if not isinstance(route, APIRoute) or "GET" not in route.methods:
+                continue
+            path = re.sub(r"\{[^}]+\}", "1", route.path)
+            for params in [{}] + ROUTE_PARAMS.get(route.path, []):
+                client.get(path, params=params)
+
+    return [sql for sql in dict.fromkeys(statements) if sql.lstrip().upper().startswith("SELECT")]
+
+def _early_exit(sql: str, detail: str) -> bool:
+    # Walking an index in ORDER BY order under a LIMIT stops after LIMIT
+    # matches; residual filters (e.g. a severity range) cannot use it anyway
+    index = detail.split("USING INDEX ")[1].split()[0]
+    order = re.search(r"ORDER BY (\w+) DESC, id DESC LIMIT", sql)
+    return order is not None and index == f"idx_events_{order.group(1)}"
+
+def problems_for(conn, sql: str) -> list[str]:
+    filtered = re.search(r"\bWHERE\b", sql, re.IGNORECASE) is not None
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[3]
+        if detail.startswith("USE TEMP B-TREE"):
+            if not any(pattern.search(sql) for pattern in EXPECTED_SORTS):
+                problems.append(detail)
+        elif detail.startswith("SCAN (subquery") or re.search(r"VIRTUAL TABLE INDEX (\d+:M|2:\w)", detail):
+            # Reading a materialized subquery, an FTS5 MATCH lookup or an
+            # R*Tree search constrained on its coordinates
+            continue
+        elif detail.startswith("SCAN ") and "USING INDEX" in detail and _early_exit(sql, detail):
+            continue
+        elif detail.startswith("SCAN ") and filtered and "COVERING INDEX" not in detail:
+            problems.append(detail)
+    return problems
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TRADEGUARD_DB_PATH"] = str(Path(tmp) / "plans.db")
+        statements = collect_statements()
+
+        import sqlite3
+        conn = sqlite3.connect(os.environ["TRADEGUARD_DB_PATH"])
+        failures = 0
+        for sql in statements:
+            problems = problems_for(conn, sql)
+            status = "FAIL" if problems else "ok"
+            print(f"[{status:>4}] {' '.join(sql.split())}")
+            for problem in problems:
+                print(f"         {problem}")
+            failures += bool(problems)
+        conn.close()
+
+    print(f"{len(statements)} statements checked, {failures} regressed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Check that sequenced changes reach WebSocket subscribers in seq order.
+
+Usage: python benchmarks/check_stream_order.py [--changes 2000] [--seed 7]
+
+Feeds an in-process EventBroker a stream of sequenced changes the way two
+workers would: some published here (singly and in batches), the rest
+relayed, shuffled within a small window so later seqs often arrive before
+earlier ones. An unfiltered subscriber must receive every seq exactly
+once, in order. Then drops one seq for good and checks the changes after
+it are released, still in order, once the reorder timeout passes. Exits
+non-zero on the first failure.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("TRADEGUARD_STREAM_REORDER_TIMEOUT", "0.2")
+
+class RecordingSocket:
+    def __init__(self):
+        self.seqs = []
+
+    async def send_json(self, message: dict):
+        events = message["events"] if message.get("type") == "batch" else [message]
+        self.seqs.extend(event["seq"] for event in events)
+
+def change(seq: int) -> dict:
+    return {"type": "event", "op": "insert", "id": seq, "port": "Suez", "commodity": "Oil", "severity": 0.5, "seq": seq}
+
+async def feed(broker, seqs: list[int], rng: random.Random):
+    from broker import batch_message
+    position = 0
+    while position < len(seqs):
+        size = rng.choice((1, 1, 3))
+        messages = [change(seq) for seq in seqs[position:position + size]]
+        position += size
+        if rng.random() < 0.5:
+            broker.publish_batch(messages)
+        else:
+            broker._relayed(messages[0] if len(messages) == 1 else batch_message(messages))
+        await asyncio.sleep(0)
+
+async def check(changes: int, seed: int) -> list[str]:
+    from broker import EventBroker, REORDER_TIMEOUT
+
+    rng = random.Random(seed)
+    broker = EventBroker()
+    await broker.start()
+    socket = RecordingSocket()
+    subscription = broker.subscribe(socket)
+    # Deep enough that the check never overflows it
+    subscription.queue = asyncio.Queue(changes + 10)
+    sender = asyncio.create_task(broker.serve(subscription))
+
+    start = broker.delivered_seq + 1
+    seqs = list(range(start, start + changes))
+    # Each change lands at most a few places away from its turn
+    shuffled = sorted(seqs, key=lambda seq: seq + rng.uniform(0, 6))
+    await feed(broker, shuffled, rng)
+    await asyncio.sleep(0.05)
+
+    failures = []
+    if socket.seqs != seqs:
+        out_of_order = sum(1 for a, b in zip(socket.seqs, socket.seqs[1:]) if b != a + 1)
+        failures.append(f"reordered stream: {len(socket.seqs)} of {changes} changes delivered, {out_of_order} out of order")
+    if broker.gaps:
+        failures.append(f"{broker.gaps} gaps released by timeout while every seq arrived")
+
+    # One seq never arrives: what follows it is held, then released in order
+    socket.seqs.clear()
+    missing = start + changes
+    await feed(broker, [missing + 1, missing + 3, missing + 2], rng)
+    await asyncio.sleep(0)
+    if socket.seqs:
+        failures.append(f"changes after a missing seq were delivered without waiting: {socket.seqs}")
+    await asyncio.sleep(REORDER_TIMEOUT + 0.1)
+    if socket.seqs != [missing + 1, missing + 2, missing + 3] or broker.gaps != 1:
+        failures.append(f"after the reorder timeout expected {[missing + 1, missing + 2, missing + 3]}, got {socket.seqs}")
+
+    sender.cancel()
+    await broker.stop()
+    return failures
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--changes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    failures = asyncio.run(check(args.changes, args.seed))
+    for failure in failures:
+        print(failure)
+    if failures:
+        return 1
+    print(f"{args.changes} shuffled changes delivered in seq order; a missing seq was given up on after the reorder timeout")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Check that /api/health stays responsive while long analytics queries run.
+
+Usage: python benchmarks/event_loop_latency.py [--events 500000] [--concurrency 4]
+
+Builds a throwaway database, then samples /api/health latency in-process
+while /api/analytics/trends?days=3650 requests run concurrently.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Every simulated client shares one address; concurrency limits stay on
+os.environ.setdefault("TRADEGUARD_ADMISSION_RATE_LIMITS", "0")
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def build_database(events: int):
+    from database import get_db, init_db
+    init_db()
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with get_db() as conn:
+        conn.executemany(
+            'INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                (f"Synthetic event {i}", "Load test", round(rng.random(), 2), "Shanghai", "Electronics",
+                 (now - timedelta(minutes=rng.randrange(3650 * 24 * 60))).isoformat() + "Z")
+                for i in range(events)
+            ),
+        )
+        conn.commit()
+
+async def sample_health(client, duration: float) -> list[float]:
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get("/api/health")
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+    return samples
+
+async def hammer_trends(client, stop: asyncio.Event) -> int:
+    completed = 0
+    while not stop.is_set():
+        await client.get("/api/analytics/trends", params={"days": 3650})
+        completed += 1
+    return completed
+
+async def run(args):
+    import httpx
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        idle = await sample_health(client, args.duration)
+
+        stop = asyncio.Event()
+        workers = [asyncio.create_task(hammer_trends(client, stop)) for _ in range(args.concurrency)]
+        loaded = await sample_health(client, args.duration)
+        stop.set()
+        trend_requests = sum(await asyncio.gather(*workers))
+
+    for label, samples in (("idle", idle), ("under trends load", loaded)):
+        print(f"/api/health {label:>18}: n={len(samples):5d} p50={percentile(samples, 50):7.2f}ms "
+              f"p99={percentile(samples, 99):7.2f}ms max={max(samples):7.2f}ms")
+    print(f"/api/analytics/trends?days=3650 completed: {trend_requests}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TRADEGUARD_DB_PATH"] = str(Path(tmp) / "bench.db")
+        build_database(args.events)
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Measure batch forecast throughput across process pool sizes.
+
+Usage: python benchmarks/forecast_batch.py [--skus 100000] [--ports 200] [--workers 1,2,4] [--chunk-size 1000]
+
+Builds a database with synthetic ports, 90 days of events and SKUs served
+by three random ports each, then recomputes every SKU's forecast with the
+batch scheduler at each worker count and reports SKUs/sec. Then adds
+events at one port and checks that a watermark run only recomputes the
+SKUs served by that port, and that a job queued through a scheduler that is
+not running jobs (as in a standby worker) is run by the one that is.
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def build(path: Path, skus: int, ports: int, seed: int):
+    from migrations import migrate
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    names = [f"Port {i}" for i in range(ports)]
+    now = datetime.utcnow()
+    conn.executemany(
+        'INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            (f"Event {day}-{i}", "Synthetic", round(rng.random(), 2), name, "Goods",
+             (now - timedelta(days=day, seconds=rng.randrange(86400))).isoformat() + "Z")
+            for i, name in enumerate(names)
+            for day in range(90)
+            if rng.random() < 0.6
+        ],
+    )
+    conn.executemany(
+        'INSERT INTO skus (id, name, commodity, ports, risk_level) VALUES (?, ?, ?, ?, ?)',
+        [(i, f"SKU {i}", "Goods", ",".join(rng.sample(names, 3)), round(rng.random(), 2)) for i in range(1, skus + 1)],
+    )
+    conn.commit()
+    conn.close()
+
+async def wait_for(job_id: int) -> dict:
+    import forecasting
+    from repositories import run_query
+
+    while True:
+        job = await run_query(forecasting.job, job_id)
+        if job["status"] not in ("queued", "running"):
+            break
+        await asyncio.sleep(0.05)
+    if job["status"] != "completed":
+        raise RuntimeError(f"job {job_id} {job['status']}: {job['error']}")
+    return job
+
+async def run_job(scheduler, sku_ids=None, submitter=None) -> tuple:
+    job = await (submitter or scheduler).submit(sku_ids)
+    start = time.perf_counter()
+    job = await wait_for(job["id"])
+    return job, time.perf_counter() - start
+
+async def bench(path: Path, worker_counts: list[int], chunk_size: int, skus: int) -> int:
+    import database
+    from forecast_jobs import ForecastScheduler
+    from repositories import shutdown_executor
+
+    database.pool.open(path)
+    all_ids = list(range(1, skus + 1))
+    try:
+        for workers in worker_counts:
+            scheduler = ForecastScheduler(workers=workers, chunk_size=chunk_size, interval=0)
+            await scheduler.start()
+            # Warm up the worker processes so spawn time is not measured
+            await run_job(scheduler, all_ids[:workers])
+            job, elapsed = await run_job(scheduler, all_ids)
+            print(f"workers={workers:<3} skus={job['sku_count']:<8} chunks={job['chunks']:<5} "
+                  f"seconds={elapsed:7.2f}  skus/sec={job['sku_count'] / elapsed:10,.0f}")
+            await scheduler.stop()
+
+        scheduler = ForecastScheduler(workers=worker_counts[-1], chunk_size=chunk_size, interval=0)
+        await scheduler.start()
+        await run_job(scheduler)  # first run covers everything and sets the watermark
+        with database.get_db() as conn:
+            conn.execute(
+                'INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                ("Fresh event", "Synthetic", 0.9, "Port 0", "Goods", datetime.utcnow().isoformat() + "Z"),
+            )
+            conn.commit()
+            expected = conn.execute("SELECT COUNT(*) FROM skus WHERE ',' || ports || ',' LIKE '%,Port 0,%'").fetchone()[0]
+        job, elapsed = await run_job(scheduler)
+        print(f"incremental run: {job['sku_count']} SKUs recomputed (expected {expected}) in {elapsed:.2f}s")
+
+        standby = ForecastScheduler(workers=1, chunk_size=chunk_size, interval=0)
+        queued, _ = await run_job(scheduler, all_ids[:chunk_size * 2], submitter=standby)
+        await scheduler.stop()
+        print(f"job queued by a standby scheduler: {queued['status']}, "
+              f"{queued['chunks_completed']}/{queued['chunks']} chunks, {queued['skus_completed']} SKUs")
+        if queued["skus_completed"] != min(chunk_size * 2, skus):
+            return 1
+        return 0 if job["sku_count"] == expected else 1
+    finally:
+        shutdown_executor()
+        database.pool.close()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skus", type=int, default=100_000)
+    parser.add_argument("--ports", type=int, default=200)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        build(path, args.skus, args.ports, args.seed)
+        return asyncio.run(bench(path, [int(w) for w in args.workers.split(",")], args.chunk_size, args.skus))
+
+if __name__ == "__main__":
+    sys.exit(main())
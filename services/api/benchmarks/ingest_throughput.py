@@ -0,0 +1,78 @@
+"""Measure bulk event ingestion throughput at different batch sizes.
+
+Usage: python benchmarks/ingest_throughput.py [--events 20000] [--batch-sizes 1,10,100,1000,10000]
+
+Streams NDJSON to POST /api/events/bulk in-process (validation, batched
+transactions, rollup triggers, GTRI and broker updates included) against a
+fresh database per batch size, and reports events/sec.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PORTS = ["Shanghai", "Singapore", "Rotterdam", "Suez", "Santos", "Dubai", "Hamburg", "Los Angeles"]
+COMMODITIES = ["Electronics", "Oil", "Grains", "Auto Parts", "Pharmaceuticals"]
+
+def ndjson_lines(count: int, seed: int):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for i in range(count):
+        yield (json.dumps({
+            "title": f"Disruption {i}",
+            "summary": "Synthetic feed event",
+            "severity": round(rng.random(), 2),
+            "port": rng.choice(PORTS),
+            "commodity": rng.choice(COMMODITIES),
+            "timestamp": (now - timedelta(seconds=rng.randrange(90 * 86400))).isoformat() + "Z",
+            "tags": ["synthetic"],
+        }) + "\n").encode()
+
+async def run_one(path: Path, events: int, batch_size: int, seed: int) -> dict:
+    import httpx
+    import database
+    from main import app, lifespan
+
+    database.pool.open(path)
+
+    async def body():
+        for line in ndjson_lines(events, seed):
+            yield line
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/events/bulk", params={"batch_size": batch_size}, content=body(),
+                headers={"content-type": "application/x-ndjson"},
+            )
+            elapsed = time.perf_counter() - start
+    result = response.json()
+    return {"batch_size": batch_size, "inserted": result["inserted"], "seconds": elapsed,
+            "events_per_sec": result["inserted"] / elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--batch-sizes", default="1,10,100,1000,10000")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            # Fresh database per run so every batch size inserts the same rows
+            path = Path(tmp) / f"ingest_{batch_size}.db"
+            result = asyncio.run(run_one(path, args.events, batch_size, args.seed))
+            print(f"batch_size={result['batch_size']:>6} inserted={result['inserted']:>7} "
+                  f"time={result['seconds']:7.2f}s throughput={result['events_per_sec']:10.0f} events/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Time the port risk engine and check incremental scores against batch recomputes.
+
+Usage: python benchmarks/port_risk.py [--ports 2000] [--events 500000] [--batches 200] [--seed 7]
+
+Creates ports and a history of events spread over the decay horizon in a
+temporary database, then:
+
+1. applies further ingest batches through PortRiskEngine.apply_inserted
+   (as ingest does, one transaction each), with time advancing between
+   them, and after every batch checks the ports it touched against a batch
+   recompute at the same instant: active_events must be equal and scores
+   within 0.01 (incremental pressure keeps the tiny contributions of events
+   past the decay horizon, which may flip a rounding). Untouched ports only
+   catch up on the recompute, as they do on the periodic tick;
+2. times the NumPy batch recompute against a per-port loop that reads each
+   port's events through idx_events_port_timestamp and decays them in
+   Python, and checks that both produce the same scores and counts.
+
+Exits non-zero on any mismatch.
+"""
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from migrations import migrate
+from port_risk import PortRiskEngine, SATURATION
+
+def populate(conn, rng: random.Random, ports: int, events: int, now: datetime, horizon: float):
+    conn.executemany(
+        'INSERT INTO ports (name, country, latitude, longitude, risk_score, active_events) VALUES (?, ?, 0, 0, 0, 0)',
+        [(f"Port {i}", "Nowhere") for i in range(ports)],
+    )
+    # Oldest first, as events arrive
+    ages = sorted((rng.uniform(0, horizon * 1.2) for _ in range(events)), reverse=True)
+    conn.executemany(
+        'INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+        ((f"event {i}", "", round(rng.random(), 2), f"Port {rng.randrange(ports)}", "Oil",
+          (now - timedelta(hours=age)).isoformat()) for i, age in enumerate(ages)),
+    )
+    conn.commit()
+
+def per_port_loop(conn, engine: PortRiskEngine, now: datetime) -> dict:
+    """Baseline: one indexed query per port, decayed row by row"""
+    horizon = (now - timedelta(hours=engine.horizon)).isoformat()
+    results = {}
+    for port_id, name in conn.execute('SELECT id, name FROM ports').fetchall():
+        pressure, active = 0.0, 0
+        for age, severity in conn.execute(
+            'SELECT (julianday(?) - julianday(timestamp)) * 24.0, severity FROM events WHERE port = ? AND timestamp >= ?',
+            (now.isoformat(), name, horizon),
+        ):
+            age = max(age, 0.0)
+            pressure += severity * 2.0 ** (-age / engine.half_life)
+            active += age <= engine.active_window
+        results[port_id] = (round(1.0 - math.exp(-pressure / SATURATION), 2), active)
+    return results
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ports", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = PortRiskEngine()
+    now = datetime(2025, 6, 1)
+    mismatches = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / "risk.db")
+        conn.execute('PRAGMA journal_mode=WAL')
+        migrate(conn)
+        populate(conn, rng, args.ports, args.events, now, engine.horizon)
+        engine.recompute(conn, now)
+        print(f"{args.ports} ports, {args.events} events; initial batch recompute {engine.stats()['batch']['last_ms']:.1f}ms")
+
+        offset = args.events
+        for batch in range(args.batches):
+            now += timedelta(minutes=rng.uniform(0, 30))
+            conn.execute('BEGIN IMMEDIATE')
+            high_water = conn.execute('SELECT MAX(id) FROM events').fetchone()[0]
+            rows = [(f"event {offset + i}", "", round(rng.random(), 2), f"Port {rng.randrange(args.ports)}", "Oil",
+                     (now - timedelta(hours=rng.expovariate(1 / 6))).isoformat()) for i in range(args.batch_size)]
+            conn.executemany('INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)', rows)
+            touched = {row[3] for row in rows}
+            engine.apply_inserted(conn, high_water, now)
+            conn.commit()
+            offset += args.batch_size
+            incremental = {port_id: (score, active) for port_id, score, active in conn.execute(
+                'SELECT id, risk_score, active_events FROM ports')}
+            drifted = [port for port in engine.recompute(conn, now) if port["port"] in touched
+                       and port["active_events"] != incremental[port["id"]][1]
+                       or port["port"] in touched and abs(port["risk_score"] - incremental[port["id"]][0]) > 0.011]
+            if drifted:
+                mismatches += 1
+                print(f"MISMATCH after batch {batch}: {len(drifted)} ports differ from a recompute, e.g. "
+                      f"{drifted[0]} vs {incremental[drifted[0]['id']]}")
+        stats = engine.stats()
+        print(f"incremental: {stats['incremental']['runs']} batches of {args.batch_size} events, "
+              f"avg {stats['incremental']['avg_ms']:.2f}ms, max {stats['incremental']['max_ms']:.2f}ms")
+
+        # Jump ahead so decay and the active window change most ports
+        now += timedelta(hours=engine.half_life)
+        started = time.perf_counter()
+        expected = per_port_loop(conn, engine, now)
+        loop_time = time.perf_counter() - started
+        started = time.perf_counter()
+        changed = engine.recompute(conn, now)
+        batch_time = time.perf_counter() - started
+        actual = {port_id: (score, active) for port_id, score, active in conn.execute('SELECT id, risk_score, active_events FROM ports')}
+        differing = [port_id for port_id in expected if expected[port_id] != actual[port_id]]
+        if differing:
+            mismatches += 1
+            print(f"MISMATCH batch vs per-port loop on {len(differing)} ports, e.g. {differing[0]}: "
+                  f"{actual[differing[0]]} != {expected[differing[0]]}")
+        print(f"decay tick: numpy batch {batch_time * 1000:.1f}ms ({len(changed)} ports changed), "
+              f"per-port loop {loop_time * 1000:.1f}ms, {loop_time / batch_time:.1f}x")
+        conn.close()
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
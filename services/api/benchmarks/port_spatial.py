@@ -0,0 +1,179 @@
+"""Compare R*Tree port lookups with linear scans of the ports table.
+
+Usage: python benchmarks/port_spatial.py [--ports 200000] [--queries 200] [--repeat 3] [--seed 7]
+
+Builds a temporary database through the migrations (so the R*Tree is
+filled by the triggers as ports are inserted), with ports scattered around
+a few dozen coastal hubs. Random 1024x768 map viewports at zooms 3-11 (some
+crossing the antimeridian; bbox only, and clustered at their zoom) and
+radius searches are run through geo.in_bbox, geo.viewport and geo.near and through
+baselines that read every port: a BETWEEN filter, the same clustering GROUP
+BY over the whole table, and haversine over every row. Reports the best
+total time of each workload, with wide (zoom < 6) and close (zoom >= 6)
+viewports apart. Also checks that radius searches drawn through an existing
+port, north, south, east or west of the centre, include it. Exits non-zero
+if any result differs.
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import geo
+from migrations import migrate
+
+HUBS = 40
+
+def populate(conn, ports: int, seed: int) -> float:
+    rng = np.random.default_rng(seed)
+    hubs = np.column_stack([rng.uniform(-60, 70, HUBS), rng.uniform(-180, 180, HUBS)])
+    picks = rng.integers(HUBS, size=ports)
+    latitudes = np.clip(hubs[picks, 0] + rng.normal(0, 3, ports), -89.9, 89.9)
+    longitudes = (hubs[picks, 1] + rng.normal(0, 3, ports) + 180.0) % 360.0 - 180.0
+    risks = rng.random(ports).round(2)
+    events = rng.integers(0, 5, size=ports)
+    start = time.perf_counter()
+    conn.executemany(
+        'INSERT INTO ports (name, country, latitude, longitude, risk_score, active_events) VALUES (?, ?, ?, ?, ?, ?)',
+        ((f"Port {i}", f"Country {picks[i]}", float(latitudes[i]), float(longitudes[i]), float(risks[i]), int(events[i]))
+         for i in range(ports)),
+    )
+    conn.commit()
+    return time.perf_counter() - start
+
+def linear_bbox(conn, min_lon, min_lat, max_lon, max_lat) -> list:
+    rows = []
+    for west, east in geo._lon_ranges(min_lon, max_lon):
+        rows += conn.execute(
+            f'SELECT {geo.PORT_COLUMNS} FROM ports p NOT INDEXED WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?',
+            (min_lat, max_lat, west, east),
+        ).fetchall()
+    return rows
+
+def linear_viewport(conn, min_lon, min_lat, max_lon, max_lat, zoom) -> list:
+    cell = geo.cell_size(zoom)
+    rows = []
+    for west, east in geo._lon_ranges(min_lon, max_lon):
+        rows += conn.execute('''
+            SELECT COUNT(*), MIN(id), AVG(risk_score), SUM(active_events) FROM ports NOT INDEXED
+            WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+            GROUP BY CAST((latitude + 90.0) / ? AS INTEGER), CAST((longitude + 180.0) / ? AS INTEGER)
+        ''', (min_lat, max_lat, west, east, cell, cell)).fetchall()
+    return rows
+
+def linear_near(conn, lat, lon, radius_km, limit) -> list:
+    hits = []
+    for port_id, latitude, longitude in conn.execute('SELECT id, latitude, longitude FROM ports'):
+        distance = geo.haversine_km(lat, lon, latitude, longitude)
+        if distance <= radius_km:
+            hits.append((round(distance, 3), port_id))
+    hits.sort()
+    return hits[:limit]
+
+def viewports(rng, count: int) -> list[tuple]:
+    boxes = []
+    for _ in range(count):
+        zoom = int(rng.integers(3, 12))
+        # A 1024x768 map at `zoom`
+        width = min(360.0 / 2 ** zoom * 4, 359.0)
+        height = min(width * 0.75, 170.0)
+        lat = rng.uniform(-85 + height / 2, 85 - height / 2)
+        lon = rng.uniform(-180, 180)
+        wrap = lambda value: (value + 180.0) % 360.0 - 180.0
+        boxes.append((wrap(lon - width / 2), lat - height / 2, wrap(lon + width / 2), lat + height / 2, zoom))
+    return boxes
+
+def rim_points(conn, rng, ports: int, count: int) -> list[tuple]:
+    """(lat, lon, radius_km, port id) of radius searches whose circle passes through that port"""
+    points = []
+    for port_id in rng.integers(1, ports + 1, size=count):
+        latitude, longitude = conn.execute('SELECT latitude, longitude FROM ports WHERE id = ?', (int(port_id),)).fetchone()
+        offset = float(rng.uniform(0.5, 9.0))
+        lat, lon = [(latitude - offset, longitude), (latitude + offset, longitude),
+                    (latitude, longitude - offset), (latitude, longitude + offset)][len(points) % 4]
+        lat = min(max(lat, -89.9), 89.9)
+        lon = (lon + 180.0) % 360.0 - 180.0
+        points.append((lat, lon, geo.haversine_km(lat, lon, latitude, longitude) + 1e-6, int(port_id)))
+    return points
+
+def best(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ports", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed + 1)
+    boxes = viewports(rng, args.queries)
+    points = [(float(rng.uniform(-60, 70)), float(rng.uniform(-180, 180)), float(rng.choice([50, 250, 1000])))
+              for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / "ports.db")
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        migrate(conn)
+        elapsed = populate(conn, args.ports, args.seed)
+        print(f"inserted {args.ports} ports with R*Tree triggers in {elapsed:.1f}s ({args.ports / elapsed:,.0f} rows/s)")
+
+        mismatches = 0
+        for *box, zoom in boxes:
+            if sorted(row["id"] for row in geo.in_bbox(conn, *box)) != sorted(row["id"] for row in linear_bbox(conn, *box)):
+                mismatches += 1
+                print(f"MISMATCH bbox {box}")
+            visible = geo.viewport(conn, *box, zoom)
+            cells = sorted([(1, row["id"]) for row in visible["ports"]] + [(c["port_count"], None) for c in visible["clusters"]],
+                           key=lambda cell: (cell[0], cell[1] or 0))
+            expected = sorted(((count, port_id if count == 1 else None) for count, port_id, _, _ in linear_viewport(conn, *box, zoom)),
+                              key=lambda cell: (cell[0], cell[1] or 0))
+            if cells != expected:
+                mismatches += 1
+                print(f"MISMATCH viewport {box} zoom {zoom}")
+        for lat, lon, radius in points:
+            got = [(hit["distance_km"], hit["id"]) for hit in geo.near(conn, lat, lon, radius, 50)]
+            if got != linear_near(conn, lat, lon, radius, 50):
+                mismatches += 1
+                print(f"MISMATCH near {lat:.3f},{lon:.3f} {radius}km")
+        for lat, lon, radius, port_id in rim_points(conn, rng, args.ports, max(args.queries // 4, 4)):
+            if port_id not in {hit["id"] for hit in geo.near(conn, lat, lon, radius, args.ports)}:
+                mismatches += 1
+                print(f"MISSED port {port_id} on the edge of near {lat:.3f},{lon:.3f} {radius:.3f}km")
+
+        workloads = []
+        for band, selected in (("wide", [box for box in boxes if box[4] < 6]), ("close", [box for box in boxes if box[4] >= 6])):
+            hits = sum(len(geo.in_bbox(conn, *box)) for *box, _ in selected) / max(len(selected), 1)
+            print(f"{band}: {len(selected)} viewports, {hits:,.0f} ports visible on average")
+            workloads += [
+                (f"bbox {band}", lambda selected=selected: [geo.in_bbox(conn, *box) for *box, _ in selected],
+                 lambda selected=selected: [linear_bbox(conn, *box) for *box, _ in selected]),
+                (f"clusters {band}", lambda selected=selected: [geo.viewport(conn, *box, zoom) for *box, zoom in selected],
+                 lambda selected=selected: [linear_viewport(conn, *box, zoom) for *box, zoom in selected]),
+            ]
+        workloads.append(("radius", lambda: [geo.near(conn, *point) for point in points],
+                          lambda: [linear_near(conn, *point, 50) for point in points]))
+        print(f"{'workload':<18}{'rtree':>12}{'linear':>12}{'speedup':>10}")
+        for name, indexed, linear in workloads:
+            indexed_time = best(indexed, args.repeat)
+            linear_time = best(linear, args.repeat)
+            print(f"{name:<18}{indexed_time * 1000:>10.1f}ms{linear_time * 1000:>10.1f}ms{linear_time / indexed_time:>9.1f}x")
+        conn.close()
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
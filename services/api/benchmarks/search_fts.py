@@ -0,0 +1,133 @@
+"""Compare FTS5 search with a LIKE '%term%' scan over a large events corpus.
+
+Usage: python benchmarks/search_fts.py [--rows 1000000] [--repeat 5] [--seed 7]
+
+Builds a temporary database through the migrations (so the FTS index is
+filled by the triggers as rows are inserted), with titles and summaries
+drawn from a Zipf-distributed vocabulary. Each query (rare, medium and
+common terms, a two-term AND, a prefix and a port-filtered search) is run
+through fulltext.search (BM25, top 20) and two LIKE baselines: collecting
+every match, which any relevance order (or client-side filtering) needs,
+and the newest 20 matches, which stops early on common terms. Reports the
+best time of each; exits non-zero if FTS5 and LIKE disagree on how many rows
+match a term.
+"""
+import argparse
+import string
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fulltext
+from migrations import migrate
+
+PORTS = ["Shanghai", "Singapore", "Rotterdam", "Suez", "Santos", "Dubai", "Hamburg", "Los Angeles"]
+COMMODITIES = ["Electronics", "Oil", "Grain", "Steel", "Pharmaceuticals"]
+SUMMARY_WORDS = 20
+EPOCH = datetime(2024, 1, 1)
+
+def vocabulary() -> list[str]:
+    # Fixed-length words ending in "x": no stemming suffixes and no word is a
+    # substring of another, so LIKE and FTS5 must match the same rows
+    letters = string.ascii_lowercase
+    return [f"k{a}{b}{c}x" for a in letters for b in letters for c in letters]
+
+def populate(conn, rows: int, seed: int) -> float:
+    rng = np.random.default_rng(seed)
+    words = np.array(vocabulary())
+    weights = 1.0 / np.arange(1, len(words) + 1)
+    weights /= weights.sum()
+    start = time.perf_counter()
+    for offset in range(0, rows, 50_000):
+        count = min(50_000, rows - offset)
+        text = words[rng.choice(len(words), size=(count, SUMMARY_WORDS + 3), p=weights)]
+        ports = rng.integers(len(PORTS), size=count)
+        commodities = rng.integers(len(COMMODITIES), size=count)
+        conn.executemany(
+            'INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                (f"{PORTS[ports[i]]} {' '.join(text[i, :3])}", " ".join(text[i, 3:]), 0.5, PORTS[ports[i]],
+                 COMMODITIES[commodities[i]], (EPOCH + timedelta(seconds=30 * (offset + i))).isoformat())
+                for i in range(count)
+            ),
+        )
+        conn.commit()
+    return time.perf_counter() - start
+
+def like(conn, terms: list[str], port: str = None, limit: int = -1):
+    filters = ["(title LIKE ? OR summary LIKE ?)"] * len(terms)
+    params = [pattern for term in terms for pattern in (f"%{term}%", f"%{term}%")]
+    if port is not None:
+        filters.append("port = ?")
+        params.append(port)
+    return conn.execute(
+        f'SELECT id, title FROM events WHERE {" AND ".join(filters)} ORDER BY timestamp DESC, id DESC LIMIT ?', (*params, limit)
+    ).fetchall()
+
+def best(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    words = vocabulary()
+    rare, medium, common = words[len(words) - 1], words[200], words[0]
+    queries = [
+        ("rare term", [rare], None),
+        ("medium term", [medium], None),
+        ("common term", [common], None),
+        ("two terms", [common, words[1]], None),
+        ("prefix", [common[:4] + "*"], None),
+        ("term + port", [medium], "Rotterdam"),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / "search.db")
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        migrate(conn)
+        elapsed = populate(conn, args.rows, args.seed)
+        print(f"inserted {args.rows} events with FTS triggers in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+
+        mismatches = 0
+        for term in (rare, medium, common):
+            fts_count = conn.execute('SELECT COUNT(*) FROM events_fts WHERE events_fts MATCH ?', (f'"{term}"',)).fetchone()[0]
+            like_count = conn.execute(
+                'SELECT COUNT(*) FROM events WHERE title LIKE ? OR summary LIKE ?', (f"%{term}%", f"%{term}%")
+            ).fetchone()[0]
+            print(f"{term}: {fts_count} matches")
+            if fts_count != like_count:
+                mismatches += 1
+                print(f"MISMATCH {term}: fts={fts_count} like={like_count}")
+
+        print(f"{'query':<14}{'fts5':>12}{'like all':>12}{'speedup':>10}{'like newest':>14}")
+        for name, terms, port in queries:
+            match = fulltext.match_query(" ".join(terms))
+            fts_time = best(lambda: fulltext.search(conn, match, ("events",), port=port), args.repeat)
+            like_terms = [term.rstrip("*") for term in terms]
+            all_time = best(lambda: like(conn, like_terms, port), args.repeat)
+            newest_time = best(lambda: like(conn, like_terms, port, 20), args.repeat)
+            print(f"{name:<14}{fts_time * 1000:>10.2f}ms{all_time * 1000:>10.2f}ms{all_time / fts_time:>9.1f}x"
+                  f"{newest_time * 1000:>12.2f}ms")
+        conn.close()
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Compare the response_model list path with the pre-built row encoders.
+
+Usage: python benchmarks/serialization.py [--sizes 10,100,1000,10000] [--repeat 20]
+
+Fills an in-memory database with events and SKUs (integer severities,
+non-ASCII titles, JSON and legacy comma tags), then renders each response
+size both ways: dict(row) + FastAPI's serialize_response + JSONResponse, as
+the list routes did, and serialization.ModelEncoder straight from the
+cursor. Reports the best time per path and exits non-zero if the bytes
+differ.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from migrations import migrate
+from models import Event, SKU
+from repositories import _event
+from serialization import event_encoder, sku_encoder
+
+PORTS = ["Shanghai", "Singapore", "Rotterdam", "Suez", "Santos", "Dubai", "Hamburg", "Los Angeles"]
+
+def populate(conn, count: int, rng: random.Random):
+    events = []
+    for i in range(count):
+        tags = json.dumps(["congestion", "délai"]) if i % 3 else "strike, weather"
+        severity = rng.choice([0, 1]) if i % 10 == 0 else round(rng.random(), 3)
+        events.append((f"Event {i} à {rng.choice(PORTS)}", "Summary " * 8, severity, rng.choice(PORTS),
+                       "Electronics", f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}", "Asia", "wire", rng.random(), tags))
+    conn.executemany(
+        'INSERT INTO events (title, summary, severity, port, commodity, timestamp, region, source, sentiment_score, tags) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', events)
+    conn.executemany(
+        'INSERT INTO skus (name, commodity, ports, risk_level) VALUES (?, ?, ?, ?)',
+        [(f"SKU-{i}", "Electronics", ",".join(rng.sample(PORTS, 2)), rng.choice([0, round(rng.random(), 3)])) for i in range(count)])
+    conn.commit()
+
+def legacy(model, to_dict):
+    field = create_response_field(name="response", type_=list[model])
+
+    def render(rows) -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=[to_dict(row) for row in rows]))
+        return JSONResponse(content).body
+    return render
+
+def best(fn, rows, repeat: int) -> tuple[float, bytes]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings), body
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    populate(conn, max(sizes), random.Random(args.seed))
+
+    paths = [
+        ("events", 'SELECT * FROM events ORDER BY timestamp DESC, id DESC LIMIT ?', legacy(Event, _event), event_encoder.encode),
+        ("skus", 'SELECT * FROM skus ORDER BY risk_level DESC LIMIT ?', legacy(SKU, dict), sku_encoder.encode),
+    ]
+    mismatches = 0
+    print(f"{'route':<8}{'rows':>8}{'response_model':>17}{'encoder':>12}{'speedup':>9}")
+    for name, sql, old, new in paths:
+        for size in sizes:
+            rows = conn.execute(sql, (size,)).fetchall()
+            old_time, old_body = best(old, rows, args.repeat)
+            new_time, new_body = best(new, rows, args.repeat)
+            if old_body != new_body:
+                mismatches += 1
+                print(f"MISMATCH {name} x{size}: {len(old_body)} vs {len(new_body)} bytes")
+            print(f"{name:<8}{size:>8}{old_time * 1000:>15.2f}ms{new_time * 1000:>10.2f}ms{old_time / new_time:>8.1f}x")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Compare SKU risk propagation through the port index with a full scan.
+
+Usage: python benchmarks/sku_propagation.py [--skus 100000] [--ports 200] [--events 200]
+
+Builds an in-memory database with SKUs served by three random ports each,
+then applies single-port events and recomputes the risk of the exposed
+SKUs two ways: through the in-memory port -> SKU index, and by scanning
+and splitting every skus.ports string. Reports ms per event for both and
+exits non-zero if they update a different set of SKUs.
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from migrations import migrate
+from sku_index import SkuPortIndex, port_risks
+
+def full_scan(conn, ports) -> int:
+    """The pre-index approach: split every SKU's port list to find the exposed ones"""
+    ports = set(ports)
+    affected = {}
+    for sku_id, names in conn.execute('SELECT id, ports FROM skus'):
+        sku_ports = [name.strip() for name in names.split(",") if name.strip()]
+        if ports.intersection(sku_ports):
+            affected[sku_id] = sku_ports
+    if not affected:
+        return 0
+    risks = port_risks(conn, set().union(*affected.values()))
+    conn.executemany('UPDATE skus SET risk_level = ? WHERE id = ?', [
+        (round(sum(risks[port] for port in sku_ports) / len(sku_ports), 2), sku_id)
+        for sku_id, sku_ports in affected.items()
+    ])
+    return len(affected)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--skus", type=int, default=100_000)
+    parser.add_argument("--ports", type=int, default=200)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = [f"Port {i}" for i in range(args.ports)]
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    start = time.perf_counter()
+    conn.executemany(
+        'INSERT INTO skus (id, name, commodity, ports, risk_level) VALUES (?, ?, ?, ?, 0)',
+        [(i, f"SKU {i}", "Goods", ",".join(rng.sample(names, 3))) for i in range(1, args.skus + 1)],
+    )
+    conn.commit()
+    print(f"loaded {args.skus} SKUs (sku_ports maintained by trigger) in {time.perf_counter() - start:.2f}s")
+
+    index = SkuPortIndex()
+    start = time.perf_counter()
+    index.rebuild(conn)
+    print(f"index rebuilt in {(time.perf_counter() - start) * 1000:.0f} ms: {index.stats()}")
+
+    events = [rng.choice(names) for _ in range(args.events)]
+    results = {}
+    for label, propagate in (("index", index.propagate), ("full scan", lambda c, ports: full_scan(c, ports))):
+        touched = []
+        start = time.perf_counter()
+        for i, port in enumerate(events):
+            conn.execute(
+                'INSERT INTO events (title, summary, severity, port, commodity, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                (f"{label} {i}", "Synthetic", rng.random(), port, "Goods", datetime.utcnow().isoformat() + "Z"),
+            )
+            touched.append(len(propagate(conn, [port])))
+            conn.commit()
+        elapsed = time.perf_counter() - start
+        results[label] = touched
+        print(f"{label:<10} {elapsed / args.events * 1000:8.2f} ms/event  "
+              f"({sum(touched) / args.events:,.0f} SKUs updated per event)")
+
+    if results["index"] != results["full scan"]:
+        print("FAIL: index and full scan updated different SKU counts")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Cross-worker broadcast for the event broker.
+
+Usage: python broadcast.py [--socket PATH]   (run the hub standalone)
+
+With uvicorn --workers N every worker has its own broker and its own
+WebSocket clients, so a message published in one worker has to be relayed
+to the others. A backend gives the broker that relay: each worker keeps one
+subscription to it and fans what arrives out to its local clients.
+
+  local  single process, nothing is relayed (the default)
+  unix   a hub on a Unix-domain socket relays newline-delimited JSON between
+         the workers of one host. The first worker to take the socket's lock
+         file hosts the hub in its event loop; if it exits, the others
+         reconnect and one of them takes over. A hub started with this script
+         holds the lock instead, so no worker hosts it.
+"""
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import tempfile
+
+BROADCAST_BACKEND = os.getenv("TRADEGUARD_BROADCAST", "local")
+BROADCAST_SOCKET = os.getenv("TRADEGUARD_BROADCAST_SOCKET", os.path.join(tempfile.gettempdir(), "tradeguard-broadcast.sock"))
+# Bytes the hub lets queue for one worker before dropping its connection
+HUB_BUFFER_LIMIT = int(os.getenv("TRADEGUARD_BROADCAST_BUFFER", str(4 * 1024 * 1024)))
+RECONNECT_DELAY = 0.05
+MAX_RECONNECT_DELAY = 2.0
+LINE_LIMIT = 1024 * 1024
+# Sent by a worker that reconnects to the hub, and delivered to its own broker
+RESYNC_MESSAGE = {"type": "resync"}
+
+class BroadcastHub:
+    """Relays every line a worker writes to all the other connected workers.
+
+    Lines are forwarded as bytes without being parsed. A worker that stops
+    reading is disconnected once HUB_BUFFER_LIMIT bytes are queued for it,
+    rather than growing the hub's memory; it reconnects and misses what was
+    sent meanwhile, as a slow WebSocket client would.
+    """
+
+    def __init__(self, path: str = BROADCAST_SOCKET, buffer_limit: int = HUB_BUFFER_LIMIT):
+        self.path = path
+        self.buffer_limit = buffer_limit
+        self._lock_file = None
+        self._server = None
+        self._writers: set = set()
+        self._handlers: set = set()
+        self.relayed = 0
+        self.dropped_workers = 0
+
+    def try_lock(self) -> bool:
+        """Take the hub lock without blocking; False if another process hosts the hub"""
+        lock_file = open(self.path + ".lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def start(self):
+        # Holding the lock means any socket file left behind is stale
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, self.path, limit=LINE_LIMIT)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            # Closing a worker's transport ends its handler's read loop
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                self.relayed += 1
+                for other in list(self._writers):
+                    if other is writer:
+                        continue
+                    if other.transport.get_write_buffer_size() > self.buffer_limit:
+                        self._drop(other)
+                    else:
+                        other.write(line)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def _drop(self, writer: asyncio.StreamWriter):
+        self._writers.discard(writer)
+        self.dropped_workers += 1
+        writer.transport.abort()
+
+    def stats(self) -> dict:
+        return {"workers": len(self._writers), "relayed": self.relayed, "dropped_workers": self.dropped_workers}
+
+class LocalBackend:
+    """Single-process backend: the broker's own fan-out is all there is"""
+
+    name = "local"
+
+    async def start(self, deliver):
+        pass
+
+    async def stop(self):
+        pass
+
+    def publish(self, message: dict):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+class UnixSocketBackend:
+    """Relays published messages to the other workers through a BroadcastHub.
+
+    The publishing worker delivers to its own clients straight away; the
+    hub only carries the message to the rest. Messages published while the
+    hub is unreachable reach local clients only and are counted as unrelayed.
+    """
+
+    name = "unix"
+
+    def __init__(self, path: str = BROADCAST_SOCKET):
+        self.path = path
+        self.hub: BroadcastHub = None
+        self._deliver = None
+        self._writer: asyncio.StreamWriter = None
+        self._task: asyncio.Task = None
+        self._connected = asyncio.Event()
+        self.sent = 0
+        self.received = 0
+        self.unrelayed = 0
+        self.reconnects = 0
+
+    async def start(self, deliver):
+        if self._task is not None:
+            return
+        self._deliver = deliver
+        self._task = asyncio.create_task(self._run())
+        try:
+            # Usually immediate; a worker that cannot connect yet keeps retrying in the background
+            await asyncio.wait_for(self._connected.wait(), 1.0)
+        except asyncio.TimeoutError:
+            print(f"[v0] Broadcast hub at {self.path} not reachable yet; retrying")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.hub is not None:
+            await self.hub.stop()
+            self.hub = None
+
+    def publish(self, message: dict):
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            self.unrelayed += 1
+            return
+        writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+        self.sent += 1
+
+    async def _run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=LINE_LIMIT)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if await self._host():
+                    continue
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            delay = RECONNECT_DELAY
+            self._writer = writer
+            self._connected.set()
+            if self.reconnects:
+                # Messages were lost both ways while disconnected; this worker
+                # and the others catch up from the database
+                self.publish(RESYNC_MESSAGE)
+                self._deliver(RESYNC_MESSAGE)
+            try:
+                while line := await reader.readline():
+                    self.received += 1
+                    try:
+                        self._deliver(json.loads(line))
+                    except Exception as e:
+                        print(f"[v0] Broadcast delivery error: {e}")
+            except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                pass
+            finally:
+                self._writer = None
+                self._connected.clear()
+                writer.close()
+            self.reconnects += 1
+
+    async def _host(self) -> bool:
+        """Host the hub in this worker if no other process holds its lock"""
+        if self.hub is not None:
+            return False
+        hub = BroadcastHub(self.path)
+        if not hub.try_lock():
+            return False
+        try:
+            await hub.start()
+        except OSError as e:
+            print(f"[v0] Could not host broadcast hub at {self.path}: {e}")
+            await hub.stop()
+            return False
+        self.hub = hub
+        print(f"[v0] Hosting broadcast hub at {self.path} (pid {os.getpid()})")
+        return True
+
+    def stats(self) -> dict:
+        stats = {
+            "backend": self.name,
+            "connected": self._writer is not None,
+            "sent": self.sent,
+            "received": self.received,
+            "unrelayed": self.unrelayed,
+            "reconnects": self.reconnects,
+        }
+        if self.hub is not None:
+            stats["hub"] = self.hub.stats()
+        return stats
+
+BACKENDS = {"local": LocalBackend, "unix": UnixSocketBackend}
+
+def create_backend(name: str = BROADCAST_BACKEND):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown broadcast backend {name!r}; expected one of {', '.join(BACKENDS)}") from None
+
+async def _serve_hub(path: str):
+    hub = BroadcastHub(path)
+    if not hub.try_lock():
+        raise SystemExit(f"Another process already hosts the broadcast hub at {path}")
+    await hub.start()
+    print(f"[v0] Broadcast hub listening on {path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await hub.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=BROADCAST_SOCKET, help="Unix socket path the workers connect to")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve_hub(args.socket))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,367 @@
+import asyncio
+import os
+from datetime import datetime
+from repositories import event_repo
+from broadcast import create_backend, LocalBackend
+from changes import change_feed, event_message
+
+STREAM_INTERVAL = float(os.getenv("TRADEGUARD_STREAM_INTERVAL", "15"))
+QUEUE_SIZE = int(os.getenv("TRADEGUARD_STREAM_QUEUE_SIZE", "64"))
+MAX_DROPS = int(os.getenv("TRADEGUARD_STREAM_MAX_DROPS", "256"))
+SEND_TIMEOUT = float(os.getenv("TRADEGUARD_STREAM_SEND_TIMEOUT", "5"))
+# Most changes replayed to a resuming client; further behind, it gets a reset
+MAX_REPLAY = int(os.getenv("TRADEGUARD_STREAM_MAX_REPLAY", "5000"))
+# Events per relayed batch line, well under the hub's line limit
+RELAY_BATCH_SIZE = 500
+# How long a change is held back waiting for an earlier seq that another
+# worker (or a concurrent ingest here) has committed but not yet published
+REORDER_TIMEOUT = float(os.getenv("TRADEGUARD_STREAM_REORDER_TIMEOUT", "0.5"))
+
+class SlowConsumer(Exception):
+    """Raised to disconnect a subscriber that cannot keep up"""
+
+class Subscription:
+    """One connected client: its topic filters and bounded outbound queue"""
+
+    def __init__(self, websocket, ports=None, commodities=None, min_severity: float = None, queue_size: int = QUEUE_SIZE):
+        self.websocket = websocket
+        self.ports = frozenset(ports) if ports else None
+        self.commodities = frozenset(commodities) if commodities else None
+        self.min_severity = min_severity
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        # Drops since the sender last caught up; the budget is per backlog, not per connection
+        self.overflow = 0
+        # Set once a change is dropped: the client must resume from its last seq rather than skip it
+        self.gap = False
+        self.sent = 0
+        # Highest change already sent by replay; live copies up to it are skipped
+        self.replayed = 0
+
+    def matches(self, message: dict) -> bool:
+        # Port risk updates are routed by port only
+        if message.get("type") != "event":
+            return True
+        if self.commodities is not None and message.get("commodity") not in self.commodities:
+            return False
+        if self.min_severity is not None and (message.get("severity") or 0) < self.min_severity:
+            return False
+        return True
+
+    def wants(self, message: dict) -> bool:
+        """Port filter and matches() together, for messages not routed by the broker"""
+        if self.ports is not None and message.get("type") in ("event", "port_risk") and message.get("port") not in self.ports:
+            return False
+        return self.matches(message)
+
+    def offer(self, message: dict) -> bool:
+        """Queue a message, dropping the oldest when full; False once over the drop budget or a change is dropped"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            oldest = self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            self.dropped += 1
+            self.overflow += 1
+            if "seq" in oldest or oldest.get("type") == "batch":
+                self.gap = True
+        return self.overflow < MAX_DROPS and not self.gap
+
+    def unreplayed(self, message: dict):
+        """The message without the changes replay already sent, or None if nothing is left"""
+        if message.get("type") == "batch":
+            events = [event for event in message["events"] if event.get("seq", self.replayed + 1) > self.replayed]
+            if len(events) == len(message["events"]):
+                return message
+            return batch_message(events) if events else None
+        seq = message.get("seq")
+        return None if seq is not None and seq <= self.replayed else message
+
+class EventBroker:
+    """Single-producer fan-out of events to WebSocket subscribers.
+
+    Publishing only enqueues: each subscriber drains its own bounded queue
+    in its own task, so sends run concurrently and a slow socket only delays
+    itself. Subscribers that overflow their drop budget or stall a send past
+    SEND_TIMEOUT are disconnected, as are those that would lose a sequenced
+    change: disconnected, they reconnect with `since` and replay it rather
+    than silently skipping it.
+
+    Published messages also go to the broadcast backend, which relays them
+    to the brokers of the other workers; what arrives from it is delivered
+    to this worker's subscribers only. Listeners registered with listen()
+    see relayed messages of their type first, so workers can keep their
+    in-memory state and cache versions in step with each other's writes. A batch of events is queued as one
+    `batch` message per subscriber, holding just the events it matches, so
+    bulk ingest costs each queue one slot rather than its drop budget.
+
+    Sequenced changes reach subscribers in seq order. Commits on different
+    workers are published independently, so a change can arrive before an
+    earlier one; it is held until the missing seq arrives, or for at most
+    REORDER_TIMEOUT, after which the held changes go out and clients that
+    see the gap resume from their last seq.
+    """
+
+    def __init__(self, source=None, interval: float = STREAM_INTERVAL, backend=None):
+        self.source = source
+        self.interval = interval
+        self.backend = backend or LocalBackend()
+        self._subscriptions: set[Subscription] = set()
+        self._all: set[Subscription] = set()  # no port filter
+        self._by_port: dict[str, set[Subscription]] = {}
+        self._producer: asyncio.Task = None
+        self._listeners: dict[str, list] = {}
+        self._internal: set[str] = set()
+        # Last seq delivered in order, and changes waiting for the ones before them
+        self.delivered_seq = 0
+        self._held: dict[int, dict] = {}
+        self._release_timer: asyncio.TimerHandle = None
+        self.published = 0
+        self.relayed = 0
+        self.slow_disconnects = 0
+        self.gaps = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, websocket, ports=None, commodities=None, min_severity: float = None) -> Subscription:
+        subscription = Subscription(websocket, ports, commodities, min_severity)
+        self._subscriptions.add(subscription)
+        if subscription.ports is None:
+            self._all.add(subscription)
+        else:
+            for port in subscription.ports:
+                self._by_port.setdefault(port, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+        if subscription.ports is None:
+            self._all.discard(subscription)
+            return
+        for port in subscription.ports:
+            subs = self._by_port.get(port)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._by_port[port]
+
+    def publish(self, message: dict) -> int:
+        """Deliver a message here and relay it to the other workers, returning how many local subscribers got it"""
+        self.published += 1
+        if "seq" in message:
+            change_feed.add(message)
+        self.backend.publish(message)
+        if "seq" in message:
+            return self._deliver_changes([message])
+        return self.deliver(message)
+
+    def listen(self, message_type: str, listener, deliver: bool = True):
+        """Call `listener` with each message of `message_type` relayed from another worker.
+
+        With deliver=False the type is internal to the workers and never
+        reaches subscribers.
+        """
+        self._listeners.setdefault(message_type, []).append(listener)
+        if not deliver:
+            self._internal.add(message_type)
+
+    def relay(self, message: dict):
+        """Send a message to the other workers' listeners only"""
+        self.backend.publish(message)
+
+    def publish_batch(self, messages: list[dict]) -> int:
+        """publish() for several events at once, returning how many local subscribers got any of them"""
+        if len(messages) == 1:
+            return self.publish(messages[0])
+        self.published += len(messages)
+        for message in messages:
+            if "seq" in message:
+                change_feed.add(message)
+        for start in range(0, len(messages), RELAY_BATCH_SIZE):
+            self.backend.publish(batch_message(messages[start:start + RELAY_BATCH_SIZE]))
+        return self.deliver_batch(self._in_order(messages))
+
+    def _relayed(self, message: dict):
+        for listener in self._listeners.get(message.get("type"), ()):
+            listener(message)
+        if message.get("type") in self._internal:
+            return
+        if message.get("type") == "batch":
+            self.relayed += len(message["events"])
+            for event in message["events"]:
+                if "seq" in event:
+                    change_feed.add(event)
+            self.deliver_batch(self._in_order(message["events"]))
+            return
+        self.relayed += 1
+        if "seq" in message:
+            change_feed.add(message)
+            self._deliver_changes([message])
+            return
+        self.deliver(message)
+
+    def _in_order(self, messages: list[dict]) -> list[dict]:
+        """The messages ready to deliver, sequenced ones in seq order after the last delivered.
+
+        Changes after a missing seq are held back, and released with it or
+        when the reorder timer fires. Changes at or below the last delivered
+        seq (arriving after such a release) go out as they come.
+        """
+        ready = [message for message in messages if "seq" not in message or message["seq"] <= self.delivered_seq]
+        for message in messages:
+            if "seq" in message and message["seq"] > self.delivered_seq:
+                self._held.setdefault(message["seq"], message)
+        while self.delivered_seq + 1 in self._held:
+            self.delivered_seq += 1
+            ready.append(self._held.pop(self.delivered_seq))
+        if self._held and self._release_timer is None:
+            self._release_timer = asyncio.get_running_loop().call_later(REORDER_TIMEOUT, self._release_held)
+        elif not self._held and self._release_timer is not None:
+            self._release_timer.cancel()
+            self._release_timer = None
+        return ready
+
+    def _deliver_changes(self, messages: list[dict]) -> int:
+        ready = self._in_order(messages)
+        if len(ready) == 1:
+            return self.deliver(ready[0])
+        return self.deliver_batch(ready)
+
+    def _release_held(self):
+        """Give up on the missing seqs and deliver the held changes in order"""
+        self._release_timer = None
+        held = [self._held[seq] for seq in sorted(self._held)]
+        self._held.clear()
+        if held:
+            self.gaps += 1
+            self.delivered_seq = held[-1]["seq"]
+            self._deliver_changes(held)
+
+    def _targets(self, message: dict):
+        if message.get("type") in ("event", "port_risk"):
+            candidates = self._by_port.get(message.get("port"), ())
+            return [sub for sub in (*self._all, *candidates) if sub.matches(message)]
+        return list(self._subscriptions)
+
+    def deliver(self, message: dict) -> int:
+        """Enqueue a message for every matching local subscriber, returning how many got it"""
+        targets = self._targets(message)
+        for subscription in targets:
+            if not subscription.offer(message):
+                self._evict(subscription)
+        return len(targets)
+
+    def deliver_batch(self, messages: list[dict]) -> int:
+        """Enqueue, for every local subscriber, the messages it matches as a single batch message"""
+        matched: dict[Subscription, list] = {}
+        for message in messages:
+            for subscription in self._targets(message):
+                matched.setdefault(subscription, []).append(message)
+        for subscription, batch in matched.items():
+            if not subscription.offer(batch[0] if len(batch) == 1 else batch_message(batch)):
+                self._evict(subscription)
+        return len(matched)
+
+    async def serve(self, subscription: Subscription):
+        """Drain a subscription's queue to its socket until it fails or falls behind"""
+        websocket = subscription.websocket
+        while True:
+            message = await subscription.queue.get()
+            if message is None:
+                if subscription.gap:
+                    raise SlowConsumer("fell behind the change stream; it has to resume from its last seq")
+                raise SlowConsumer(f"dropped {subscription.dropped} messages")
+            if subscription.replayed:
+                message = subscription.unreplayed(message)
+                if message is None:
+                    continue
+            # asyncio.timeout rather than wait_for, which on 3.11 can swallow a
+            # cancel that lands as the send completes and leave this task running
+            try:
+                async with asyncio.timeout(SEND_TIMEOUT):
+                    await websocket.send_json(message)
+            except TimeoutError:
+                self.slow_disconnects += 1
+                raise SlowConsumer(f"send blocked for more than {SEND_TIMEOUT}s") from None
+            subscription.sent += 1
+            if subscription.queue.empty():
+                subscription.overflow = 0
+
+    def _evict(self, subscription: Subscription):
+        self.unsubscribe(subscription)
+        self.slow_disconnects += 1
+        # Wake the sender with a sentinel so it disconnects the client
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    async def start(self):
+        # change_feed is loaded from change_log before the broker starts
+        self.delivered_seq = change_feed.latest
+        await self.backend.start(self._relayed)
+        if self.source is not None and self._producer is None:
+            self._producer = asyncio.create_task(self._produce())
+
+    async def stop(self):
+        if self._producer is not None:
+            self._producer.cancel()
+            try:
+                await self._producer
+            except asyncio.CancelledError:
+                pass
+            self._producer = None
+        if self._release_timer is not None:
+            self._release_timer.cancel()
+            self._release_timer = None
+        await self.backend.stop()
+
+    async def _produce(self):
+        """Poll the event source once per interval, however many clients are connected"""
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.subscriber_count:
+                continue
+            try:
+                row = await self.source()
+            except Exception as e:
+                print(f"[v0] Event stream producer error: {e}")
+                continue
+            # Each worker runs its own demo feed, so it is not relayed
+            if row:
+                self.published += 1
+                self.deliver(event_message(row))
+
+    def stats(self) -> dict:
+        subscribers = self._subscriptions
+        return {
+            "subscribers": len(subscribers),
+            "queued": sum(sub.queue.qsize() for sub in subscribers),
+            "max_queue_depth": max((sub.queue.qsize() for sub in subscribers), default=0),
+            "dropped": sum(sub.dropped for sub in subscribers),
+            "published": self.published,
+            "relayed": self.relayed,
+            "slow_disconnects": self.slow_disconnects,
+            "held": len(self._held),
+            "gaps": self.gaps,
+            "broadcast": self.backend.stats(),
+        }
+
+def connection_message(seq: int) -> dict:
+    return {
+        "type": "connection",
+        "message": "Connected to TradeGuardAI event stream",
+        "seq": seq,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+def batch_message(events: list[dict]) -> dict:
+    """Several events delivered as one stream message, oldest first"""
+    return {"type": "batch", "events": events}
+
+def reset_message(seq: int) -> dict:
+    """Tells a resuming client its changes are gone: refetch a snapshot, then resume from `seq`"""
+    return {"type": "reset", "seq": seq, "timestamp": datetime.utcnow().isoformat()}
+
+broker = EventBroker(source=event_repo.random, backend=create_backend())
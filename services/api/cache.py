@@ -0,0 +1,260 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv("TRADEGUARD_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.getenv("TRADEGUARD_CACHE_TTL", "30"))
+
+class ChangeVersions:
+    """Per-table and per-row change counters, bumped by writers after commit.
+
+    A row version is (table epoch, row counter): writes to known rows bump
+    only those rows, while writes to unknown rows bump the epoch so every
+    row of the table reads as changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: dict[str, int] = {}
+        self._epochs: dict[str, int] = {}
+        self._rows: dict[str, dict] = {}
+
+    def bump(self, table: str, rows=None):
+        with self._lock:
+            self._tables[table] = self._tables.get(table, 0) + 1
+            if rows is None:
+                self._epochs[table] = self._epochs.get(table, 0) + 1
+                self._rows.pop(table, None)
+            else:
+                counters = self._rows.setdefault(table, {})
+                for row in rows:
+                    counters[row] = counters.get(row, 0) + 1
+
+    def version(self, table: str, row=None):
+        with self._lock:
+            if row is None:
+                return self._tables.get(table, 0)
+            return self._epochs.get(table, 0), self._rows.get(table, {}).get(row, 0)
+
+    def snapshot(self, dependencies) -> tuple:
+        return tuple(self.version(*dep) if isinstance(dep, tuple) else self.version(dep) for dep in dependencies)
+
+change_versions = ChangeVersions()
+
+def row(table: str, param: str):
+    """Route dependency on the row whose integer id is the path parameter `param`"""
+    def dependencies(params: dict) -> list:
+        value = params[param]
+        return [(table, int(value))] if value.isdigit() else [table]
+    return dependencies
+
+class TTLCache:
+    """Small thread-safe LRU mapping whose entries expire after `ttl` seconds"""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        """Cached value, or None if missing, expired or stored under another version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic() or entry[2] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version=None, ttl: float = None):
+        expires = time.monotonic() + min(self.ttl, ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._entries[key] = (value, expires, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class _Entry:
+    __slots__ = ("body", "headers", "etag", "versions", "expires")
+
+    def __init__(self, body: bytes, headers: list, etag: bytes, versions: tuple, expires: float):
+        self.body = body
+        self.headers = headers
+        self.etag = etag
+        self.versions = versions
+        self.expires = expires
+
+def _etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+
+def _matches(if_none_match: bytes, etag: bytes) -> bool:
+    if if_none_match.strip() == b"*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix(b"W/") == etag for tag in if_none_match.split(b","))
+
+class ResponseCache:
+    """Bounded LRU of rendered GET responses with TTL and version checks.
+
+    Routes register the tables (or (table, row) pairs from path parameters)
+    their payload depends on. An entry is served only while those change
+    versions are unchanged and its TTL has not expired; the TTL bounds
+    staleness from writes made outside this process.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL, versions: ChangeVersions = change_versions):
+        self.size = size
+        self.ttl = ttl
+        self.versions = versions
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._routes: list[tuple] = []
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def route(self, path: str, *dependencies):
+        """Cache GET `path`; a dependency is a table name or a callable(path_params) -> dependencies"""
+        pattern = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", path) + "$")
+        self._routes.append((pattern, dependencies))
+
+    def dependencies(self, path: str):
+        for pattern, dependencies in self._routes:
+            match = pattern.match(path)
+            if match:
+                resolved = []
+                for dep in dependencies:
+                    resolved.extend(dep(match.groupdict()) if callable(dep) else [dep])
+                return resolved
+        return None
+
+    def get(self, key, versions: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.versions != versions or entry.expires < time.monotonic():
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body: bytes, headers: list, versions: tuple) -> _Entry:
+        entry = _Entry(body, headers, _etag(body), versions, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "stale": self.stale,
+                "evictions": self.evictions,
+            }
+
+response_cache = ResponseCache()
+
+class CacheMiddleware:
+    """ASGI middleware serving registered GET routes from the response cache.
+
+    Hits skip the route entirely (no query, no model validation, no JSON
+    encoding). Every cacheable response carries a strong ETag, and a
+    matching If-None-Match is answered with 304.
+    """
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        dependencies = self.cache.dependencies(scope["path"])
+        if dependencies is None:
+            await self.app(scope, receive, send)
+            return
+
+        query = b"&".join(sorted(scope["query_string"].split(b"&")))
+        key = (scope["path"], query)
+        versions = self.cache.versions.snapshot(dependencies)
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+
+        entry = self.cache.get(key, versions)
+        if entry is not None:
+            await self._send(send, entry, if_none_match)
+            return
+
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            if start["status"] != 200:
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks)})
+                return
+            headers = [(name, value) for name, value in start["headers"] if name.lower() not in (b"content-length", b"etag")]
+            # Versions were read before the handler ran, so a concurrent write leaves this entry stale
+            cached = self.cache.put(key, b"".join(chunks), headers, versions)
+            await self._send(send, cached, if_none_match)
+
+        await self.app(scope, receive, capture)
+
+    async def _send(self, send, entry: _Entry, if_none_match: bytes):
+        headers = [*entry.headers, (b"etag", entry.etag), (b"cache-control", b"no-cache")]
+        if if_none_match and _matches(if_none_match, entry.etag):
+            self.cache.not_modified += 1
+            await send({"type": "http.response.start", "status": 304, "headers": [
+                (name, value) for name, value in headers if name.lower() != b"content-type"
+            ]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-length", str(len(entry.body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,135 @@
+import os
+import sqlite3
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+
+# Changes kept in change_log for resuming clients; older ones get a reset
+CHANGE_LOG_RETENTION = int(os.getenv("TRADEGUARD_CHANGE_LOG_RETENTION", "100000"))
+# Recent changes each worker keeps in memory, so most resumes skip the DB
+CHANGE_RING_SIZE = int(os.getenv("TRADEGUARD_CHANGE_RING_SIZE", "10000"))
+
+EVENT_FIELDS = ("id", "title", "summary", "severity", "port", "commodity", "timestamp")
+
+# Every insert, update and delete of an event gets the next sequence number;
+# AUTOINCREMENT never reuses one, even after the oldest rows are pruned
+CHANGE_TABLES = [
+    '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+    ''',
+]
+
+CHANGE_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS events_change_insert AFTER INSERT ON events BEGIN
+        INSERT INTO change_log (event_id, op) VALUES (NEW.id, 'insert');
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS events_change_update AFTER UPDATE ON events BEGIN
+        INSERT INTO change_log (event_id, op) VALUES (NEW.id, 'update');
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS events_change_delete AFTER DELETE ON events BEGIN
+        INSERT INTO change_log (event_id, op) VALUES (OLD.id, 'delete');
+    END''',
+]
+
+def event_message(row) -> dict:
+    message = {"type": "event"}
+    for field in EVENT_FIELDS:
+        message[field] = row[field]
+    return message
+
+def change_message(seq: int, op: str, event_id: int, row=None) -> dict:
+    """A sequenced event change; rows that no longer exist replay as deletes"""
+    if row is None or op == "delete":
+        return {"type": "event", "op": "delete", "id": event_id, "seq": seq}
+    return {**event_message(row), "op": op, "seq": seq}
+
+def head(conn: sqlite3.Connection) -> int:
+    """Latest sequence number handed out, pruned or not"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+def changes_after(conn: sqlite3.Connection, since: int) -> list:
+    """(seq, op, event_id) of the changes committed after `since`, oldest first"""
+    return conn.execute('SELECT seq, op, event_id FROM change_log WHERE seq > ? ORDER BY seq', (since,)).fetchall()
+
+def prune(conn: sqlite3.Connection, latest: int, retention: int = CHANGE_LOG_RETENTION):
+    conn.execute('DELETE FROM change_log WHERE seq <= ?', (latest - retention,))
+
+def read(conn: sqlite3.Connection, since: int, limit: int):
+    """Up to `limit` changes after `since` from change_log, with the current event rows.
+
+    Returns (changes, head), or (None, head) when `since` is older than the
+    retention window or newer than anything handed out, so the client has
+    to start over from a snapshot.
+    """
+    latest = head(conn)
+    oldest = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+    if since > latest or (oldest is not None and since < oldest - 1) or (oldest is None and since < latest):
+        return None, latest
+    columns = ", ".join(f"e.{field}" for field in EVENT_FIELDS)
+    rows = conn.execute(f'''
+        SELECT c.seq, c.op, c.event_id, {columns}
+        FROM change_log c LEFT JOIN events e ON e.id = c.event_id
+        WHERE c.seq > ? ORDER BY c.seq LIMIT ?
+    ''', (since, limit)).fetchall()
+    return [change_message(row[0], row[1], row[2], row if row[3] is not None else None) for row in rows], latest
+
+class ChangeFeed:
+    """In-memory ring of the most recent event changes, ordered by sequence number.
+
+    Changes arrive from this worker's commits and, relayed by the broadcast
+    backend, from the other workers', so one can occasionally land out of
+    order or go missing. recent() therefore only answers when the ring holds
+    every change after `since` without a gap; otherwise the caller reads
+    change_log instead.
+    """
+
+    def __init__(self, size: int = CHANGE_RING_SIZE):
+        self._ring: deque = deque(maxlen=size)
+
+    @property
+    def latest(self) -> int:
+        return self._ring[-1]["seq"] if self._ring else 0
+
+    def add(self, message: dict):
+        ring = self._ring
+        if not ring or message["seq"] > ring[-1]["seq"]:
+            ring.append(message)
+            return
+        index = bisect_right(ring, message["seq"], key=lambda change: change["seq"])
+        if index and ring[index - 1]["seq"] == message["seq"]:
+            return
+        if index == 0 and len(ring) == ring.maxlen:
+            return  # older than anything kept
+        changes = list(ring)
+        changes.insert(index, message)
+        ring.clear()
+        ring.extend(changes[-ring.maxlen:])
+
+    def load(self, conn: sqlite3.Connection):
+        """Warm the ring from change_log, e.g. at startup after a deploy"""
+        since = max(head(conn) - self._ring.maxlen, 0)
+        changes, _ = read(conn, since, self._ring.maxlen)
+        self._ring.clear()
+        self._ring.extend(changes or ())
+
+    def recent(self, since: int, limit: int):
+        """Up to `limit` changes after `since` if the ring has all of them, else None"""
+        ring = self._ring
+        if not ring or since < ring[0]["seq"] - 1 or since > ring[-1]["seq"]:
+            return None
+        start = bisect_right(ring, since, key=lambda change: change["seq"])
+        changes = list(islice(ring, start, start + limit))
+        if changes and changes[-1]["seq"] - since != len(changes):
+            return None
+        return changes
+
+    def stats(self) -> dict:
+        ring = self._ring
+        return {"size": len(ring), "oldest": ring[0]["seq"] if ring else None, "latest": self.latest}
+
+change_feed = ChangeFeed()
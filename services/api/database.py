@@ -1,101 +1,225 @@
+import os
 import sqlite3
+import threading
+import time
+from collections import deque
 from pathlib import Path
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from seed_data import seed_database
+from seed_data import seed_database, seed_ports
+from migrations import migrate
+from metrics import db_checkout_duration
 
-DB_PATH = Path(__file__).parent / "trade_guard.db"
+DB_PATH = Path(os.getenv("TRADEGUARD_DB_PATH", str(Path(__file__).parent / "trade_guard.db")))
 
-def get_db():
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+# Connection pool configuration
+POOL_SIZE = int(os.getenv("TRADEGUARD_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("TRADEGUARD_DB_POOL_TIMEOUT", "5.0"))
+STATEMENT_CACHE_SIZE = 256
+
+# Applied once when a pooled connection is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+class PooledConnection:
+    """sqlite3 connection proxy that returns itself to the pool on close()"""
+
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn: sqlite3.Connection, pool: "ConnectionPool"):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a connection returned to the pool.")
+        return getattr(conn, name)
+
+    @property
+    def raw(self) -> sqlite3.Connection:
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections shared across requests"""
+
+    def __init__(self, path: Path, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.path = Path(path)
+        self.size = size
+        self.timeout = timeout
+        self._idle: deque[sqlite3.Connection] = deque()
+        self._cond = threading.Condition()
+        self._opened = 0
+        self._in_use = 0
+        self._closed = False
+        # Stats
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.path),
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a connection, opening a new one while under the size limit"""
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed.")
+            while not self._idle and self._opened >= self.size:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._opened >= self.size:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                # Reserve the slot before connecting outside the lock
+                self._opened += 1
+                conn = None
+            self._in_use += 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        elapsed = time.perf_counter() - start
+        db_checkout_duration.observe(elapsed)
+        with self._cond:
+            self._checkouts += 1
+            self._waits += waited
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, rolling back any open transaction"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection, drop it instead of handing it out again
+            conn.close()
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._opened -= 1
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def connection(self) -> PooledConnection:
+        """Check out a connection wrapped so that close() hands it back"""
+        return PooledConnection(self.acquire(), self)
+
+    def open(self, path: Path = None):
+        """Allow checkouts again after close(), optionally pointing at another file"""
+        with self._cond:
+            if path is not None and self._opened:
+                raise sqlite3.ProgrammingError("Cannot change the path of a pool with open connections.")
+            if path is not None:
+                self.path = Path(path)
+            self._closed = False
+
+    def close(self):
+        """Close idle connections; busy ones are closed as they are released"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._opened -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "checkout_ms_avg": round(self._checkout_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "checkout_ms_max": round(self._checkout_time_max * 1000, 3),
+            }
+
+pool = ConnectionPool(DB_PATH)
+
+def get_db() -> PooledConnection:
+    """Get a pooled connection; close() returns it to the pool"""
+    return pool.connection()
+
+def db_session():
+    """FastAPI dependency yielding a pooled connection for the duration of a request"""
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def close_db():
+    """Close pooled connections on shutdown"""
+    pool.close()
 
 def init_db():
-    """Initialize database and seed with data if empty"""
+    """Bring the schema up to date and seed a freshly created database"""
+    pool.open()
     conn = get_db()
     cursor = conn.cursor()
     
-    # Check if tables exist
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-    if cursor.fetchone() is None:
-        # Create users table
-        cursor.execute('''
-            CREATE TABLE users (
-                id INTEGER PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                hashed_password TEXT NOT NULL,
-                is_admin BOOLEAN DEFAULT 0,
-                created_at TEXT NOT NULL
-            )
-        ''')
-    
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='events'")
-    if cursor.fetchone() is None:
-        cursor.execute('''
-            CREATE TABLE events (
-                id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                summary TEXT NOT NULL,
-                severity REAL NOT NULL,
-                port TEXT NOT NULL,
-                commodity TEXT NOT NULL,
-                region TEXT,
-                source TEXT,
-                sentiment_score REAL,
-                tags TEXT,
-                timestamp TEXT NOT NULL
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE skus (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                commodity TEXT NOT NULL,
-                ports TEXT NOT NULL,
-                risk_level REAL NOT NULL
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE ports (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                country TEXT NOT NULL,
-                latitude REAL NOT NULL,
-                longitude REAL NOT NULL,
-                risk_score REAL NOT NULL,
-                active_events INTEGER DEFAULT 0
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE articles (
-                id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                source TEXT NOT NULL,
-                url TEXT,
-                summary TEXT NOT NULL,
-                sentiment REAL,
-                published_at TEXT NOT NULL
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE forecasts_history (
-                id INTEGER PRIMARY KEY,
-                sku_id INTEGER NOT NULL,
-                forecast_date TEXT NOT NULL,
-                risk REAL NOT NULL,
-                upper_bound REAL,
-                lower_bound REAL,
-                created_at TEXT NOT NULL
-            )
-        ''')
-        
-        conn.commit()
+    fresh = cursor.fetchone() is None
+    
+    migrate(conn)
+    
+    if fresh:
         seed_database(conn)
+    seed_ports(conn)
     
     conn.close()
@@ -0,0 +1,177 @@
+import sqlite3
+from typing import NamedTuple, Optional
+
+DIMENSIONS = ("tag", "commodity", "region", "port")
+
+# event_tags, event_facet_counts and event_facet_pairs are kept by triggers
+# (see migrations). events.tags holds a JSON array (ingest) or a legacy comma
+# list; both are split into event_tags the way serialization.decode_tags reads
+# them
+_SPLIT_TAGS = '''json_each(CASE WHEN json_valid({tags}) AND json_type({tags}) = 'array' THEN {tags}
+            ELSE '[' || replace(json_quote(coalesce({tags}, '')), ',', '","') || ']' END)'''
+
+def backfill(conn: sqlite3.Connection):
+    """Populate event_tags and the facet counters from the events table"""
+    conn.execute('DELETE FROM event_tags')
+    conn.execute(f'''
+        INSERT OR IGNORE INTO event_tags (tag, timestamp, event_id)
+        SELECT trim(value), events.timestamp, events.id FROM events, {_SPLIT_TAGS.format(tags="events.tags")} WHERE trim(value) != ''
+    ''')
+    # Counted in one pass here rather than by the event_tags triggers
+    conn.execute('DELETE FROM event_facet_counts')
+    conn.execute('''
+        INSERT INTO event_facet_counts (dimension, key, event_count)
+        SELECT 'tag', tag, COUNT(*) FROM event_tags GROUP BY tag
+    ''')
+    for dimension in ("commodity", "region", "port"):
+        conn.execute(f'''
+            INSERT INTO event_facet_counts (dimension, key, event_count)
+            SELECT '{dimension}', {dimension}, COUNT(*) FROM events WHERE {dimension} IS NOT NULL GROUP BY {dimension}
+        ''')
+    backfill_pairs(conn)
+
+def backfill_pairs(conn: sqlite3.Connection):
+    """Populate event_facet_pairs from event_tags and the events table"""
+    conn.execute('DELETE FROM event_facet_pairs')
+    columns = "".join(f"""
+        UNION ALL SELECT id, '{dimension}', {dimension} FROM events WHERE {dimension} IS NOT NULL""" for dimension in ("commodity", "region", "port"))
+    conn.execute(f'''
+        CREATE TEMP TABLE facet_items AS
+        SELECT event_id, 'tag' AS dimension, tag AS key FROM event_tags{columns}
+    ''')
+    try:
+        conn.execute('CREATE INDEX temp.idx_facet_items_event ON facet_items(event_id)')
+        conn.execute('''
+            INSERT INTO event_facet_pairs (filter_dimension, filter_key, dimension, key, event_count)
+            SELECT a.dimension, a.key, b.dimension, b.key, COUNT(*)
+            FROM facet_items a JOIN facet_items b ON b.event_id = a.event_id AND (b.dimension != a.dimension OR b.key != a.key)
+            GROUP BY a.dimension, a.key, b.dimension, b.key
+        ''')
+    finally:
+        conn.execute('DROP TABLE temp.facet_items')
+
+class EventFilter(NamedTuple):
+    """Conjunctive filters shared by event listings and facet counts"""
+    tags: tuple = ()
+    port: Optional[str] = None
+    commodity: Optional[str] = None
+    region: Optional[str] = None
+    min_severity: Optional[float] = None
+    max_severity: Optional[float] = None
+
+    def source(self, params: list, alias: str = "events") -> tuple[str, list[str]]:
+        """FROM clause and WHERE conditions selecting the matching events as `alias`.
+
+        With tags, rows are read from the first tag's posting list (aliased
+        `t`, in (timestamp, event_id) order) and the rest are probed per row.
+        """
+        if not self.tags:
+            return f"events {alias}", self.conditions(params, alias)
+        params.append(self.tags[0])
+        conditions = ["t.tag = ?", *self.conditions(params, alias)]
+        return f"event_tags t JOIN events {alias} ON {alias}.id = t.event_id", conditions
+
+    def conditions(self, params: list, alias: str = "events") -> list[str]:
+        """Conditions for every filter but the first tag, which source() drives from"""
+        conditions = []
+        for tag in self.tags[1:]:
+            conditions.append(f"EXISTS (SELECT 1 FROM event_tags x WHERE x.event_id = {alias}.id AND x.tag = ?)")
+            params.append(tag)
+        for column in ("port", "commodity", "region"):
+            value = getattr(self, column)
+            if value is not None:
+                conditions.append(f"{alias}.{column} = ?")
+                params.append(value)
+        if self.min_severity is not None:
+            conditions.append(f"{alias}.severity >= ?")
+            params.append(self.min_severity)
+        if self.max_severity is not None:
+            conditions.append(f"{alias}.severity <= ?")
+            params.append(self.max_severity)
+        return conditions
+
+    def __bool__(self) -> bool:
+        return any(value not in (None, ()) for value in self)
+
+    def single_key(self) -> Optional[tuple[str, str]]:
+        """(dimension, key) when the filter is exactly one tag, port, commodity or region"""
+        keys = [("tag", tag) for tag in self.tags]
+        keys += [(column, getattr(self, column)) for column in ("port", "commodity", "region") if getattr(self, column) is not None]
+        if len(keys) != 1 or self.min_severity is not None or self.max_severity is not None:
+            return None
+        return keys[0]
+
+def facets(conn: sqlite3.Connection, event_filter: EventFilter = EventFilter(), size: int = 20) -> dict:
+    """Event counts per tag, commodity, region and port, plus the matching total.
+
+    Unfiltered counts, and counts filtered by a single tag, port, commodity
+    or region, are read from the maintained counters. Any other filter (more
+    than one key, or a severity range) groups the matching events, found
+    through the filter's indexes, so its cost grows with the number of
+    matches; the route's response cache absorbs repeats.
+    """
+    single = event_filter.single_key()
+    if not event_filter:
+        # One statement, so every dimension is read from the same snapshot
+        top = " UNION ALL ".join(
+            f"SELECT * FROM (SELECT dimension, key, event_count FROM event_facet_counts "
+            f"WHERE dimension = '{dimension}' ORDER BY event_count DESC, key LIMIT ?)"
+            for dimension in DIMENSIONS
+        )
+        rows = conn.execute(
+            f"{top} UNION ALL SELECT '', NULL, COALESCE(SUM(event_count), 0) FROM event_facet_counts WHERE dimension = 'port'",
+            (size,) * len(DIMENSIONS),
+        ).fetchall()
+    elif single is not None:
+        rows = _counted(conn, *single, size)
+    else:
+        rows = _grouped(conn, event_filter, size)
+    return _result(rows)
+
+def _counted(conn: sqlite3.Connection, dimension: str, key: str, size: int) -> list:
+    """(dimension, key, count) rows for events having one key, from event_facet_pairs"""
+    # The key's own count is the total; one statement, as for unfiltered counts
+    top = " UNION ALL ".join(
+        f"SELECT * FROM (SELECT dimension, key, event_count FROM event_facet_pairs "
+        f"WHERE filter_dimension = ? AND filter_key = ? AND dimension = '{facet}' ORDER BY event_count DESC, key LIMIT ?)"
+        for facet in DIMENSIONS
+    )
+    rows = conn.execute(
+        f"SELECT '', NULL, COALESCE(SUM(event_count), 0) FROM event_facet_counts WHERE dimension = ? AND key = ? UNION ALL {top}",
+        (dimension, key, *(dimension, key, size) * len(DIMENSIONS)),
+    ).fetchall()
+    # Every matching event has the key, so it joins its own dimension's top
+    if rows[0][2]:
+        own = sorted([(dimension, key, rows[0][2]), *(row for row in rows if row[0] == dimension)],
+                     key=lambda row: (-row[2], row[1]))[:size]
+        rows = [row for row in rows if row[0] != dimension] + own
+    return rows
+
+def _grouped(conn: sqlite3.Connection, event_filter: EventFilter, size: int) -> list:
+    """(dimension, key, count) rows grouped from the events matching the filter"""
+    params = []
+    source, conditions = event_filter.source(params, "e")
+    return conn.execute(f'''
+        WITH matched AS MATERIALIZED (SELECT e.id, e.commodity, e.region, e.port FROM {source} WHERE {" AND ".join(conditions)}),
+        counts AS (
+            SELECT 'tag' AS dimension, t.tag AS key, COUNT(*) AS event_count
+            FROM matched m JOIN event_tags t ON t.event_id = m.id GROUP BY t.tag
+            UNION ALL SELECT 'commodity', commodity, COUNT(*) FROM matched WHERE commodity IS NOT NULL GROUP BY commodity
+            UNION ALL SELECT 'region', region, COUNT(*) FROM matched WHERE region IS NOT NULL GROUP BY region
+            UNION ALL SELECT 'port', port, COUNT(*) FROM matched GROUP BY port
+            UNION ALL SELECT '', NULL, COUNT(*) FROM matched
+        )
+        SELECT dimension, key, event_count FROM (
+            SELECT dimension, key, event_count,
+                   ROW_NUMBER() OVER (PARTITION BY dimension ORDER BY event_count DESC, key) AS position
+            FROM counts
+        ) WHERE position <= ? ORDER BY dimension, position
+    ''', (*params, size)).fetchall()
+
+def _result(rows: list) -> dict:
+    total = next((count for dimension, _, count in rows if dimension == ""), 0)
+    result = {dimension: [] for dimension in DIMENSIONS}
+    for dimension, key, count in rows:
+        if dimension in result:
+            result[dimension].append({"key": key, "count": count})
+    return {"total": total, **result}
@@ -0,0 +1,155 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import forecasting
+from broker import broker
+from database import pool
+from repositories import run_query
+
+FORECAST_WORKERS = int(os.getenv("TRADEGUARD_FORECAST_WORKERS", str(os.cpu_count() or 2)))
+CHUNK_SIZE = int(os.getenv("TRADEGUARD_FORECAST_CHUNK_SIZE", "1000"))
+# Seconds between scheduled runs; 0 disables the scheduler
+FORECAST_INTERVAL = float(os.getenv("TRADEGUARD_FORECAST_INTERVAL", "3600"))
+JOB_HISTORY = 20
+# Seconds between checks for jobs queued by other workers, should the relay miss one
+JOB_POLL = float(os.getenv("TRADEGUARD_FORECAST_JOB_POLL", "2"))
+
+class ForecastScheduler:
+    """Runs forecast recomputes across a process pool, one job at a time.
+
+    Jobs are rows in forecast_jobs: any worker can queue one, and the worker
+    running the scheduled jobs (see leader.JobLeader) claims them in order
+    and records their progress there, so every worker reports the same
+    status. Chunks of CHUNK_SIZE SKUs are forecast in worker processes, at
+    most two per worker in flight, and each finished chunk is stored along
+    with the job's progress in its own transaction from the DB executor.
+    Jobs without explicit SKUs only cover SKUs whose ports received events
+    since the stored watermark, which advances as the job completes.
+    """
+
+    def __init__(self, workers: int = FORECAST_WORKERS, chunk_size: int = CHUNK_SIZE, interval: float = FORECAST_INTERVAL,
+                 poll: float = JOB_POLL):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.poll = poll
+        self._pool: ProcessPoolExecutor = None
+        self._wake = asyncio.Event()
+        self._runner: asyncio.Task = None
+        self._scheduler: asyncio.Task = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned workers avoid forking the server's threads and open sockets
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def submit(self, sku_ids: list[int] = None, trigger: str = "manual") -> dict:
+        """Queue a job and return it immediately; its row in forecast_jobs tracks progress"""
+        job = await run_query(forecasting.create_job, trigger, sku_ids)
+        self.wake()
+        broker.relay({"type": "forecast_job", "id": job["id"]})
+        return job
+
+    def wake(self):
+        """Check for queued jobs now rather than at the next poll"""
+        self._wake.set()
+
+    async def _run_queued(self):
+        await run_query(forecasting.interrupt_jobs)
+        while True:
+            # Cleared before looking so a job queued meanwhile is not missed
+            self._wake.clear()
+            claimed = await run_query(forecasting.claim_job)
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(*claimed)
+
+    async def _run(self, job_id: int, sku_ids: list[int] = None):
+        started = time.perf_counter()
+        status, error, high_water = "failed", None, None
+        try:
+            high_water = await self._execute(job_id, sku_ids)
+            status = "completed"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            error = str(e)
+            print(f"[v0] Forecast job {job_id} failed: {e}")
+        finally:
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            await run_query(forecasting.finish_job, job_id, status, elapsed_ms, error,
+                            high_water if status == "completed" else None, JOB_HISTORY)
+
+    async def _execute(self, job_id: int, sku_ids: list[int] = None):
+        """Forecast and store the job's SKUs; returns the watermark to record, if any"""
+        high_water = None
+        if sku_ids is None:
+            def changed(conn):
+                return forecasting.changed_skus(conn, forecasting.watermark(conn))
+            sku_ids, high_water = await run_query(changed)
+
+        chunks = [sku_ids[i:i + self.chunk_size] for i in range(0, len(sku_ids), self.chunk_size)]
+        await run_query(forecasting.plan_job, job_id, len(sku_ids), len(chunks))
+
+        loop = asyncio.get_running_loop()
+        path = str(pool.path)
+        today = datetime.utcnow().date().isoformat()
+        pending = {}
+        queue = iter(chunks)
+        try:
+            while True:
+                # Keep each worker busy without holding every chunk's rows at once
+                while len(pending) < self.workers * 2:
+                    chunk = next(queue, None)
+                    if chunk is None:
+                        break
+                    future = loop.run_in_executor(self._get_pool(), forecasting.compute_chunk, path, chunk, today)
+                    pending[future] = len(chunk)
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    size = pending.pop(future)
+                    await run_query(forecasting.store, future.result(), job_id, size)
+        finally:
+            for future in pending:
+                future.cancel()
+
+        return high_water
+
+    async def start(self):
+        """Run queued jobs, and queue one every `interval` seconds if set"""
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run_queued())
+        if self.interval > 0 and self._scheduler is None:
+            self._scheduler = asyncio.create_task(self._schedule())
+
+    async def stop(self):
+        tasks = [task for task in (self._scheduler, self._runner) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._scheduler = None
+        self._runner = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.submit(trigger="scheduled")
+
+forecast_scheduler = ForecastScheduler()
+
+# A job queued in another worker; only the one running the jobs acts on it
+broker.listen("forecast_job", lambda message: forecast_scheduler.wake(), deliver=False)
@@ -0,0 +1,309 @@
+import json
+import os
+import sqlite3
+from datetime import date as Date, datetime, timedelta
+import numpy as np
+
+HORIZON = 30
+HISTORY_DAYS = int(os.getenv("TRADEGUARD_FORECAST_HISTORY_DAYS", "90"))
+
+# Damped Holt (additive trend) smoothing parameters
+ALPHA = 0.5
+BETA = 0.1
+PHI = 0.9
+Z = 1.96  # 95% prediction interval
+FALLBACK_SIGMA = 0.1  # residual spread assumed for SKUs with under two observations
+
+def _split_ports(ports: str) -> list[str]:
+    return [port.strip() for port in ports.split(",") if port.strip()]
+
+def port_series(conn: sqlite3.Connection, ports: list[str], end: Date, days: int = HISTORY_DAYS) -> np.ndarray:
+    """Daily mean severity per port over the `days` ending at `end`, shape (ports, days).
+
+    Read from the port breakdown rollup. Days without events carry the last
+    observed value forward; days before a port's first event stay NaN.
+    """
+    start = end - timedelta(days=days - 1)
+    index = {port: i for i, port in enumerate(ports)}
+    values = np.full((len(ports), days), np.nan)
+    rows = conn.execute('''
+        SELECT key, date, severity_sum / event_count FROM event_daily_rollup_breakdown
+        WHERE dimension = 'port' AND date >= ? AND date <= ?
+    ''', (start.isoformat(), end.isoformat()))
+    for port, day, severity in rows:
+        i = index.get(port)
+        if i is not None:
+            values[i, (Date.fromisoformat(day) - start).days] = severity
+    # Forward fill along the day axis
+    observed = ~np.isnan(values)
+    last = np.where(observed, np.arange(days), 0)
+    np.maximum.accumulate(last, axis=1, out=last)
+    filled = values[np.arange(len(ports))[:, None], last]
+    filled[np.cumsum(observed, axis=1) == 0] = np.nan
+    return filled
+
+def sku_series(port_values: np.ndarray, membership: np.ndarray) -> np.ndarray:
+    """Mean of each SKU's port series, shape (skus, days); NaN where no port has data"""
+    observed = ~np.isnan(port_values)
+    totals = membership @ np.where(observed, port_values, 0.0)
+    counts = membership @ observed.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+def holt(series: np.ndarray, fallback: np.ndarray, horizons: np.ndarray) -> tuple:
+    """Fit damped Holt smoothing to every row at once and forecast `horizons` steps ahead.
+
+    Returns (risk, lower, upper), each shaped (rows, len(horizons)) and
+    clipped to [0, 1]. Rows with no observations are flat at `fallback`.
+    Intervals use the analytic variance of the damped trend method with the
+    one-step residual spread of each row.
+    """
+    rows, days = series.shape
+    level = np.asarray(fallback, dtype=float).copy()
+    trend = np.zeros(rows)
+    started = np.zeros(rows, dtype=bool)
+    sse = np.zeros(rows)
+    n = np.zeros(rows)
+
+    for t in range(days):
+        y = series[:, t]
+        valid = ~np.isnan(y)
+        first = valid & ~started
+        level[first] = y[first]
+        started |= first
+
+        update = valid & ~first
+        predicted = level + PHI * trend
+        error = np.where(update, y - predicted, 0.0)
+        sse += error * error
+        n += update
+        new_level = np.where(update, predicted + ALPHA * error, level)
+        trend = np.where(update, PHI * trend + ALPHA * BETA * error, trend)
+        level = new_level
+
+    sigma = np.where(n >= 2, np.sqrt(sse / np.maximum(n - 1, 1)), FALLBACK_SIGMA)
+
+    steps = np.arange(1, int(horizons.max()) + 1)
+    damped = np.cumsum(PHI ** steps)  # phi + phi^2 + ... + phi^h
+    # Var(h) = sigma^2 * (1 + sum_{j<h} (alpha * (1 + beta * damped_j))^2)
+    weights = np.concatenate(([0.0], np.cumsum((ALPHA * (1 + BETA * damped)) ** 2)))
+    spread = Z * sigma[:, None] * np.sqrt(1 + weights[horizons - 1])[None, :]
+
+    risk = level[:, None] + damped[horizons - 1][None, :] * trend[:, None]
+    return np.clip(risk, 0, 1), np.clip(risk - spread, 0, 1), np.clip(risk + spread, 0, 1)
+
+def history_end(conn: sqlite3.Connection, today: Date) -> Date:
+    """Last day with rolled-up events, capped at today"""
+    row = conn.execute('SELECT MAX(date) FROM event_daily_rollup').fetchone()
+    return min(Date.fromisoformat(row[0]), today) if row[0] else today
+
+def compute(conn: sqlite3.Connection, skus: list, today: Date = None) -> list[tuple]:
+    """Forecast rows (sku_id, forecast_date, risk, upper_bound, lower_bound) for `skus`.
+
+    `skus` are (id, ports, risk_level) rows. All SKUs and horizons are
+    computed in one pass; when the event history stops before today the
+    horizons are measured from the last observed day.
+    """
+    if not skus:
+        return []
+    today = today or datetime.utcnow().date()
+    end = history_end(conn, today)
+
+    sku_ports = [_split_ports(ports) for _, ports, _ in skus]
+    ports = sorted({port for names in sku_ports for port in names})
+    index = {port: i for i, port in enumerate(ports)}
+    membership = np.zeros((len(skus), len(ports)))
+    for row, names in enumerate(sku_ports):
+        membership[row, [index[port] for port in names]] = 1.0
+
+    series = sku_series(port_series(conn, ports, end), membership)
+    gap = (today - end).days
+    horizons = np.arange(HORIZON) + max(gap, 1)
+    risk, lower, upper = holt(series, np.array([level for _, _, level in skus]), horizons)
+
+    dates = [(today + timedelta(days=i)).isoformat() for i in range(HORIZON)]
+    risk, lower, upper = (np.round(values, 3).tolist() for values in (risk, lower, upper))
+    return [
+        (sku_id, dates[i], risk[row][i], upper[row][i], lower[row][i])
+        for row, (sku_id, _, _) in enumerate(skus)
+        for i in range(HORIZON)
+    ]
+
+def store(conn: sqlite3.Connection, rows: list[tuple], job_id: int = None, skus: int = 0):
+    """Upsert forecast rows in one transaction; past dates keep the last forecast made for them.
+
+    With `job_id` the job's progress advances by one chunk of `skus` SKUs
+    in the same transaction.
+    """
+    created_at = datetime.utcnow().isoformat()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany('''
+            INSERT INTO forecasts_history (sku_id, forecast_date, risk, upper_bound, lower_bound, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(sku_id, forecast_date) DO UPDATE SET
+                risk = excluded.risk,
+                upper_bound = excluded.upper_bound,
+                lower_bound = excluded.lower_bound,
+                created_at = excluded.created_at
+        ''', [(*row, created_at) for row in rows])
+        if job_id is not None:
+            conn.execute(
+                'UPDATE forecast_jobs SET chunks_completed = chunks_completed + 1, skus_completed = skus_completed + ? WHERE id = ?',
+                (skus, job_id),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def load_skus(conn: sqlite3.Connection, sku_ids: list[int] = None) -> list[tuple]:
+    if sku_ids is None:
+        return [tuple(row) for row in conn.execute('SELECT id, ports, risk_level FROM skus ORDER BY id')]
+    return [tuple(row) for row in conn.execute(
+        f'SELECT id, ports, risk_level FROM skus WHERE id IN ({", ".join("?" * len(sku_ids))}) ORDER BY id',
+        list(sku_ids),
+    )]
+
+def watermark(conn: sqlite3.Connection):
+    """Highest event id already reflected in stored forecasts, or None before the first run"""
+    row = conn.execute('SELECT last_event_id FROM forecast_watermark WHERE id = 1').fetchone()
+    return row[0] if row else None
+
+def _advance_watermark(conn: sqlite3.Connection, event_id: int):
+    # Never moves back, should a job that read an older watermark finish last
+    conn.execute('''
+        INSERT INTO forecast_watermark (id, last_event_id, updated_at) VALUES (1, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET last_event_id = MAX(last_event_id, excluded.last_event_id), updated_at = excluded.updated_at
+    ''', (event_id, datetime.utcnow().isoformat()))
+
+def set_watermark(conn: sqlite3.Connection, event_id: int):
+    _advance_watermark(conn, event_id)
+    conn.commit()
+
+def changed_skus(conn: sqlite3.Connection, since_event_id: int = None) -> tuple:
+    """SKU ids served by ports with events after the watermark, and the new watermark.
+
+    Every SKU is returned when no watermark has been recorded yet.
+    """
+    high_water = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+    if since_event_id is None:
+        return [row[0] for row in conn.execute('SELECT id FROM skus ORDER BY id')], high_water
+    # Seeks sku_ports by port for each port with new events
+    sku_ids = [row[0] for row in conn.execute('''
+        SELECT DISTINCT sku_id FROM sku_ports
+        WHERE port IN (SELECT port FROM events WHERE id > ? AND id <= ?)
+        ORDER BY sku_id
+    ''', (since_event_id, high_water))]
+    return sku_ids, high_water
+
+# Batch jobs, as the API reports them
+JOB_COLUMNS = (
+    "id, trigger, status, sku_count, skus_completed, chunks, chunks_completed, "
+    "created_at, started_at, finished_at, elapsed_ms, error"
+)
+
+def create_job(conn: sqlite3.Connection, trigger: str, sku_ids: list[int] = None) -> dict:
+    """Queue a batch job; sku_ids None covers the SKUs changed since the watermark"""
+    job_id = conn.execute(
+        "INSERT INTO forecast_jobs (trigger, status, sku_ids, created_at) VALUES (?, 'queued', ?, ?)",
+        (trigger, None if sku_ids is None else json.dumps(sorted(set(sku_ids))), datetime.utcnow().isoformat()),
+    ).lastrowid
+    conn.commit()
+    return job(conn, job_id)
+
+def job(conn: sqlite3.Connection, job_id: int):
+    row = conn.execute(f'SELECT {JOB_COLUMNS} FROM forecast_jobs WHERE id = ?', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+def jobs(conn: sqlite3.Connection, limit: int) -> list[dict]:
+    """The most recent jobs, newest first"""
+    return [dict(row) for row in conn.execute(f'SELECT {JOB_COLUMNS} FROM forecast_jobs ORDER BY id DESC LIMIT ?', (limit,))]
+
+def claim_job(conn: sqlite3.Connection):
+    """Mark the oldest queued job running and return (id, sku_ids), or None.
+
+    Nothing is claimed while another job is running, so jobs run one at a
+    time against the watermark whichever process claims them.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = None
+        if conn.execute("SELECT 1 FROM forecast_jobs WHERE status = 'running' LIMIT 1").fetchone() is None:
+            row = conn.execute("SELECT id, sku_ids FROM forecast_jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE forecast_jobs SET status = 'running', started_at = ? WHERE id = ?",
+                (datetime.utcnow().isoformat(), row[0]),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if row is None:
+        return None
+    return row[0], None if row[1] is None else json.loads(row[1])
+
+def plan_job(conn: sqlite3.Connection, job_id: int, sku_count: int, chunks: int):
+    conn.execute('UPDATE forecast_jobs SET sku_count = ?, chunks = ? WHERE id = ?', (sku_count, chunks, job_id))
+    conn.commit()
+
+def finish_job(conn: sqlite3.Connection, job_id: int, status: str, elapsed_ms: float, error: str = None,
+               high_water: int = None, keep: int = None):
+    """Record a job's outcome and, for a watermark run, the new watermark in one transaction.
+
+    With `keep`, finished jobs older than the newest `keep` are pruned.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if high_water is not None:
+            _advance_watermark(conn, high_water)
+        conn.execute(
+            'UPDATE forecast_jobs SET status = ?, finished_at = ?, elapsed_ms = ?, error = ? WHERE id = ?',
+            (status, datetime.utcnow().isoformat(), elapsed_ms, error, job_id),
+        )
+        if keep is not None:
+            conn.execute('''
+                DELETE FROM forecast_jobs WHERE status NOT IN ('queued', 'running')
+                AND id < (SELECT MIN(id) FROM (SELECT id FROM forecast_jobs ORDER BY id DESC LIMIT ?))
+            ''', (keep,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def interrupt_jobs(conn: sqlite3.Connection) -> int:
+    """Fail jobs left running by a process that exited; call before claiming any"""
+    interrupted = conn.execute(
+        "UPDATE forecast_jobs SET status = 'failed', finished_at = ?, error = 'interrupted: the worker running it exited' "
+        "WHERE status = 'running'",
+        (datetime.utcnow().isoformat(),),
+    ).rowcount
+    conn.commit()
+    return interrupted
+
+_worker_conn: sqlite3.Connection = None
+
+def compute_chunk(path: str, sku_ids: list[int], today: str) -> list[tuple]:
+    """Process pool entry point: forecast rows for one chunk of SKUs.
+
+    Each worker process keeps its own read-only connection; writing is left
+    to the caller so chunks are stored by a single writer.
+    """
+    global _worker_conn
+    if _worker_conn is None:
+        _worker_conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    return compute(_worker_conn, load_skus(_worker_conn, sku_ids), Date.fromisoformat(today))
+
+def refresh(conn: sqlite3.Connection, sku_ids: list[int] = None, today: Date = None) -> int:
+    """Recompute and store forecasts for the given SKUs (all when None) in one transaction"""
+    skus = load_skus(conn, sku_ids)
+    store(conn, compute(conn, skus, today))
+    return len(skus)
+
+if __name__ == "__main__":
+    from database import get_db
+
+    with get_db() as conn:
+        count = refresh(conn)
+    print(f"Forecasts refreshed for {count} SKUs")
@@ -0,0 +1,127 @@
+import os
+import re
+import sqlite3
+from typing import Optional
+
+# Title matches count double in BM25; porter stemming lets "delays" match "delay"
+TITLE_WEIGHT = 2.0
+SUMMARY_WEIGHT = 1.0
+SNIPPET_TOKENS = 16
+HIGHLIGHT = ("<mark>", "</mark>")
+# Matches ranked per scope, newest first; bounds the cost of very common terms
+CANDIDATES = int(os.getenv("TRADEGUARD_SEARCH_CANDIDATES", "10000"))
+
+SCOPES = ("events", "articles")
+
+# External-content indexes: the text lives only in events/articles, the FTS
+# tables hold the inverted index keyed by rowid and follow via triggers
+SEARCH_TABLES = [
+    f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+            title, summary,
+            content='{table}', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+    '''
+    for table in SCOPES
+]
+
+def _triggers(table: str) -> list[str]:
+    insert = f"INSERT INTO {table}_fts (rowid, title, summary) VALUES (NEW.id, NEW.title, NEW.summary);"
+    delete = f"INSERT INTO {table}_fts ({table}_fts, rowid, title, summary) VALUES ('delete', OLD.id, OLD.title, OLD.summary);"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN\n        {insert}\n    END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN\n        {delete}\n    END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF id, title, summary ON {table} BEGIN\n        {delete}\n        {insert}\n    END",
+    ]
+
+SEARCH_TRIGGERS = [*_triggers("events"), *_triggers("articles")]
+
+def backfill(conn: sqlite3.Connection):
+    """Rebuild both indexes from their content tables"""
+    for table in SCOPES:
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+# "quoted phrases", words and prefix* terms; FTS5 operators in user input are not honoured
+_TERM = re.compile(r'"([^"]*)"|(\w+)(\*?)')
+
+def match_query(text: str) -> Optional[str]:
+    """FTS5 MATCH expression requiring every term of `text`, or None if it has none"""
+    terms = []
+    for phrase, word, prefix in _TERM.findall(text):
+        if phrase.strip():
+            terms.append('"' + phrase.strip() + '"')
+        elif word:
+            terms.append(f'"{word}"{prefix}')
+    return " ".join(terms) or None
+
+def _phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+# Per scope: columns returned for a hit, and the content columns filtered on
+_COLUMNS = {
+    "events": "'event' AS type, c.id, c.title, c.timestamp, c.port, c.commodity, c.severity, NULL AS source, c.sentiment_score AS sentiment",
+    "articles": "'article' AS type, c.id, c.title, c.published_at AS timestamp, NULL AS port, NULL AS commodity, NULL AS severity, c.source, c.sentiment",
+}
+_TIME_COLUMN = {"events": "timestamp", "articles": "published_at"}
+
+def _filters(scope: str, match: str, port, commodity, since, until) -> tuple[str, list]:
+    if scope == "articles":
+        # Articles carry no port or commodity columns; those filters require
+        # the name in the text instead
+        for value in (port, commodity):
+            if value is not None:
+                match += " " + _phrase(value)
+        port = commodity = None
+    filters, params = [], [match]
+    for condition, value in (
+        ("c.port = ?", port),
+        ("c.commodity = ?", commodity),
+        (f"c.{_TIME_COLUMN[scope]} >= ?", since),
+        # Inclusive of every timestamp under an `until` date or prefix
+        (f"c.{_TIME_COLUMN[scope]} < ? || 'U'", until),
+    ):
+        if value is not None:
+            filters.append(condition)
+            params.append(value)
+    return "".join(f" AND {condition}" for condition in filters), params
+
+def _search_scope(conn, scope: str, match: str, port, commodity, since, until, limit: int) -> list[dict]:
+    where, params = _filters(scope, match, port, commodity, since, until)
+    # Stage 1: BM25 over the newest CANDIDATES matches, walking the index in
+    # rowid order, so a term present in most rows costs O(CANDIDATES)
+    ranked = conn.execute(f'''
+        SELECT id, score FROM (
+            SELECT c.id, -bm25({scope}_fts, {TITLE_WEIGHT}, {SUMMARY_WEIGHT}) AS score
+            FROM {scope}_fts JOIN {scope} c ON c.id = {scope}_fts.rowid
+            WHERE {scope}_fts MATCH ?{where}
+            ORDER BY {scope}_fts.rowid DESC LIMIT ?
+        ) ORDER BY score DESC LIMIT ?
+    ''', (*params, CANDIDATES, limit)).fetchall()
+    if not ranked:
+        return []
+    # Stage 2: snippets and columns for the hits only. One rowid range scan,
+    # since FTS5 re-reads a prefix term's postings for every rowid probed.
+    scores = {row[0]: row[1] for row in ranked}
+    hits = conn.execute(f'''
+        SELECT {_COLUMNS[scope]}, snippet({scope}_fts, -1, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet
+        FROM {scope}_fts JOIN {scope} c ON c.id = {scope}_fts.rowid
+        WHERE {scope}_fts MATCH ? AND {scope}_fts.rowid BETWEEN ? AND ?
+          AND +c.id IN ({", ".join("?" * len(scores))})
+    ''', (*HIGHLIGHT, params[0], min(scores), max(scores), *scores)).fetchall()
+    return [{**hit, "score": scores[hit["id"]]} for hit in map(dict, hits)]
+
+def search(conn: sqlite3.Connection, match: str, scopes=SCOPES, port: str = None, commodity: str = None,
+           since: str = None, until: str = None, limit: int = 20, offset: int = 0) -> list[dict]:
+    """Best BM25 matches for a match_query() expression across `scopes`, highest score first.
+
+    Each scope returns its own top limit + offset rows, which are merged; the
+    two indexes keep separate term statistics, so scores are comparable only
+    roughly across events and articles.
+    """
+    hits = []
+    for scope in SCOPES:
+        if scope in scopes:
+            hits += _search_scope(conn, scope, match, port, commodity, since, until, limit + offset)
+    hits.sort(key=lambda hit: (-hit["score"], hit["id"]))
+    return [{**hit, "score": round(hit["score"], 4)} for hit in hits[offset:offset + limit]]
@@ -0,0 +1,138 @@
+import math
+import sqlite3
+from typing import Optional
+
+EARTH_RADIUS_KM = 6371.0088
+# Widens the prefilter box so rounding never drops a port lying on the circle
+BBOX_MARGIN_DEGREES = 1e-6
+# Grid cells per 256px tile width when clustering; roughly 32px cells
+CLUSTER_CELLS = 8
+# At or above this zoom every visible port is returned individually
+CLUSTER_MAX_ZOOM = 12
+
+PORT_COLUMNS = "p.id, p.name, p.country, p.latitude, p.longitude, p.risk_score, p.active_events"
+
+# Ports are points, stored as degenerate boxes; the R*Tree follows ports via triggers
+SPATIAL_TABLES = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS ports_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)',
+]
+
+SPATIAL_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS ports_rtree_insert AFTER INSERT ON ports BEGIN
+        INSERT INTO ports_rtree (id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS ports_rtree_delete AFTER DELETE ON ports BEGIN
+        DELETE FROM ports_rtree WHERE id = OLD.id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS ports_rtree_update AFTER UPDATE OF id, latitude, longitude ON ports BEGIN
+        DELETE FROM ports_rtree WHERE id = OLD.id;
+        INSERT INTO ports_rtree (id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END''',
+]
+
+def backfill(conn: sqlite3.Connection):
+    conn.execute('DELETE FROM ports_rtree')
+    conn.execute('''
+        INSERT INTO ports_rtree (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT id, latitude, latitude, longitude, longitude FROM ports
+    ''')
+
+def _lon_ranges(min_lon: float, max_lon: float) -> list[tuple]:
+    # A box crossing the antimeridian (min_lon > max_lon) is two boxes
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    return [(min_lon, 180.0), (-180.0, max_lon)]
+
+# The R*Tree stores 32-bit floats rounded outwards, so hits are rechecked
+# against the exact coordinates
+_IN_BOX = '''r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?
+              AND p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?'''
+
+def _box(min_lat: float, max_lat: float, west: float, east: float) -> tuple:
+    return max_lat, min_lat, east, west, min_lat, max_lat, west, east
+
+def in_bbox(conn: sqlite3.Connection, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> list:
+    """Ports inside a (min_lon, min_lat, max_lon, max_lat) box, via the R*Tree"""
+    rows = []
+    for west, east in _lon_ranges(min_lon, max_lon):
+        rows += conn.execute(
+            f'SELECT {PORT_COLUMNS} FROM ports_rtree r JOIN ports p ON p.id = r.id WHERE {_IN_BOX}',
+            _box(min_lat, max_lat, west, east),
+        ).fetchall()
+    return rows
+
+def cell_size(zoom: int) -> float:
+    """Clustering grid cell edge in degrees at a web-map zoom level"""
+    return 360.0 / (2 ** zoom) / CLUSTER_CELLS
+
+def viewport(conn: sqlite3.Connection, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+             zoom: Optional[int] = None) -> dict:
+    """Visible ports, with those sharing a grid cell at `zoom` merged into clusters.
+
+    Grouping runs in SQLite over the R*Tree hits only. A cell holding one
+    port returns the port's row; a cluster carries its centroid, bounds,
+    port count, mean and max risk and total active events.
+    """
+    if zoom is None or zoom >= CLUSTER_MAX_ZOOM:
+        return {"ports": in_bbox(conn, min_lon, min_lat, max_lon, max_lat), "clusters": []}
+    cell = cell_size(zoom)
+    ports, clusters = [], []
+    for west, east in _lon_ranges(min_lon, max_lon):
+        # Bare columns next to MIN(p.id) come from that row, so a single-port
+        # cell carries the port itself
+        cells = conn.execute(f'''
+            SELECT COUNT(*) AS port_count, MIN(p.id) AS id, p.name, p.country, p.latitude, p.longitude, p.risk_score, p.active_events,
+                   AVG(p.latitude) AS center_lat, AVG(p.longitude) AS center_lon,
+                   AVG(p.risk_score) AS avg_risk, MAX(p.risk_score) AS max_risk, SUM(p.active_events) AS total_events,
+                   MIN(p.longitude) AS west, MIN(p.latitude) AS south, MAX(p.longitude) AS east, MAX(p.latitude) AS north
+            FROM ports_rtree r JOIN ports p ON p.id = r.id
+            WHERE {_IN_BOX}
+            GROUP BY CAST((p.latitude + 90.0) / ? AS INTEGER), CAST((p.longitude + 180.0) / ? AS INTEGER)
+        ''', (*_box(min_lat, max_lat, west, east), cell, cell)).fetchall()
+        for row in cells:
+            if row["port_count"] == 1:
+                ports.append(row)
+            else:
+                clusters.append({
+                    "latitude": row["center_lat"],
+                    "longitude": row["center_lon"],
+                    "port_count": row["port_count"],
+                    "risk_score": round(row["avg_risk"], 4),
+                    "max_risk_score": row["max_risk"],
+                    "active_events": row["total_events"],
+                    "bbox": [row["west"], row["south"], row["east"], row["north"]],
+                })
+    return {"ports": ports, "clusters": clusters}
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> tuple:
+    """(min_lon, min_lat, max_lon, max_lat) enclosing a circle; whole longitude band near the poles"""
+    # Degrees of arc on the same sphere haversine_km measures on
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM) + BBOX_MARGIN_DEGREES
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat <= 0 or dlat / cos_lat >= 180:
+        return -180.0, min_lat, 180.0, max_lat
+    dlon = dlat / cos_lat
+    wrap = lambda value: (value + 180.0) % 360.0 - 180.0
+    return wrap(lon - dlon), min_lat, wrap(lon + dlon), max_lat
+
+def near(conn: sqlite3.Connection, lat: float, lon: float, radius_km: float, limit: int = 50) -> list[dict]:
+    """Ports within `radius_km` great-circle distance, nearest first.
+
+    The R*Tree narrows candidates to the circle's bounding box; only those
+    get an exact haversine distance.
+    """
+    hits = []
+    for row in in_bbox(conn, *radius_bbox(lat, lon, radius_km)):
+        distance = haversine_km(lat, lon, row["latitude"], row["longitude"])
+        if distance <= radius_km:
+            hits.append({**dict(row), "distance_km": round(distance, 3)})
+    hits.sort(key=lambda hit: (hit["distance_km"], hit["id"]))
+    return hits[:limit]
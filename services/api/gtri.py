@@ -0,0 +1,149 @@
+import bisect
+import threading
+from collections import Counter
+
+WINDOW = 100
+CRITICAL_SEVERITY = 0.7
+RECENT = 10
+OLDER = 20
+
+def _severity_stats(severities: list) -> tuple:
+    """GTRI value and trend from severities ordered newest first"""
+    total_severity = sum(severities)
+    gtri = min(total_severity / len(severities), 1.0)
+
+    recent_avg = sum(severities[:RECENT]) / min(RECENT, len(severities))
+    older = severities[RECENT:RECENT + OLDER]
+    if not older:
+        # Not enough history to compare against
+        return gtri, "stable"
+    older_avg = sum(older) / min(OLDER, len(severities[RECENT:]))
+    trend = "rising" if recent_avg > older_avg else "falling" if recent_avg < older_avg else "stable"
+    return gtri, trend
+
+def legacy_index(events: list) -> dict:
+    """Recompute-on-read formula over (severity, port) rows, newest first"""
+    if not events:
+        return {"gtri": 0.0, "trend": "stable", "critical_count": 0, "affected_ports": 0}
+
+    gtri, trend = _severity_stats([e[0] for e in events])
+    critical_count = sum(1 for e in events if e[0] > CRITICAL_SEVERITY)
+    ports = set(e[1] for e in events)
+    return {"gtri": round(gtri, 2), "trend": trend, "critical_count": critical_count, "affected_ports": len(ports)}
+
+class GTRIEngine:
+    """Keeps the Global Trade Risk Index current as events are written.
+
+    Holds the newest `window` events (plus a reserve so deletes can promote
+    the next-newest without a query) ordered by (timestamp, id). The critical
+    counter and per-port refcounts are adjusted per event. Severity sums are
+    re-added over the window in the original newest-first order on every
+    change, so the published values match the recompute-on-read formula
+    exactly. Reads return the cached snapshot.
+    """
+
+    def __init__(self, window: int = WINDOW, reserve: int = WINDOW):
+        self.window = window
+        self.capacity = window + reserve
+        self._lock = threading.Lock()
+        self._keys: list[tuple] = []   # ascending (timestamp, id)
+        self._rows: dict[int, tuple] = {}  # id -> (severity, port)
+        self._exhausted = True  # True when the table has no rows beyond the buffer
+        self._critical = 0
+        self._ports: Counter = Counter()
+        self._snapshot = legacy_index([])
+
+    def rebuild(self, conn):
+        """Reload state from the events table"""
+        rows = conn.execute(
+            'SELECT id, timestamp, severity, port FROM events ORDER BY timestamp DESC, id DESC LIMIT ?',
+            (self.capacity + 1,),
+        ).fetchall()
+        with self._lock:
+            self._exhausted = len(rows) <= self.capacity
+            rows = rows[:self.capacity]
+            self._keys = sorted((row[1], row[0]) for row in rows)
+            self._rows = {row[0]: (row[2], row[3]) for row in rows}
+            self._critical = 0
+            self._ports = Counter()
+            for key in self._keys[-self.window:]:
+                self._enter(key)
+            self._refresh()
+
+    def on_insert(self, events):
+        """Apply newly inserted events given as dicts with id, timestamp, severity and port"""
+        with self._lock:
+            for event in events:
+                key = (event["timestamp"], event["id"])
+                if self._keys and key < self._keys[0] and (not self._exhausted or len(self._keys) >= self.capacity):
+                    # Older than anything buffered, cannot reach the window
+                    self._exhausted = False
+                    continue
+                index = bisect.bisect(self._keys, key)
+                self._keys.insert(index, key)
+                self._rows[event["id"]] = (event["severity"], event["port"])
+                if index >= len(self._keys) - self.window:
+                    self._enter(key)
+                    if len(self._keys) > self.window:
+                        # Newest window shifts by one, the oldest member drops out
+                        self._leave(self._keys[-self.window - 1])
+                if len(self._keys) > self.capacity:
+                    dropped = self._keys.pop(0)
+                    del self._rows[dropped[1]]
+                    self._exhausted = False
+            self._refresh()
+
+    def on_delete(self, conn, event_ids):
+        """Apply deleted events, refilling the reserve from the table if it runs dry"""
+        with self._lock:
+            for event_id in event_ids:
+                if event_id not in self._rows:
+                    continue
+                key = next(k for k in self._keys if k[1] == event_id)
+                index = self._keys.index(key)
+                in_window = index >= len(self._keys) - self.window
+                if in_window:
+                    self._leave(key)
+                self._keys.pop(index)
+                del self._rows[event_id]
+                if in_window and len(self._keys) >= self.window:
+                    # Next-newest event moves up into the window
+                    self._enter(self._keys[-self.window])
+            needs_refill = len(self._keys) < self.window and not self._exhausted
+            if not needs_refill:
+                self._refresh()
+        if needs_refill:
+            self.rebuild(conn)
+
+    def snapshot(self) -> dict:
+        return self._snapshot
+
+    def _enter(self, key):
+        severity, port = self._rows[key[1]]
+        self._critical += severity > CRITICAL_SEVERITY
+        self._ports[port] += 1
+
+    def _leave(self, key):
+        severity, port = self._rows[key[1]]
+        self._critical -= severity > CRITICAL_SEVERITY
+        self._ports[port] -= 1
+        if not self._ports[port]:
+            del self._ports[port]
+
+    def _refresh(self):
+        window = self._keys[-self.window:]
+        if not window:
+            self._snapshot = legacy_index([])
+            return
+        # Newest first, the order the original formula summed in
+        severities = [self._rows[key[1]][0] for key in reversed(window)]
+        gtri, trend = _severity_stats(severities)
+
+        self._snapshot = {
+            "gtri": round(gtri, 2),
+            "trend": trend,
+            "critical_count": self._critical,
+            "affected_ports": len(self._ports),
+        }
+
+gtri_engine = GTRIEngine()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import sqlite3
+from collections import Counter
+from models import EventCreate
+from repositories import run_query
+from gtri import gtri_engine
+from sku_index import sku_index
+from port_risk import risk_engine
+import changes
+from broker import broker, RELAY_BATCH_SIZE
+from cache import change_versions
+from risk_jobs import publish_port_risk
+
+BATCH_SIZE = int(os.getenv("TRADEGUARD_INGEST_BATCH_SIZE", "1000"))
+MAX_BATCH_SIZE = 10_000
+
+# What GTRI needs of each inserted event, as relayed to the other workers
+GTRI_FIELDS = ("id", "timestamp", "severity", "port")
+
+EVENT_COLUMNS = ("title", "summary", "severity", "port", "commodity", "region", "source", "sentiment_score", "tags", "timestamp")
+
+def _row(event: EventCreate) -> tuple:
+    tags = json.dumps(event.tags) if event.tags is not None else None
+    return (event.title, event.summary, event.severity, event.port, event.commodity,
+            event.region, event.source, event.sentiment_score, tags, event.timestamp)
+
+def insert_events(conn: sqlite3.Connection, events: list[EventCreate]) -> tuple:
+    """Insert a batch in one transaction, skipping natural-key duplicates.
+
+    Port risk scores and event counters and the risk levels of SKUs routed
+    through the affected ports are updated in the same transaction (daily
+    rollups and the change log follow via triggers). Returns the rows that
+    were actually inserted, the ids of the SKUs whose risk was recomputed,
+    the ports whose risk changed and the inserts as sequenced changes.
+    """
+    if not events:
+        return [], [], [], []
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Rowids are allocated above the current max while we hold the write lock
+        high_water = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+        seq_high_water = changes.head(conn)
+        conn.executemany(
+            f'INSERT OR IGNORE INTO events ({", ".join(EVENT_COLUMNS)}) VALUES ({", ".join("?" * len(EVENT_COLUMNS))})',
+            [_row(event) for event in events],
+        )
+        inserted = [dict(row) for row in conn.execute('SELECT * FROM events WHERE id > ? ORDER BY id', (high_water,))]
+        by_id = {row["id"]: row for row in inserted}
+        sequenced = [changes.change_message(seq, op, event_id, by_id.get(event_id))
+                     for seq, op, event_id in changes.changes_after(conn, seq_high_water)]
+        if sequenced:
+            changes.prune(conn, sequenced[-1]["seq"])
+
+        per_port = Counter(row["port"] for row in inserted)
+        changed_ports = risk_engine.apply_inserted(conn, high_water)
+        affected_skus = sku_index.propagate(conn, per_port)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted, affected_skus, changed_ports, sequenced
+
+async def ingest_batch(events: list[EventCreate]) -> list[dict]:
+    """Write a batch off the event loop, then update in-memory state and notify subscribers"""
+    inserted, affected_skus, changed_ports, sequenced = await run_query(insert_events, events)
+    if inserted:
+        _apply(inserted, affected_skus)
+        for start in range(0, len(inserted), RELAY_BATCH_SIZE):
+            broker.relay(applied_message(inserted[start:start + RELAY_BATCH_SIZE], affected_skus if not start else []))
+        broker.publish_batch(sequenced)
+        publish_port_risk(changed_ports)
+    return inserted
+
+def applied_message(inserted: list[dict], affected_skus: list[int]) -> dict:
+    """A committed batch as the other workers apply it"""
+    return {"type": "ingest", "events": [[row[field] for field in GTRI_FIELDS] for row in inserted], "skus": affected_skus}
+
+def _apply(inserted: list[dict], affected_skus: list[int]):
+    gtri_engine.on_insert(inserted)
+    # Bumped once in-memory state is current so cached reads never outlive it
+    change_versions.bump("events")
+    change_versions.bump("skus", affected_skus)
+
+def _apply_relayed(message: dict):
+    _apply([dict(zip(GTRI_FIELDS, event)) for event in message["events"]], message["skus"])
+
+async def resync():
+    """Reload GTRI and invalidate every cached read, after relayed batches may have been lost"""
+    try:
+        await run_query(gtri_engine.rebuild)
+    except Exception as e:
+        print(f"[v0] GTRI resync error: {e}")
+    for table in ("events", "skus", "ports", "users"):
+        change_versions.bump(table)
+
+_resyncs: set[asyncio.Task] = set()
+
+def _resync_relayed(message: dict):
+    task = asyncio.create_task(resync())
+    _resyncs.add(task)
+    task.add_done_callback(_resyncs.discard)
+
+broker.listen("ingest", _apply_relayed, deliver=False)
+broker.listen("resync", _resync_relayed, deliver=False)
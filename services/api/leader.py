@@ -0,0 +1,70 @@
+import asyncio
+import fcntl
+import os
+from database import pool
+from forecast_jobs import forecast_scheduler
+from risk_jobs import risk_scheduler
+
+# Seconds between a standby worker's attempts to take over the jobs
+LEADER_RETRY = float(os.getenv("TRADEGUARD_LEADER_RETRY", "5"))
+
+class JobLeader:
+    """Runs the periodic jobs in one worker per database.
+
+    With uvicorn --workers N every worker has its own schedulers; started
+    in all of them, each would recompute the same forecasts and risk scores,
+    start its own process pool and race the others on the stored watermark.
+    Instead the worker that takes a lock file beside the database starts
+    them, as the broadcast hub elects its host. The others keep trying every
+    `retry` seconds and take over once the lock is released, which the OS
+    does when its holder exits; they only consume the results, which are
+    committed to the database and relayed over the broker.
+    """
+
+    def __init__(self, jobs: list, retry: float = LEADER_RETRY):
+        self.jobs = jobs
+        self.retry = retry
+        self._lock_file = None
+        self._task: asyncio.Task = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def _try_lock(self) -> bool:
+        lock_file = open(f"{pool.path}.jobs.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._elect())
+
+    async def _elect(self):
+        while not self._try_lock():
+            await asyncio.sleep(self.retry)
+        print(f"[v0] Worker {os.getpid()} runs the scheduled jobs")
+        for job in self.jobs:
+            await job.start()
+
+    async def stop(self):
+        """Stop the jobs, then release the lock so a standby only starts them once they have stopped"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for job in reversed(self.jobs):
+            await job.stop()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self) -> dict:
+        return {"pid": os.getpid(), "leader": self.is_leader}
+
+job_leader = JobLeader([forecast_scheduler, risk_scheduler])
@@ -4,22 +4,56 @@ from pathlib import Path
 # Add the services/api directory to Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from contextlib import asynccontextmanager
 import sqlite3
 from pathlib import Path
-from database import init_db
-from routes import events, forecast, skus, health, analytics, ports, news, websocket, auth
+from database import init_db, close_db, get_db, PoolTimeout
+from repositories import QueryTimeout, shutdown_executor
+from pagination import InvalidCursor
+from gtri import gtri_engine
+from sku_index import sku_index
+from broker import broker
+from cache import CacheMiddleware
+from admission import AdmissionMiddleware, ADMISSION_ENABLED
+from auth import HasherBusy, password_hasher
+from metrics import MetricsMiddleware, loop_monitor
+from profiler import profiler, PROFILE_ON_START
+from port_risk import risk_engine
+from leader import job_leader
+from changes import change_feed
+from routes import events, forecast, skus, health, analytics, ports, news, search, websocket, auth, metrics
 
 # Initialize database on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     init_db()
+    with get_db() as conn:
+        gtri_engine.rebuild(conn)
+        sku_index.rebuild(conn)
+        # Seeded or stale scores are decayed to now before serving
+        risk_engine.recompute(conn)
+        # Reconnecting clients resume from memory rather than all reading change_log at once
+        change_feed.load(conn)
+    await broker.start()
+    await loop_monitor.start()
+    if PROFILE_ON_START:
+        profiler.start()
+    # Scheduled forecast and risk recomputes run in one worker only
+    await job_leader.start()
     yield
     # Shutdown
+    await job_leader.stop()
+    profiler.stop()
+    await loop_monitor.stop()
+    await broker.stop()
+    shutdown_executor()
+    password_hasher.shutdown()
+    close_db()
 
 app = FastAPI(
     title="TradeGuardAI API",
@@ -28,6 +62,14 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Innermost, inside the cache, so only requests that will do work are admitted
+# or shed; rejections still get CORS headers and are counted in the metrics
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
+# Cached responses still pass through host checks and CORS
+app.add_middleware(CacheMiddleware)
+
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1", "*.vercel.app", "*"])
 
 # CORS middleware
@@ -37,8 +79,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Outermost, so the timings include every other middleware and cache hits
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request: Request, exc: QueryTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@app.exception_handler(HasherBusy)
+async def hasher_busy_handler(request: Request, exc: HasherBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 app.include_router(auth.router)
 app.include_router(health.router)
 app.include_router(events.router)
@@ -47,7 +109,9 @@ app.include_router(skus.router)
 app.include_router(analytics.router)
 app.include_router(ports.router)
 app.include_router(news.router)
+app.include_router(search.router)
 app.include_router(websocket.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,251 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from starlette.routing import Match
+
+# Seconds between event loop lag probes
+LOOP_LAG_INTERVAL = float(os.getenv("TRADEGUARD_LOOP_LAG_INTERVAL", "0.5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus model"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = {labels: ([*counts], total, count) for labels, (counts, total, count) in self._series.items()}
+        lines = []
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labels, labels)} {_number(value)}" for labels, value in sorted(values.items())]
+
+class Gauge:
+    """Value read at scrape time from `read()`: a number, or {label values: number}.
+
+    kind="counter" exposes a running total kept elsewhere (such as a stats()
+    counter) as a counter.
+    """
+
+    def __init__(self, name: str, help: str, read, labels: tuple = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        value = self.read()
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_labels(self.labels, labels)} {_number(number)}"
+                for labels, number in sorted(value.items()) if number is not None]
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, read, labels: tuple = (), kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(name, help, read, labels, kind))
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                print(f"[v0] Metric {metric.name} failed to render: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_duration = registry.histogram(
+    "tradeguard_http_request_duration_seconds", "Time to the last response byte, by route template",
+    ("method", "route", "status"),
+)
+db_query_duration = registry.histogram(
+    "tradeguard_db_query_duration_seconds", "Repository query time on a pooled connection, fetching included", ("query",),
+)
+db_query_rows = registry.histogram("tradeguard_db_query_rows", "Rows returned by list-valued repository queries", ("query",), ROW_BUCKETS)
+db_query_errors = registry.counter("tradeguard_db_query_errors_total", "Repository queries that raised", ("query",))
+db_checkout_duration = registry.histogram("tradeguard_db_checkout_seconds", "Time to check a connection out of the pool")
+serialize_duration = registry.histogram(
+    "tradeguard_serialize_seconds", "Encoding rows straight to JSON on the fast path", ("model",),
+    (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+loop_lag = registry.histogram(
+    "tradeguard_event_loop_lag_seconds", "How late the event loop woke a timer",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests into http_duration.
+
+    Requests are labelled with their route's path template (so ids do not
+    multiply series); paths matching no route share the label "unmatched".
+    """
+
+    CACHE_SIZE = 2048
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _route(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        with self._lock:
+            template = self._routes.get(key)
+            if template is not None:
+                self._routes.move_to_end(key)
+                return template
+        template = "unmatched"
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                template = route.path
+                break
+        with self._lock:
+            self._routes[key] = template
+            while len(self._routes) > self.CACHE_SIZE:
+                self._routes.popitem(last=False)
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            http_duration.observe(time.perf_counter() - started, scope["method"], self._route(scope), str(status))
+
+class LoopLagMonitor:
+    """Sleeps `interval` seconds at a time and records how late each wake-up is"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            self.last = lag
+            self.max = max(self.max, lag)
+            loop_lag.observe(lag)
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+loop_monitor = LoopLagMonitor()
+registry.gauge("tradeguard_event_loop_lag_last_seconds", "Lag of the latest event loop probe", lambda: loop_monitor.last)
@@ -0,0 +1,547 @@
+import sqlite3
+from datetime import datetime
+import rollups
+import fulltext
+import sentiment
+import geo
+import port_risk
+import changes
+
+# The events columns when migration 4 ran, before any later ones added to them
+V4_EVENT_COLUMNS = "id, title, summary, severity, port, commodity, region, source, sentiment_score, tags, timestamp"
+
+def _quarantine_duplicate_events(conn: sqlite3.Connection):
+    """Move all but the first copy of each (port, timestamp, title) to events_quarantine"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events_quarantine (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            severity REAL NOT NULL,
+            port TEXT NOT NULL,
+            commodity TEXT NOT NULL,
+            region TEXT,
+            source TEXT,
+            sentiment_score REAL,
+            tags TEXT,
+            timestamp TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            quarantined_at TEXT NOT NULL
+        )
+    ''')
+    duplicates = 'SELECT id FROM events WHERE id NOT IN (SELECT MIN(id) FROM events GROUP BY port, timestamp, title)'
+    moved = conn.execute(
+        f'''
+            INSERT INTO events_quarantine ({V4_EVENT_COLUMNS}, reason, quarantined_at)
+            SELECT {V4_EVENT_COLUMNS}, 'duplicate of an earlier event with the same port, timestamp and title', ?
+            FROM events WHERE id IN ({duplicates})
+        ''',
+        (datetime.utcnow().isoformat(),),
+    ).rowcount
+    conn.execute(f'DELETE FROM events WHERE id IN ({duplicates})')
+    if moved:
+        print(f"[v0] Migration 4 moved {moved} duplicate events to events_quarantine")
+
+# Ordered schema migrations: (version, name, steps). A step is either a SQL
+# statement or a callable taking the connection, for data migrations. A
+# released migration never changes. Steps may take DDL and backfills from the
+# module owning the tables only while those still match what was released;
+# before the module changes them, the released SQL is copied in here and the
+# change becomes a new version.
+MIGRATIONS = [
+    (1, "baseline schema", [
+        '''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                hashed_password TEXT NOT NULL,
+                is_admin BOOLEAN DEFAULT 0,
+                created_at TEXT NOT NULL
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                severity REAL NOT NULL,
+                port TEXT NOT NULL,
+                commodity TEXT NOT NULL,
+                region TEXT,
+                source TEXT,
+                sentiment_score REAL,
+                tags TEXT,
+                timestamp TEXT NOT NULL
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS skus (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                commodity TEXT NOT NULL,
+                ports TEXT NOT NULL,
+                risk_level REAL NOT NULL
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS ports (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                country TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                risk_score REAL NOT NULL,
+                active_events INTEGER DEFAULT 0
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                source TEXT NOT NULL,
+                url TEXT,
+                summary TEXT NOT NULL,
+                sentiment REAL,
+                published_at TEXT NOT NULL
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS forecasts_history (
+                id INTEGER PRIMARY KEY,
+                sku_id INTEGER NOT NULL,
+                forecast_date TEXT NOT NULL,
+                risk REAL NOT NULL,
+                upper_bound REAL,
+                lower_bound REAL,
+                created_at TEXT NOT NULL
+            )
+        ''',
+    ]),
+    (2, "indexes for hot queries", [
+        # Latest-events listing, GTRI window and trends range scan; covers the
+        # severity/port reads so they never touch the table
+        'CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp, severity, port)',
+        'CREATE INDEX IF NOT EXISTS idx_events_port_timestamp ON events(port, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_articles_published_at ON articles(published_at)',
+        'CREATE INDEX IF NOT EXISTS idx_articles_sentiment ON articles(sentiment) WHERE sentiment IS NOT NULL',
+        'CREATE INDEX IF NOT EXISTS idx_forecasts_history_sku_date ON forecasts_history(sku_id, forecast_date)',
+        'CREATE INDEX IF NOT EXISTS idx_skus_risk_level ON skus(risk_level)',
+        'CREATE INDEX IF NOT EXISTS idx_ports_risk_score ON ports(risk_score)',
+        'CREATE INDEX IF NOT EXISTS idx_ports_name ON ports(name)',
+    ]),
+    (3, "daily event rollups", [
+        *rollups.ROLLUP_TABLES,
+        *rollups.ROLLUP_TRIGGERS,
+        rollups.backfill,
+    ]),
+    (4, "natural key for event dedupe", [
+        # Keep the first copy of any duplicates so the unique index can be
+        # built; the others are moved to events_quarantine, not dropped
+        _quarantine_duplicate_events,
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_events_natural_key ON events(port, timestamp, title)',
+        # Superseded by the natural key, which has the same leading columns
+        'DROP INDEX IF EXISTS idx_events_port_timestamp',
+    ]),
+    (5, "keyset pagination indexes", [
+        # Listings page on (timestamp, id); the implicit rowid suffix of a
+        # single-column index supplies the id tiebreak without a sort. The
+        # covering columns are no longer read now GTRI and trends are cached.
+        'DROP INDEX IF EXISTS idx_events_timestamp',
+        'CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_events_port_timestamp ON events(port, timestamp)',
+    ]),
+    (6, "one stored forecast per sku and date", [
+        'DELETE FROM forecasts_history WHERE id NOT IN (SELECT MAX(id) FROM forecasts_history GROUP BY sku_id, forecast_date)',
+        'DROP INDEX IF EXISTS idx_forecasts_history_sku_date',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_forecasts_history_sku_date ON forecasts_history(sku_id, forecast_date)',
+    ]),
+    (7, "forecast recompute watermark", [
+        '''
+            CREATE TABLE IF NOT EXISTS forecast_watermark (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                last_event_id INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''',
+    ]),
+    (8, "normalized sku to port mapping", [
+        # skus.ports stays the source of truth; the join table follows it via
+        # triggers, which turn the comma list into a JSON array for json_each
+        '''
+        CREATE TABLE IF NOT EXISTS sku_ports (
+            sku_id INTEGER NOT NULL,
+            port TEXT NOT NULL,
+            PRIMARY KEY (sku_id, port)
+        ) WITHOUT ROWID
+    ''',
+        'CREATE INDEX IF NOT EXISTS idx_sku_ports_port ON sku_ports(port, sku_id)',
+        '''CREATE TRIGGER IF NOT EXISTS skus_ports_insert AFTER INSERT ON skus BEGIN
+        INSERT OR IGNORE INTO sku_ports (sku_id, port)
+        SELECT NEW.id, trim(value) FROM json_each('["' || replace(NEW.ports, ',', '","') || '"]') WHERE trim(value) != '';
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS skus_ports_delete AFTER DELETE ON skus BEGIN
+        DELETE FROM sku_ports WHERE sku_id = OLD.id;
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS skus_ports_update AFTER UPDATE OF id, ports ON skus BEGIN
+        DELETE FROM sku_ports WHERE sku_id = OLD.id;
+        INSERT OR IGNORE INTO sku_ports (sku_id, port)
+        SELECT NEW.id, trim(value) FROM json_each('["' || replace(NEW.ports, ',', '","') || '"]') WHERE trim(value) != '';
+    END''',
+        'DELETE FROM sku_ports',
+        '''
+        INSERT OR IGNORE INTO sku_ports (sku_id, port)
+        SELECT skus.id, trim(value) FROM skus, json_each('["' || replace(skus.ports, ',', '","') || '"]') WHERE trim(value) != ''
+    ''',
+    ]),
+    (9, "full-text search over events and articles", [
+        *fulltext.SEARCH_TABLES,
+        *fulltext.SEARCH_TRIGGERS,
+        fulltext.backfill,
+    ]),
+    (10, "event tags and facet counters", [
+        # Tag posting lists in (timestamp, id) order, so a tag-filtered page is
+        # a range seek like the unfiltered listing, and unfiltered facet counts
+        # kept by the triggers below. events.tags holds a JSON array (ingest)
+        # or a legacy comma list; both are split the way decode_tags reads them
+        '''
+        CREATE TABLE IF NOT EXISTS event_tags (
+            tag TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            event_id INTEGER NOT NULL,
+            PRIMARY KEY (tag, timestamp, event_id)
+        ) WITHOUT ROWID
+    ''',
+        'CREATE INDEX IF NOT EXISTS idx_event_tags_event ON event_tags(event_id, tag)',
+        '''
+        CREATE TABLE IF NOT EXISTS event_facet_counts (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            event_count INTEGER NOT NULL,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID
+    ''',
+        'CREATE INDEX IF NOT EXISTS idx_event_facet_counts_top ON event_facet_counts(dimension, event_count DESC, key)',
+        'CREATE INDEX IF NOT EXISTS idx_events_commodity_timestamp ON events(commodity, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_events_region_timestamp ON events(region, timestamp)',
+        '''CREATE TRIGGER IF NOT EXISTS events_facets_insert AFTER INSERT ON events BEGIN
+        INSERT OR IGNORE INTO event_tags (tag, timestamp, event_id)
+        SELECT trim(value), NEW.timestamp, NEW.id FROM json_each(CASE WHEN json_valid(NEW.tags) AND json_type(NEW.tags) = 'array' THEN NEW.tags
+            ELSE '[' || replace(json_quote(coalesce(NEW.tags, '')), ',', '","') || ']' END) WHERE trim(value) != '';
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', NEW.commodity, 1 WHERE NEW.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', NEW.region, 1 WHERE NEW.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', NEW.port, 1 WHERE NEW.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS events_facets_delete AFTER DELETE ON events BEGIN
+        DELETE FROM event_tags WHERE event_id = OLD.id;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', OLD.commodity, -1 WHERE OLD.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'commodity' AND key = OLD.commodity AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', OLD.region, -1 WHERE OLD.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'region' AND key = OLD.region AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', OLD.port, -1 WHERE OLD.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'port' AND key = OLD.port AND event_count <= 0;
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS events_facets_update_tags AFTER UPDATE OF id, tags, timestamp ON events BEGIN
+        DELETE FROM event_tags WHERE event_id = OLD.id;
+        INSERT OR IGNORE INTO event_tags (tag, timestamp, event_id)
+        SELECT trim(value), NEW.timestamp, NEW.id FROM json_each(CASE WHEN json_valid(NEW.tags) AND json_type(NEW.tags) = 'array' THEN NEW.tags
+            ELSE '[' || replace(json_quote(coalesce(NEW.tags, '')), ',', '","') || ']' END) WHERE trim(value) != '';
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS events_facets_update AFTER UPDATE OF commodity, region, port ON events BEGIN
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', OLD.commodity, -1 WHERE OLD.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'commodity' AND key = OLD.commodity AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', OLD.region, -1 WHERE OLD.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'region' AND key = OLD.region AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', OLD.port, -1 WHERE OLD.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'port' AND key = OLD.port AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', NEW.commodity, 1 WHERE NEW.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', NEW.region, 1 WHERE NEW.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', NEW.port, 1 WHERE NEW.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS event_tags_count_insert AFTER INSERT ON event_tags BEGIN
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'tag', NEW.tag, 1 WHERE NEW.tag IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS event_tags_count_delete AFTER DELETE ON event_tags BEGIN
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'tag', OLD.tag, -1 WHERE OLD.tag IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'tag' AND key = OLD.tag AND event_count <= 0;
+    END''',
+        'DELETE FROM event_tags',
+        '''
+        INSERT OR IGNORE INTO event_tags (tag, timestamp, event_id)
+        SELECT trim(value), events.timestamp, events.id FROM events, json_each(CASE WHEN json_valid(events.tags) AND json_type(events.tags) = 'array' THEN events.tags
+            ELSE '[' || replace(json_quote(coalesce(events.tags, '')), ',', '","') || ']' END) WHERE trim(value) != ''
+    ''',
+        'DELETE FROM event_facet_counts',
+        '''
+        INSERT INTO event_facet_counts (dimension, key, event_count)
+        SELECT 'tag', tag, COUNT(*) FROM event_tags GROUP BY tag
+    ''',
+        '''
+            INSERT INTO event_facet_counts (dimension, key, event_count)
+            SELECT 'commodity', commodity, COUNT(*) FROM events WHERE commodity IS NOT NULL GROUP BY commodity
+        ''',
+        '''
+            INSERT INTO event_facet_counts (dimension, key, event_count)
+            SELECT 'region', region, COUNT(*) FROM events WHERE region IS NOT NULL GROUP BY region
+        ''',
+        '''
+            INSERT INTO event_facet_counts (dimension, key, event_count)
+            SELECT 'port', port, COUNT(*) FROM events WHERE port IS NOT NULL GROUP BY port
+        ''',
+    ]),
+    (11, "hourly and daily news sentiment buckets", [
+        *sentiment.SENTIMENT_TABLES,
+        *sentiment.SENTIMENT_TRIGGERS,
+        sentiment.backfill,
+        # Only served the full-table sentiment read the buckets replace
+        'DROP INDEX IF EXISTS idx_articles_sentiment',
+    ]),
+    (12, "spatial index on port coordinates", [
+        *geo.SPATIAL_TABLES,
+        *geo.SPATIAL_TRIGGERS,
+        geo.backfill,
+    ]),
+    (13, "decayed port risk scores", [
+        *port_risk.PORT_RISK_COLUMNS,
+        port_risk.backfill,
+    ]),
+    (14, "event change log", [
+        *changes.CHANGE_TABLES,
+        *changes.CHANGE_TRIGGERS,
+    ]),
+    (15, "escape port names when splitting sku ports", [
+        # The version 8 triggers broke on port names with quotes or backslashes
+        'DROP TRIGGER IF EXISTS skus_ports_insert',
+        'DROP TRIGGER IF EXISTS skus_ports_update',
+        # The comma list is quoted as one JSON string before it is split, so
+        # json_quote escapes any quotes and backslashes
+        '''CREATE TRIGGER IF NOT EXISTS skus_ports_insert AFTER INSERT ON skus BEGIN
+        INSERT OR IGNORE INTO sku_ports (sku_id, port)
+        SELECT NEW.id, trim(value) FROM json_each('[' || replace(json_quote(coalesce(NEW.ports, '')), ',', '","') || ']') WHERE trim(value) != '';
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS skus_ports_update AFTER UPDATE OF id, ports ON skus BEGIN
+        DELETE FROM sku_ports WHERE sku_id = OLD.id;
+        INSERT OR IGNORE INTO sku_ports (sku_id, port)
+        SELECT NEW.id, trim(value) FROM json_each('[' || replace(json_quote(coalesce(NEW.ports, '')), ',', '","') || ']') WHERE trim(value) != '';
+    END''',
+        'DELETE FROM sku_ports',
+        '''
+        INSERT OR IGNORE INTO sku_ports (sku_id, port)
+        SELECT skus.id, trim(value) FROM skus, json_each('[' || replace(json_quote(coalesce(skus.ports, '')), ',', '","') || ']') WHERE trim(value) != ''
+    ''',
+    ]),
+    (16, "facet counters per filter key", [
+        # Counts per facet key among the events having one filter key (tag
+        # pairs in both orders), so facets filtered by a single key read
+        # counters too
+        '''
+        CREATE TABLE IF NOT EXISTS event_facet_pairs (
+            filter_dimension TEXT NOT NULL,
+            filter_key TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            event_count INTEGER NOT NULL,
+            PRIMARY KEY (filter_dimension, filter_key, dimension, key)
+        ) WITHOUT ROWID
+    ''',
+        'CREATE INDEX IF NOT EXISTS idx_event_facet_pairs_top ON event_facet_pairs(filter_dimension, filter_key, dimension, event_count DESC, key)',
+        'DROP TRIGGER IF EXISTS events_facets_insert',
+        'DROP TRIGGER IF EXISTS events_facets_delete',
+        'DROP TRIGGER IF EXISTS events_facets_update',
+        'DROP TRIGGER IF EXISTS events_facets_update_tags',
+        # Pairs are counted from event_tags, so they are taken out before an
+        # event's tags are unlinked and added once they are linked; one update
+        # trigger keeps the tags and columns of both sides consistent
+        '''CREATE TRIGGER IF NOT EXISTS events_facets_insert AFTER INSERT ON events BEGIN
+        INSERT OR IGNORE INTO event_tags (tag, timestamp, event_id)
+        SELECT trim(value), NEW.timestamp, NEW.id FROM json_each(CASE WHEN json_valid(NEW.tags) AND json_type(NEW.tags) = 'array' THEN NEW.tags
+            ELSE '[' || replace(json_quote(coalesce(NEW.tags, '')), ',', '","') || ']' END) WHERE trim(value) != '';
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', NEW.commodity, 1 WHERE NEW.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', NEW.region, 1 WHERE NEW.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', NEW.port, 1 WHERE NEW.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_pairs (filter_dimension, filter_key, dimension, key, event_count)
+        SELECT a.dimension, a.key, b.dimension, b.key, 1 FROM (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = NEW.id
+            UNION ALL SELECT 'commodity', NEW.commodity WHERE NEW.commodity IS NOT NULL
+            UNION ALL SELECT 'region', NEW.region WHERE NEW.region IS NOT NULL
+            UNION ALL SELECT 'port', NEW.port WHERE NEW.port IS NOT NULL) a, (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = NEW.id
+            UNION ALL SELECT 'commodity', NEW.commodity WHERE NEW.commodity IS NOT NULL
+            UNION ALL SELECT 'region', NEW.region WHERE NEW.region IS NOT NULL
+            UNION ALL SELECT 'port', NEW.port WHERE NEW.port IS NOT NULL) b WHERE a.dimension != b.dimension OR a.key != b.key
+        ON CONFLICT(filter_dimension, filter_key, dimension, key) DO UPDATE SET event_count = event_count + 1;
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS events_facets_delete AFTER DELETE ON events BEGIN
+        INSERT INTO event_facet_pairs (filter_dimension, filter_key, dimension, key, event_count)
+        SELECT a.dimension, a.key, b.dimension, b.key, -1 FROM (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) a, (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) b WHERE a.dimension != b.dimension OR a.key != b.key
+        ON CONFLICT(filter_dimension, filter_key, dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_pairs WHERE event_count <= 0
+            AND (filter_dimension, filter_key, dimension, key) IN (SELECT a.dimension, a.key, b.dimension, b.key FROM (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) a, (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) b WHERE a.dimension != b.dimension OR a.key != b.key);
+        DELETE FROM event_tags WHERE event_id = OLD.id;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', OLD.commodity, -1 WHERE OLD.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'commodity' AND key = OLD.commodity AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', OLD.region, -1 WHERE OLD.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'region' AND key = OLD.region AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', OLD.port, -1 WHERE OLD.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'port' AND key = OLD.port AND event_count <= 0;
+    END''',
+        '''CREATE TRIGGER IF NOT EXISTS events_facets_update AFTER UPDATE OF id, tags, timestamp, commodity, region, port ON events BEGIN
+        INSERT INTO event_facet_pairs (filter_dimension, filter_key, dimension, key, event_count)
+        SELECT a.dimension, a.key, b.dimension, b.key, -1 FROM (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) a, (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) b WHERE a.dimension != b.dimension OR a.key != b.key
+        ON CONFLICT(filter_dimension, filter_key, dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_pairs WHERE event_count <= 0
+            AND (filter_dimension, filter_key, dimension, key) IN (SELECT a.dimension, a.key, b.dimension, b.key FROM (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) a, (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = OLD.id
+            UNION ALL SELECT 'commodity', OLD.commodity WHERE OLD.commodity IS NOT NULL
+            UNION ALL SELECT 'region', OLD.region WHERE OLD.region IS NOT NULL
+            UNION ALL SELECT 'port', OLD.port WHERE OLD.port IS NOT NULL) b WHERE a.dimension != b.dimension OR a.key != b.key);
+        DELETE FROM event_tags WHERE event_id = OLD.id;
+        INSERT OR IGNORE INTO event_tags (tag, timestamp, event_id)
+        SELECT trim(value), NEW.timestamp, NEW.id FROM json_each(CASE WHEN json_valid(NEW.tags) AND json_type(NEW.tags) = 'array' THEN NEW.tags
+            ELSE '[' || replace(json_quote(coalesce(NEW.tags, '')), ',', '","') || ']' END) WHERE trim(value) != '';
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', OLD.commodity, -1 WHERE OLD.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'commodity' AND key = OLD.commodity AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', OLD.region, -1 WHERE OLD.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'region' AND key = OLD.region AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', OLD.port, -1 WHERE OLD.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + -1;
+        DELETE FROM event_facet_counts WHERE dimension = 'port' AND key = OLD.port AND event_count <= 0;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'commodity', NEW.commodity, 1 WHERE NEW.commodity IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'region', NEW.region, 1 WHERE NEW.region IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_counts (dimension, key, event_count) SELECT 'port', NEW.port, 1 WHERE NEW.port IS NOT NULL
+        ON CONFLICT(dimension, key) DO UPDATE SET event_count = event_count + 1;
+        INSERT INTO event_facet_pairs (filter_dimension, filter_key, dimension, key, event_count)
+        SELECT a.dimension, a.key, b.dimension, b.key, 1 FROM (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = NEW.id
+            UNION ALL SELECT 'commodity', NEW.commodity WHERE NEW.commodity IS NOT NULL
+            UNION ALL SELECT 'region', NEW.region WHERE NEW.region IS NOT NULL
+            UNION ALL SELECT 'port', NEW.port WHERE NEW.port IS NOT NULL) a, (SELECT 'tag' AS dimension, tag AS key FROM event_tags WHERE event_id = NEW.id
+            UNION ALL SELECT 'commodity', NEW.commodity WHERE NEW.commodity IS NOT NULL
+            UNION ALL SELECT 'region', NEW.region WHERE NEW.region IS NOT NULL
+            UNION ALL SELECT 'port', NEW.port WHERE NEW.port IS NOT NULL) b WHERE a.dimension != b.dimension OR a.key != b.key
+        ON CONFLICT(filter_dimension, filter_key, dimension, key) DO UPDATE SET event_count = event_count + 1;
+    END''',
+        'DELETE FROM event_facet_pairs',
+        '''
+        CREATE TEMP TABLE facet_items AS
+        SELECT event_id, 'tag' AS dimension, tag AS key FROM event_tags
+        UNION ALL SELECT id, 'commodity', commodity FROM events WHERE commodity IS NOT NULL
+        UNION ALL SELECT id, 'region', region FROM events WHERE region IS NOT NULL
+        UNION ALL SELECT id, 'port', port FROM events WHERE port IS NOT NULL
+    ''',
+        'CREATE INDEX temp.idx_facet_items_event ON facet_items(event_id)',
+        '''
+            INSERT INTO event_facet_pairs (filter_dimension, filter_key, dimension, key, event_count)
+            SELECT a.dimension, a.key, b.dimension, b.key, COUNT(*)
+            FROM facet_items a JOIN facet_items b ON b.event_id = a.event_id AND (b.dimension != a.dimension OR b.key != a.key)
+            GROUP BY a.dimension, a.key, b.dimension, b.key
+        ''',
+        'DROP TABLE temp.facet_items',
+    ]),
+    (17, "forecast batch jobs", [
+        # Any worker queues a job; the one running the scheduled jobs claims
+        # it and records progress, so every worker reads the same status.
+        # AUTOINCREMENT keeps ids of pruned jobs from being reused.
+        '''
+            CREATE TABLE IF NOT EXISTS forecast_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                trigger TEXT NOT NULL,
+                status TEXT NOT NULL,
+                sku_ids TEXT,
+                sku_count INTEGER NOT NULL DEFAULT 0,
+                skus_completed INTEGER NOT NULL DEFAULT 0,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                chunks_completed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                elapsed_ms REAL,
+                error TEXT
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_forecast_jobs_status ON forecast_jobs(status, id)',
+    ]),
+]
+
+def current_version(conn: sqlite3.Connection) -> int:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()
+    return row[0] or 0
+
+def migrate(conn: sqlite3.Connection, target: int = None) -> list[int]:
+    """Apply pending migrations in order, each in its own transaction.
+
+    The write lock is taken up front so concurrent workers starting at the
+    same time apply each migration exactly once.
+    """
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                'INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)',
+                (version, name, datetime.utcnow().isoformat()),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
@@ -1,5 +1,10 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Literal, Optional
+
+# Each event writes a facet pair counter for every two of its tags, port,
+# commodity and region, so the tag count bounds the rows one insert writes
+MAX_EVENT_TAGS = 20
+MAX_TAG_LENGTH = 64
 
 class Event(BaseModel):
     id: int
@@ -14,6 +19,54 @@ class Event(BaseModel):
     sentiment_score: Optional[float] = None
     tags: Optional[List[str]] = None
 
+class EventCreate(BaseModel):
+    title: str
+    summary: str
+    severity: float = Field(ge=0.0, le=1.0)
+    port: str
+    commodity: str
+    timestamp: str
+    region: Optional[str] = None
+    source: Optional[str] = None
+    sentiment_score: Optional[float] = None
+    tags: Optional[List[Annotated[str, Field(max_length=MAX_TAG_LENGTH)]]] = Field(None, max_length=MAX_EVENT_TAGS)
+
+class FacetCount(BaseModel):
+    key: str
+    count: int
+
+class EventFacets(BaseModel):
+    total: int
+    tag: List[FacetCount]
+    commodity: List[FacetCount]
+    region: List[FacetCount]
+    port: List[FacetCount]
+
+class EventChange(BaseModel):
+    type: str
+    op: Literal["insert", "update", "delete"]
+    seq: int
+    id: int
+    title: Optional[str] = None
+    summary: Optional[str] = None
+    severity: Optional[float] = None
+    port: Optional[str] = None
+    commodity: Optional[str] = None
+    timestamp: Optional[str] = None
+
+class EventChanges(BaseModel):
+    seq: int
+    reset: bool
+    more: bool
+    changes: List[EventChange]
+
+class BulkIngestResult(BaseModel):
+    received: int
+    inserted: int
+    duplicates: int
+    rejected: int
+    errors: List[dict]
+
 class SKU(BaseModel):
     id: int
     name: str
@@ -32,6 +85,23 @@ class Forecast(BaseModel):
     sku_name: str
     forecast_data: List[ForecastPoint]
 
+class ForecastBatchRequest(BaseModel):
+    sku_ids: Optional[List[int]] = None  # None: SKUs whose ports had new events
+
+class ForecastJob(BaseModel):
+    id: int
+    trigger: str
+    status: str
+    sku_count: int
+    skus_completed: int
+    chunks: int
+    chunks_completed: int
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    elapsed_ms: Optional[float] = None
+    error: Optional[str] = None
+
 class Port(BaseModel):
     id: int
     name: str
@@ -41,6 +111,22 @@ class Port(BaseModel):
     risk_score: float
     active_events: int
 
+class PortCluster(BaseModel):
+    latitude: float
+    longitude: float
+    port_count: int
+    risk_score: float
+    max_risk_score: float
+    active_events: int
+    bbox: List[float]
+
+class PortMap(BaseModel):
+    ports: List[Port]
+    clusters: List[PortCluster]
+
+class NearbyPort(Port):
+    distance_km: float
+
 class Article(BaseModel):
     id: int
     title: str
@@ -50,6 +136,23 @@ class Article(BaseModel):
     published_at: str
     sentiment: Optional[float] = None
 
+class SearchHit(BaseModel):
+    type: Literal["event", "article"]
+    id: int
+    title: str
+    snippet: str
+    score: float
+    timestamp: str
+    port: Optional[str] = None
+    commodity: Optional[str] = None
+    severity: Optional[float] = None
+    source: Optional[str] = None
+    sentiment: Optional[float] = None
+
+class SearchResults(BaseModel):
+    query: str
+    results: List[SearchHit]
+
 class GlobalTradeRiskIndex(BaseModel):
     gtri: float
     trend: str
@@ -0,0 +1,65 @@
+import base64
+import json
+from typing import Literal, Optional
+from fastapi.responses import StreamingResponse
+
+MAX_PAGE_SIZE = 1000
+STREAM_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+ListFormat = Literal["json", "ndjson"]
+
+class InvalidCursor(ValueError):
+    """Raised for cursor tokens that were not issued by this API"""
+
+def encode_cursor(row: dict, key: str = "timestamp") -> str:
+    """Opaque token for the (sort key, id) position after `row`"""
+    raw = json.dumps([row[key], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: Optional[str]) -> Optional[tuple]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    if not isinstance(value, str) or not isinstance(row_id, int):
+        raise InvalidCursor("Malformed cursor")
+    return value, row_id
+
+def next_cursor(rows: list[dict], limit: int, key: str = "timestamp") -> Optional[str]:
+    """Cursor for the following page, or None when this page was the last"""
+    return encode_cursor(rows[-1], key) if len(rows) == limit else None
+
+async def ndjson_rows(fetch_page, cursor: Optional[tuple], limit: Optional[int] = None, key: str = "timestamp", encoder=None):
+    """Yield rows as NDJSON lines, one keyset page at a time.
+
+    `fetch_page(page_size, cursor)` returns the next page; only one page is
+    held in memory regardless of how many rows are streamed. With an
+    `encoder` (see serialization.py) rows are rendered through its model.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = STREAM_PAGE_SIZE if remaining is None else min(STREAM_PAGE_SIZE, remaining)
+        rows = await fetch_page(page_size, cursor)
+        if not rows:
+            return
+        if encoder is not None:
+            yield encoder.encode_lines(rows)
+        else:
+            yield "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows).encode()
+        if len(rows) < page_size:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+        cursor = (rows[-1][key], rows[-1]["id"])
+
+def ndjson_response(fetch_page, cursor: Optional[tuple], limit: Optional[int] = None, key: str = "timestamp", encoder=None) -> StreamingResponse:
+    return StreamingResponse(ndjson_rows(fetch_page, cursor, limit, key, encoder), media_type="application/x-ndjson")
+
+def cursor_headers(rows: list, limit: int, key: str = "timestamp") -> dict:
+    """The following page's cursor as a response header, leaving list bodies unchanged"""
+    token = next_cursor(rows, limit, key)
+    return {NEXT_CURSOR_HEADER: token} if token else {}
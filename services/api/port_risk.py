@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Hours for an event's contribution to halve
+HALF_LIFE = float(os.getenv("TRADEGUARD_RISK_HALF_LIFE", "72"))
+# Events newer than this (hours) count towards active_events
+ACTIVE_WINDOW = float(os.getenv("TRADEGUARD_RISK_ACTIVE_WINDOW", "168"))
+# Decayed severity at which the score reaches 1 - 1/e (~0.63)
+SATURATION = float(os.getenv("TRADEGUARD_RISK_SATURATION", "3.0"))
+# Older events add less than 2^-10 of their severity and are not read
+HORIZON_HALF_LIVES = 10
+
+# Decay state behind the published score: pressure as of risk_updated_at
+PORT_RISK_COLUMNS = [
+    'ALTER TABLE ports ADD COLUMN risk_pressure REAL NOT NULL DEFAULT 0',
+    'ALTER TABLE ports ADD COLUMN risk_updated_at TEXT',
+]
+
+def score(pressure):
+    """Map decayed severity onto [0, 1); works on scalars and arrays"""
+    return np.round(1.0 - np.exp(-np.asarray(pressure) / SATURATION), 2)
+
+def _contributions(conn: sqlite3.Connection, now: str, where: str, params: tuple, positions: dict) -> tuple:
+    """(slots, ages in hours, severities) of the matching events.
+
+    Port names are mapped to slots through `positions`; events at unknown
+    ports or with unparseable timestamps are dropped, and ages are clamped
+    at 0.
+    """
+    rows = conn.execute(
+        f'SELECT port, (julianday(?) - julianday(timestamp)) * 24.0, severity FROM events WHERE {where}',
+        (now, *params),
+    ).fetchall()
+    if not rows:
+        return np.array([], dtype=np.intp), np.array([]), np.array([])
+    ports, ages, severities = zip(*rows)
+    slots = np.fromiter((positions.get(port, -1) for port in ports), dtype=np.intp, count=len(ports))
+    ages = np.array(ages, dtype=float)  # NULL becomes nan
+    valid = (slots >= 0) & ~np.isnan(ages)
+    return slots[valid], np.maximum(ages[valid], 0.0), np.array(severities, dtype=float)[valid]
+
+class PortRiskEngine:
+    """Keeps ports.risk_score and ports.active_events current.
+
+    A port's pressure is the sum of its events' severities, each halved every
+    HALF_LIFE hours; the score saturates it into [0, 1). Pressure is stored
+    with the time it was computed at, so an insert only decays the stored
+    value and adds the new events (apply_inserted, inside the ingest
+    transaction). Events ageing out of the active window or the decay are
+    applied by periodic batch recomputes over every port, vectorized with
+    NumPy. Both return the ports whose published values changed, for the
+    caller to push once committed, and record how long they took.
+    """
+
+    def __init__(self, half_life: float = HALF_LIFE, active_window: float = ACTIVE_WINDOW):
+        self.half_life = half_life
+        self.active_window = active_window
+        self._lock = threading.Lock()
+        self._timings = {kind: {"runs": 0, "total_ms": 0.0, "last_ms": None, "max_ms": 0.0, "ports_changed": 0}
+                         for kind in ("incremental", "batch")}
+
+    @property
+    def horizon(self) -> float:
+        return max(self.half_life * HORIZON_HALF_LIVES, self.active_window)
+
+    def _weights(self, ages, severities):
+        return severities * np.exp2(-ages / self.half_life)
+
+    def apply_inserted(self, conn: sqlite3.Connection, high_water: int, now: datetime = None) -> list[dict]:
+        """Fold events with id > high_water into their ports' scores; the caller commits.
+
+        Each affected port's stored pressure is decayed to now before the new
+        events are added, and events that left the active window since the
+        port was last scored are counted off with an index range. Returns
+        the ports whose risk_score or active_events changed.
+        """
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        window_start = (now - timedelta(hours=self.active_window)).isoformat()
+        now = now.isoformat()
+        names = [row[0] for row in conn.execute('SELECT DISTINCT port FROM events WHERE id > ?', (high_water,))]
+        positions = {name: index for index, name in enumerate(names)}
+        slots, ages, severities = _contributions(conn, now, 'id > ?', (high_water,), positions)
+        recent = ages <= self.horizon
+        added = np.bincount(slots[recent], weights=self._weights(ages[recent], severities[recent]), minlength=len(names))
+        activated = np.bincount(slots[ages <= self.active_window], minlength=len(names))
+
+        changed, updates = [], []
+        for name, index in positions.items():
+            for port_id, old_score, old_active, pressure, updated_at, elapsed in conn.execute('''
+                SELECT id, risk_score, active_events, risk_pressure, risk_updated_at, (julianday(?) - julianday(risk_updated_at)) * 24.0
+                FROM ports WHERE name = ?
+            ''', (now, name)).fetchall():
+                expired = 0
+                if updated_at is not None:
+                    since = (datetime.fromisoformat(updated_at) - timedelta(hours=self.active_window)).isoformat()
+                    expired = conn.execute(
+                        'SELECT COUNT(*) FROM events WHERE port = ? AND timestamp >= ? AND timestamp < ? AND id <= ?',
+                        (name, since, window_start, high_water),
+                    ).fetchone()[0]
+                pressure = pressure * 2.0 ** (-max(elapsed or 0.0, 0.0) / self.half_life) + float(added[index])
+                new_score = float(score(pressure))
+                new_active = max((old_active or 0) - expired, 0) + int(activated[index])
+                updates.append((pressure, now, new_score, new_active, port_id))
+                if new_score != old_score or new_active != old_active:
+                    changed.append({"id": port_id, "port": name, "risk_score": new_score, "active_events": new_active})
+        conn.executemany(
+            'UPDATE ports SET risk_pressure = ?, risk_updated_at = ?, risk_score = ?, active_events = ? WHERE id = ?', updates
+        )
+        self._record("incremental", started, len(changed))
+        return changed
+
+    def recompute(self, conn: sqlite3.Connection, now: datetime = None) -> list[dict]:
+        """Rescore every port from its events in one transaction, returning the ports that changed"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            changed = self.rebuild(conn, now)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return changed
+
+    def rebuild(self, conn: sqlite3.Connection, now: datetime = None) -> list[dict]:
+        """Batch rescore within the caller's transaction.
+
+        Reads only events inside the decay horizon (an index range on
+        timestamp), sums per-port pressure and active counts with bincount,
+        and writes back the ports whose values or decay state changed.
+        """
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        horizon = (now - timedelta(hours=self.horizon)).isoformat()
+        now = now.isoformat()
+        port_rows = conn.execute(
+            'SELECT id, name, risk_score, active_events, risk_pressure, (julianday(?) - julianday(risk_updated_at)) * 24.0 FROM ports',
+            (now,),
+        ).fetchall()
+        if not port_rows:
+            self._record("batch", started, 0)
+            return []
+        names = [row[1] for row in port_rows]
+        # Position of each distinct name; duplicate names share one score
+        positions = {name: index for index, name in enumerate(dict.fromkeys(names))}
+
+        slots, ages, severities = _contributions(conn, now, 'timestamp >= ?', (horizon,), positions)
+        pressure = np.bincount(slots, weights=self._weights(ages, severities), minlength=len(positions))
+        active = np.bincount(slots[ages <= self.active_window], minlength=len(positions))
+        scores = score(pressure)
+
+        changed, updates = [], []
+        for port_id, name, old_score, old_active, stored, elapsed in port_rows:
+            index = positions[name]
+            new_score, new_active, new_pressure = float(scores[index]), int(active[index]), float(pressure[index])
+            # Stored pressure that has decayed to the recomputed value needs no write
+            decayed = stored * 2.0 ** (-max(elapsed, 0.0) / self.half_life) if elapsed is not None else None
+            if new_score != old_score or new_active != old_active:
+                changed.append({"id": port_id, "port": name, "risk_score": new_score, "active_events": new_active})
+            elif decayed is not None and abs(decayed - new_pressure) <= 1e-9 * max(new_pressure, 1.0):
+                continue
+            updates.append((new_pressure, now, new_score, new_active, port_id))
+        conn.executemany(
+            'UPDATE ports SET risk_pressure = ?, risk_updated_at = ?, risk_score = ?, active_events = ? WHERE id = ?', updates
+        )
+        self._record("batch", started, len(changed))
+        return changed
+
+    def _record(self, kind: str, started: float, changed: int):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            timing = self._timings[kind]
+            timing["runs"] += 1
+            timing["total_ms"] += elapsed
+            timing["last_ms"] = round(elapsed, 3)
+            timing["max_ms"] = max(timing["max_ms"], elapsed)
+            timing["ports_changed"] = changed
+
+    def stats(self) -> dict:
+        with self._lock:
+            timings = {
+                kind: {**timing, "total_ms": round(timing["total_ms"], 3), "max_ms": round(timing["max_ms"], 3),
+                       "avg_ms": round(timing["total_ms"] / timing["runs"], 3) if timing["runs"] else None}
+                for kind, timing in self._timings.items()
+            }
+        return {"half_life_hours": self.half_life, "active_window_hours": self.active_window, **timings}
+
+def backfill(conn: sqlite3.Connection):
+    """Score every port from its events with the default parameters"""
+    PortRiskEngine().rebuild(conn)
+
+risk_engine = PortRiskEngine()
@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+import time
+
+# Off unless TRADEGUARD_PROFILE=1 or switched on at runtime through /metrics/profile
+PROFILE_ON_START = os.getenv("TRADEGUARD_PROFILE", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("TRADEGUARD_PROFILE_INTERVAL_MS", "10")) / 1000
+# Distinct stacks kept; further new stacks are only counted as dropped
+MAX_STACKS = 20_000
+MAX_DEPTH = 64
+
+class SamplingProfiler:
+    """Statistical profiler sampling every thread's stack from a daemon thread.
+
+    Each sample walks sys._current_frames() and counts the stack as
+    "thread;module:function;..." (outermost first), the folded format
+    flame graph tools read, so the event loop thread and the DB executor
+    threads show up apart. Nothing runs while it is stopped; while running
+    the cost is one stack walk per thread per interval.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stacks: dict[str, int] = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.dropped = 0
+        self.started_at = None
+        self.sampling_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = None):
+        with self._lock:
+            if self._thread is not None:
+                return
+            if interval:
+                self.interval = interval
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="tradeguard-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = self.dropped = 0
+            self.sampling_seconds = 0.0
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                sampled.append(";".join(reversed(stack)))
+            with self._lock:
+                for key in sampled:
+                    if key in self._stacks:
+                        self._stacks[key] += 1
+                    elif len(self._stacks) < MAX_STACKS:
+                        self._stacks[key] = 1
+                    else:
+                        self.dropped += 1
+                self.samples += 1
+                self.sampling_seconds += time.perf_counter() - started
+
+    def folded(self) -> str:
+        """One "stack count" line per distinct stack, most frequent first"""
+        with self._lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_ms": self.interval * 1000,
+                "started_at": self.started_at,
+                "samples": self.samples,
+                "stacks": len(self._stacks),
+                "dropped": self.dropped,
+                "overhead_ms_avg": round(self.sampling_seconds / self.samples * 1000, 3) if self.samples else None,
+            }
+
+profiler = SamplingProfiler()
@@ -0,0 +1,146 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from metrics import db_query_duration, db_query_rows, registry
+
+# Repository queries slower than this many milliseconds are logged with
+# their statements and plans; 0 turns the log off
+SLOW_QUERY_MS = float(os.getenv("TRADEGUARD_SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("TRADEGUARD_SLOW_QUERY_LOG_SIZE", "100"))
+# Statements remembered per query, and statement shapes kept per log entry
+MAX_STATEMENTS = 64
+MAX_LOGGED_STATEMENTS = 10
+
+slow_queries_total = registry.counter("tradeguard_db_slow_queries_total", "Repository queries over the slow-query threshold", ("query",))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+def normalize(sql: str) -> str:
+    """Statement shape for grouping: literals as ?, IN lists collapsed, whitespace squeezed"""
+    sql = _IN_LISTS.sub("(?, ...)", _LITERALS.sub("?", sql))
+    return _SPACE.sub(" ", sql).strip()
+
+def operation(fn) -> str:
+    """Metric label for a repository query function: its method or module-qualified name"""
+    name = fn.__qualname__.split(".<locals>")[0]
+    return name if "." in name else f"{fn.__module__}.{name}"
+
+class TimedConnection:
+    """Connection proxy noting each statement a query runs and when it started.
+
+    Only execute/executemany are wrapped (one call per statement, not per
+    row); everything else goes to the connection.
+    """
+
+    __slots__ = ("_conn", "statements", "skipped")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self.statements: list[tuple] = []
+        self.skipped = 0
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def _note(self, sql: str, parameters):
+        if len(self.statements) < MAX_STATEMENTS:
+            self.statements.append((sql, parameters, time.perf_counter()))
+        else:
+            self.skipped += 1
+
+    def execute(self, sql: str, parameters=()):
+        self._note(sql, parameters)
+        return self._conn.execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters):
+        self._note(sql, None)
+        return self._conn.executemany(sql, parameters)
+
+class SlowQueryLog:
+    """Bounded log of slow repository queries.
+
+    Each entry groups the query's statements by normalized SQL with their
+    count and time (a statement runs until the next one starts, so fetching
+    its rows is included) and the EXPLAIN QUERY PLAN of each SELECT, taken
+    on the same connection while it is still checked out.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, size: int = SLOW_QUERY_LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self._entries: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.logged = 0
+
+    def is_slow(self, elapsed: float) -> bool:
+        return self.threshold_ms > 0 and elapsed * 1000 >= self.threshold_ms
+
+    def record(self, name: str, conn: TimedConnection, elapsed: float, finished: float, rows=None):
+        shapes: dict[str, dict] = {}
+        statements = conn.statements
+        for index, (sql, parameters, started) in enumerate(statements):
+            ended = statements[index + 1][2] if index + 1 < len(statements) else finished
+            shape = normalize(sql)
+            stats = shapes.get(shape)
+            if stats is None:
+                stats = shapes[shape] = {"sql": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                         "plan": self._plan(conn, sql, parameters)}
+            duration = (ended - started) * 1000
+            stats["count"] += 1
+            stats["total_ms"] += duration
+            stats["max_ms"] = max(stats["max_ms"], duration)
+        slowest = sorted(shapes.values(), key=lambda stats: stats["total_ms"], reverse=True)[:MAX_LOGGED_STATEMENTS]
+        for stats in slowest:
+            stats["total_ms"] = round(stats["total_ms"], 3)
+            stats["max_ms"] = round(stats["max_ms"], 3)
+        entry = {
+            "query": name,
+            "duration_ms": round(elapsed * 1000, 3),
+            "rows": rows,
+            "statements": len(statements) + conn.skipped,
+            "at": datetime.utcnow().isoformat() + "Z",
+            "slowest": slowest,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.logged += 1
+        slow_queries_total.inc(name)
+        top = f"; slowest {slowest[0]['total_ms']:.1f}ms: {slowest[0]['sql'][:200]}" if slowest else ""
+        print(f"[v0] Slow query {name}: {entry['duration_ms']:.1f}ms over {entry['statements']} statements{top}")
+
+    @staticmethod
+    def _plan(conn: TimedConnection, sql: str, parameters):
+        if parameters is None or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        try:
+            return [row[3] for row in conn._conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()]
+        except sqlite3.Error:
+            return None
+
+    def entries(self) -> list[dict]:
+        """Newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"threshold_ms": self.threshold_ms, "logged": self.logged, "kept": len(self._entries)}
+
+slow_query_log = SlowQueryLog()
+
+def observe(name: str, conn: TimedConnection, started: float, result):
+    """Record a finished repository query; slow ones are logged while `conn` is still checked out"""
+    finished = time.perf_counter()
+    elapsed = finished - started
+    db_query_duration.observe(elapsed, name)
+    rows = len(result) if isinstance(result, list) else None
+    if rows is not None:
+        db_query_rows.observe(rows, name)
+    if slow_query_log.is_slow(elapsed):
+        slow_query_log.record(name, conn, elapsed, finished, rows)
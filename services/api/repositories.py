@@ -0,0 +1,312 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from database import pool, POOL_SIZE
+import rollups
+import forecasting
+import fulltext
+import facets
+import sentiment
+import geo
+import query_log
+import changes
+from metrics import db_query_errors
+from serialization import decode_tags
+
+# One worker per pooled connection so executor threads never queue on the pool
+DB_WORKERS = int(os.getenv("TRADEGUARD_DB_WORKERS", str(POOL_SIZE)))
+QUERY_TIMEOUT = float(os.getenv("TRADEGUARD_QUERY_TIMEOUT", "10.0"))
+
+_executor: ThreadPoolExecutor = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="tradeguard-db")
+    return _executor
+
+class QueryTimeout(Exception):
+    """Raised when a repository query exceeds its timeout"""
+
+class _QueryState:
+    """The connection a query holds, for interrupting it from the event loop.
+
+    The lock makes handing the connection back to the pool and interrupting
+    it mutually exclusive, so an interrupt can only reach the connection
+    while this query still holds it, never another request that has since
+    checked it out.
+    """
+    __slots__ = ("conn", "cancelled", "lock")
+
+    def __init__(self):
+        self.conn = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def interrupt(self):
+        with self.lock:
+            self.cancelled = True
+            if self.conn is not None:
+                self.conn.interrupt()
+
+def _execute(state: _QueryState, fn, args):
+    if state.cancelled:
+        raise asyncio.CancelledError()
+    conn = pool.acquire()
+    try:
+        with state.lock:
+            if state.cancelled:
+                raise asyncio.CancelledError()
+            state.conn = conn
+        name = query_log.operation(fn)
+        timed = query_log.TimedConnection(conn)
+        started = time.perf_counter()
+        try:
+            result = fn(timed, *args)
+        except Exception:
+            db_query_errors.inc(name)
+            raise
+        query_log.observe(name, timed, started, result)
+        return result
+    finally:
+        with state.lock:
+            state.conn = None
+        pool.release(conn)
+
+async def run_query(fn, *args, timeout: float = QUERY_TIMEOUT):
+    """Run fn(conn, *args) on the DB executor with a pooled connection.
+
+    On timeout or cancellation the running statement is interrupted so the
+    worker thread and its connection are freed promptly.
+    """
+    loop = asyncio.get_running_loop()
+    state = _QueryState()
+    future = loop.run_in_executor(_get_executor(), _execute, state, fn, args)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        state.interrupt()
+        raise QueryTimeout(f"Query exceeded {timeout}s") from None
+    except asyncio.CancelledError:
+        state.interrupt()
+        raise
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _rows(cursor: sqlite3.Cursor) -> list[dict]:
+    return [dict(row) for row in cursor.fetchall()]
+
+def _result(cursor: sqlite3.Cursor, raw: bool) -> list:
+    # Raw sqlite3.Row objects go straight to a serialization encoder
+    return cursor.fetchall() if raw else _rows(cursor)
+
+def _row(cursor: sqlite3.Cursor):
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+def _event(row) -> dict:
+    event = dict(row)
+    event["tags"] = decode_tags(event.get("tags"))
+    return event
+
+class Repository:
+    """Base class for async repositories backed by the pooled executor"""
+
+    def __init__(self, timeout: float = QUERY_TIMEOUT):
+        self.timeout = timeout
+
+    async def _run(self, fn, *args, timeout: float = None):
+        return await run_query(fn, *args, timeout=timeout or self.timeout)
+
+def _keyset(column: str, cursor, filters: list[str], params: list, id_column: str = "id") -> str:
+    """WHERE clause for rows strictly after `cursor` in (column, id) DESC order"""
+    clauses = list(filters)
+    if cursor is not None:
+        # Row-value comparison is a range seek on the (column, rowid) index
+        clauses.append(f"({column}, {id_column}) < (?, ?)")
+        params.extend(cursor)
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+class EventRepository(Repository):
+    async def page(self, limit: int, cursor: tuple = None, port: str = None, raw: bool = False,
+                   filters: facets.EventFilter = facets.EventFilter()) -> list:
+        """Newest events matching `filters` first, starting after an optional (timestamp, id) cursor"""
+        if port is not None:
+            filters = filters._replace(port=port)
+
+        def query(conn, limit, cursor, filters):
+            params = []
+            source, conditions = filters.source(params)
+            # A tag posting list is already in (timestamp, event_id) order
+            timestamp, row_id = ("t.timestamp", "t.event_id") if filters.tags else ("timestamp", "id")
+            where = _keyset(timestamp, cursor, conditions, params, id_column=row_id)
+            sql = f'SELECT events.* FROM {source} {where} ORDER BY {timestamp} DESC, {row_id} DESC LIMIT ?'
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+            return rows if raw else [_event(row) for row in rows]
+        return await self._run(query, limit, cursor, filters)
+
+    async def facets(self, filters: facets.EventFilter = facets.EventFilter(), size: int = 20) -> dict:
+        return await self._run(facets.facets, filters, size)
+
+    async def get(self, event_id: int):
+        def query(conn, event_id):
+            row = conn.execute('SELECT * FROM events WHERE id = ?', (event_id,)).fetchone()
+            return _event(row) if row else None
+        return await self._run(query, event_id)
+
+    async def random(self):
+        def query(conn):
+            # Random rowid probe instead of sorting the whole table by RANDOM()
+            return _row(conn.execute('''
+                SELECT * FROM events
+                WHERE id >= (SELECT abs(random()) % (SELECT MAX(id) FROM events) + 1)
+                ORDER BY id LIMIT 1
+            '''))
+        return await self._run(query)
+
+class AnalyticsRepository(Repository):
+    async def trends(self, since: str, bucket: str = "day") -> list[dict]:
+        return await self._run(rollups.trends, since, bucket)
+
+class ForecastRepository(Repository):
+    async def get(self, sku_id: int, start: str, horizon: int = forecasting.HORIZON) -> list[dict]:
+        """Stored forecast from `start`, computing and storing it first if incomplete"""
+        def query(conn, sku_id, start, horizon):
+            sql = '''
+                SELECT forecast_date AS date, risk, upper_bound, lower_bound FROM forecasts_history
+                WHERE sku_id = ? AND forecast_date >= ? ORDER BY forecast_date LIMIT ?
+            '''
+            rows = _rows(conn.execute(sql, (sku_id, start, horizon)))
+            if len(rows) < horizon:
+                forecasting.refresh(conn, [sku_id])
+                rows = _rows(conn.execute(sql, (sku_id, start, horizon)))
+            return rows
+        return await self._run(query, sku_id, start, horizon)
+
+    async def job(self, job_id: int):
+        return await self._run(forecasting.job, job_id)
+
+    async def jobs(self, limit: int) -> list[dict]:
+        return await self._run(forecasting.jobs, limit)
+
+class PortRepository(Repository):
+    async def all(self, raw: bool = False) -> list:
+        def query(conn):
+            return _result(conn.execute('SELECT id, name, country, latitude, longitude, risk_score, active_events FROM ports'), raw)
+        return await self._run(query)
+
+    async def get(self, port_id: int):
+        def query(conn, port_id):
+            return _row(conn.execute('SELECT id, name, country, latitude, longitude, risk_score, active_events FROM ports WHERE id = ?', (port_id,)))
+        return await self._run(query, port_id)
+
+    async def viewport(self, bbox: tuple, zoom: Optional[int] = None) -> dict:
+        """Ports and clusters inside a (min_lon, min_lat, max_lon, max_lat) box"""
+        return await self._run(geo.viewport, *bbox, zoom)
+
+    async def near(self, latitude: float, longitude: float, radius_km: float, limit: int = 50) -> list[dict]:
+        return await self._run(geo.near, latitude, longitude, radius_km, limit)
+
+    async def analytics(self) -> list[dict]:
+        def query(conn):
+            return _rows(conn.execute('SELECT name, country, risk_score, active_events FROM ports ORDER BY risk_score DESC'))
+        return await self._run(query)
+
+class SkuRepository(Repository):
+    async def all(self, raw: bool = False) -> list:
+        def query(conn):
+            return _result(conn.execute('SELECT * FROM skus ORDER BY risk_level DESC'), raw)
+        return await self._run(query)
+
+    async def get(self, sku_id: int):
+        def query(conn, sku_id):
+            return _row(conn.execute('SELECT * FROM skus WHERE id = ?', (sku_id,)))
+        return await self._run(query, sku_id)
+
+    async def by_ids(self, sku_ids: list[int], raw: bool = False) -> list:
+        """SKUs by primary key, highest risk first"""
+        def query(conn, sku_ids):
+            rows = []
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(sku_ids), 500):
+                chunk = sku_ids[start:start + 500]
+                rows += _result(conn.execute(f'SELECT * FROM skus WHERE id IN ({", ".join("?" * len(chunk))})', chunk), raw)
+            rows.sort(key=lambda row: row["risk_level"], reverse=True)
+            return rows
+        return await self._run(query, sku_ids)
+
+class ArticleRepository(Repository):
+    async def page(self, limit: int, cursor: tuple = None, raw: bool = False) -> list:
+        """Newest articles first, starting after an optional (published_at, id) cursor"""
+        def query(conn, limit, cursor):
+            params = []
+            where = _keyset("published_at", cursor, [], params)
+            sql = f'SELECT id, title, source, url, summary, sentiment, published_at FROM articles {where} ORDER BY published_at DESC, id DESC LIMIT ?'
+            return _result(conn.execute(sql, (*params, limit)), raw)
+        return await self._run(query, limit, cursor)
+
+    async def sentiment(self, window: str = None, half_life: float = None) -> dict:
+        return await self._run(sentiment.aggregate, window, half_life)
+
+class SearchRepository(Repository):
+    async def search(self, match: str, scopes=fulltext.SCOPES, port: str = None, commodity: str = None,
+                     since: str = None, until: str = None, limit: int = 20, offset: int = 0) -> list[dict]:
+        return await self._run(fulltext.search, match, scopes, port, commodity, since, until, limit, offset)
+
+# Columns UserRepository.update may set
+USER_COLUMNS = {"username", "email", "hashed_password", "is_admin"}
+
+class UserRepository(Repository):
+    async def by_username(self, username: str):
+        def query(conn, username):
+            return _row(conn.execute("SELECT id, username, email, hashed_password, is_admin FROM users WHERE username = ?", (username,)))
+        return await self._run(query, username)
+
+    async def get(self, user_id: int):
+        def query(conn, user_id):
+            return _row(conn.execute("SELECT id, username, email, is_admin FROM users WHERE id = ?", (user_id,)))
+        return await self._run(query, user_id)
+
+    async def update(self, user_id: int, fields: dict) -> bool:
+        """Set the given user columns; False if there is no such user"""
+        unknown = set(fields) - USER_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+
+        def query(conn, user_id, fields):
+            assignments = ", ".join(f"{column} = ?" for column in fields)
+            updated = conn.execute(f"UPDATE users SET {assignments} WHERE id = ?", (*fields.values(), user_id)).rowcount
+            conn.commit()
+            return updated > 0
+        return await self._run(query, user_id, fields)
+
+class ChangeRepository(Repository):
+    async def since(self, since: int, limit: int) -> tuple:
+        """Up to `limit` event changes after `since` and the latest sequence number.
+
+        Served from the in-memory ring when it holds every change after
+        `since`, otherwise from change_log; (None, latest) means `since` is
+        outside the retention window.
+        """
+        recent = changes.change_feed.recent(since, limit)
+        if recent is not None:
+            return recent, changes.change_feed.latest
+        return await self._run(changes.read, since, limit)
+
+event_repo = EventRepository()
+analytics_repo = AnalyticsRepository()
+forecast_repo = ForecastRepository()
+port_repo = PortRepository()
+sku_repo = SkuRepository()
+article_repo = ArticleRepository()
+search_repo = SearchRepository()
+user_repo = UserRepository()
+change_repo = ChangeRepository()
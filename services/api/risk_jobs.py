@@ -0,0 +1,63 @@
+import asyncio
+import os
+from datetime import datetime
+from broker import broker
+from cache import change_versions
+from port_risk import risk_engine
+from repositories import run_query
+
+# Seconds between batch recomputes that apply decay; 0 disables them
+RISK_INTERVAL = float(os.getenv("TRADEGUARD_RISK_INTERVAL", "60"))
+
+def port_risk_message(port: dict, timestamp: str) -> dict:
+    return {"type": "port_risk", **port, "timestamp": timestamp}
+
+def _relayed_port_risk(message: dict):
+    change_versions.bump("ports", [message["id"]])
+
+# Another worker's scores are committed before they are relayed
+broker.listen("port_risk", _relayed_port_risk)
+
+def publish_port_risk(changed: list[dict]):
+    """Invalidate cached reads of the changed ports and push them to subscribers; call after commit"""
+    if not changed:
+        return
+    change_versions.bump("ports", [port["id"] for port in changed])
+    timestamp = datetime.utcnow().isoformat()
+    for port in changed:
+        broker.publish(port_risk_message(port, timestamp))
+
+class PortRiskScheduler:
+    """Runs the port risk batch recompute every `interval` seconds so scores decay between writes"""
+
+    def __init__(self, interval: float = RISK_INTERVAL):
+        self.interval = interval
+        self._task: asyncio.Task = None
+
+    async def run(self) -> list[dict]:
+        changed = await run_query(risk_engine.recompute)
+        publish_port_risk(changed)
+        return changed
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._schedule())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except Exception as e:
+                print(f"[v0] Port risk recompute error: {e}")
+
+risk_scheduler = PortRiskScheduler()
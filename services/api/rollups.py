@@ -0,0 +1,150 @@
+import sqlite3
+from datetime import date as Date, timedelta
+
+BUCKETS = ("day", "week", "month")
+BREAKDOWN_DIMENSIONS = ("port", "commodity")
+
+ROLLUP_TABLES = [
+    '''
+        CREATE TABLE IF NOT EXISTS event_daily_rollup (
+            date TEXT PRIMARY KEY,
+            event_count INTEGER NOT NULL,
+            severity_sum REAL NOT NULL,
+            severity_max REAL NOT NULL
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS event_daily_rollup_breakdown (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            date TEXT NOT NULL,
+            event_count INTEGER NOT NULL,
+            severity_sum REAL NOT NULL,
+            severity_max REAL NOT NULL,
+            PRIMARY KEY (dimension, key, date)
+        ) WITHOUT ROWID
+    ''',
+]
+
+def _day(row: str) -> str:
+    return f"substr({row}.timestamp, 1, 10)"
+
+def _day_range(row: str) -> str:
+    # Every timestamp on that day sorts between 'YYYY-MM-DD' and 'YYYY-MM-DDU'
+    return f"timestamp >= {_day(row)} AND timestamp < {_day(row)} || 'U'"
+
+def _add(row: str) -> str:
+    statements = [f'''
+        INSERT INTO event_daily_rollup (date, event_count, severity_sum, severity_max)
+        VALUES ({_day(row)}, 1, {row}.severity, {row}.severity)
+        ON CONFLICT(date) DO UPDATE SET
+            event_count = event_count + 1,
+            severity_sum = severity_sum + excluded.severity_sum,
+            severity_max = max(severity_max, excluded.severity_max);''']
+    for dimension in BREAKDOWN_DIMENSIONS:
+        statements.append(f'''
+        INSERT INTO event_daily_rollup_breakdown (dimension, key, date, event_count, severity_sum, severity_max)
+        VALUES ('{dimension}', {row}.{dimension}, {_day(row)}, 1, {row}.severity, {row}.severity)
+        ON CONFLICT(dimension, key, date) DO UPDATE SET
+            event_count = event_count + 1,
+            severity_sum = severity_sum + excluded.severity_sum,
+            severity_max = max(severity_max, excluded.severity_max);''')
+    return "".join(statements)
+
+def _remove(row: str) -> str:
+    # The max cannot be decremented, so it is re-read from the day's remaining events
+    statements = [f'''
+        UPDATE event_daily_rollup SET
+            event_count = event_count - 1,
+            severity_sum = severity_sum - {row}.severity,
+            severity_max = coalesce((SELECT MAX(severity) FROM events WHERE {_day_range(row)}), 0)
+        WHERE date = {_day(row)};
+        DELETE FROM event_daily_rollup WHERE date = {_day(row)} AND event_count <= 0;''']
+    for dimension in BREAKDOWN_DIMENSIONS:
+        statements.append(f'''
+        UPDATE event_daily_rollup_breakdown SET
+            event_count = event_count - 1,
+            severity_sum = severity_sum - {row}.severity,
+            severity_max = coalesce((SELECT MAX(severity) FROM events WHERE {dimension} = {row}.{dimension} AND {_day_range(row)}), 0)
+        WHERE dimension = '{dimension}' AND key = {row}.{dimension} AND date = {_day(row)};
+        DELETE FROM event_daily_rollup_breakdown
+        WHERE dimension = '{dimension}' AND key = {row}.{dimension} AND date = {_day(row)} AND event_count <= 0;''')
+    return "".join(statements)
+
+ROLLUP_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS events_rollup_insert AFTER INSERT ON events BEGIN{_add('NEW')}\n    END",
+    f"CREATE TRIGGER IF NOT EXISTS events_rollup_delete AFTER DELETE ON events BEGIN{_remove('OLD')}\n    END",
+    f"CREATE TRIGGER IF NOT EXISTS events_rollup_update AFTER UPDATE OF timestamp, severity, port, commodity ON events BEGIN{_remove('OLD')}{_add('NEW')}\n    END",
+]
+
+def backfill(conn: sqlite3.Connection, since: str = None):
+    """Recompute rollup rows from the events table, for all days or days >= since"""
+    since = since[:10] if since else ""
+    conn.execute('DELETE FROM event_daily_rollup WHERE date >= ?', (since,))
+    conn.execute('DELETE FROM event_daily_rollup_breakdown WHERE date >= ?', (since,))
+    conn.execute('''
+        INSERT INTO event_daily_rollup (date, event_count, severity_sum, severity_max)
+        SELECT substr(timestamp, 1, 10), COUNT(*), SUM(severity), MAX(severity)
+        FROM events WHERE timestamp >= ? GROUP BY 1
+    ''', (since,))
+    for dimension in BREAKDOWN_DIMENSIONS:
+        conn.execute(f'''
+            INSERT INTO event_daily_rollup_breakdown (dimension, key, date, event_count, severity_sum, severity_max)
+            SELECT '{dimension}', {dimension}, substr(timestamp, 1, 10), COUNT(*), SUM(severity), MAX(severity)
+            FROM events WHERE timestamp >= ? GROUP BY 2, 3
+        ''', (since,))
+
+def _bucket_key(day: str, bucket: str) -> str:
+    if bucket == "week":
+        start = Date.fromisoformat(day)
+        return (start - timedelta(days=start.weekday())).isoformat()
+    if bucket == "month":
+        return day[:7] + "-01"
+    return day
+
+def trends(conn: sqlite3.Connection, since: str, bucket: str = "day") -> list[dict]:
+    """Average, count and max severity per bucket for events after `since`.
+
+    Whole days come from the rollup table; only the partial first day is read
+    from events, so the cost is O(days) rather than O(events).
+    """
+    since_day = since[:10]
+    totals = {}
+
+    def accumulate(key, count, severity_sum, severity_max):
+        if not count:
+            return
+        entry = totals.get(key)
+        if entry is None:
+            totals[key] = [count, severity_sum, severity_max]
+        else:
+            entry[0] += count
+            entry[1] += severity_sum
+            entry[2] = max(entry[2], severity_max)
+
+    count, severity_sum, severity_max = conn.execute(
+        'SELECT COUNT(*), SUM(severity), MAX(severity) FROM events WHERE timestamp > ? AND timestamp < ?',
+        (since, since_day + "U"),
+    ).fetchone()
+    accumulate(_bucket_key(since_day, bucket), count, severity_sum, severity_max)
+
+    cursor = conn.execute(
+        'SELECT date, event_count, severity_sum, severity_max FROM event_daily_rollup WHERE date > ? ORDER BY date',
+        (since_day,),
+    )
+    for day, count, severity_sum, severity_max in cursor:
+        accumulate(_bucket_key(day, bucket), count, severity_sum, severity_max)
+
+    return [
+        {"date": key, "avg_risk": round(severity_sum / count, 2), "event_count": count, "max_risk": severity_max}
+        for key, (count, severity_sum, severity_max) in sorted(totals.items())
+    ]
+
+if __name__ == "__main__":
+    import sys
+    from database import get_db
+
+    with get_db() as conn:
+        backfill(conn, sys.argv[1] if len(sys.argv) > 1 else None)
+        conn.commit()
+    print("Rollups backfilled")
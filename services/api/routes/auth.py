@@ -1,20 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import timedelta
-from database import get_db
+from repositories import user_repo
 from auth import (
-    verify_password,
-    get_password_hash,
+    verify_password_async,
     create_access_token,
-    verify_token,
+    current_user,
     Token,
     User,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
 from pydantic import BaseModel
+from admission import admission
 
 router = APIRouter()
-security = HTTPBearer()
+
+admission.route("/api/auth/login", "auth")
 
 class LoginRequest(BaseModel):
     username: str
@@ -23,13 +23,10 @@ class LoginRequest(BaseModel):
 @router.post("/api/auth/login", response_model=Token)
 async def login(request: LoginRequest):
     """Authenticate user and return JWT token"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, email, hashed_password, is_admin FROM users WHERE username = ?", (request.username,))
-    user = cursor.fetchone()
-    conn.close()
+    user = await user_repo.by_username(request.username)
     
-    if not user or not verify_password(request.password, user[3]):
+    # bcrypt runs on the bounded hashing pool, off the event loop
+    if not user or not await verify_password_async(request.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -38,34 +35,15 @@ async def login(request: LoginRequest):
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user[0]}, expires_delta=access_token_expires
+        data={"sub": user["id"]}, expires_delta=access_token_expires
     )
     
-    return {"access_token": access_token, "token_type": "bearer", "user_id": user[0]}
+    return {"access_token": access_token, "token_type": "bearer", "user_id": user["id"]}
 
 @router.get("/api/auth/me", response_model=User)
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(user: User = Depends(current_user)):
     """Get current authenticated user"""
-    token = credentials.credentials
-    token_data = verify_token(token)
-    
-    if token_data is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, email, is_admin FROM users WHERE id = ?", (token_data.user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    return User(id=user[0], username=user[1], email=user[2], is_admin=bool(user[3]))
+    return user
 
 @router.post("/api/auth/logout")
 async def logout():
@@ -1,28 +1,160 @@
-from fastapi import APIRouter
-from database import get_db
-from models import Event
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from functools import partial
+from pydantic import ValidationError
+from typing import List, Optional
+import json
+from repositories import event_repo, change_repo
+from cache import response_cache
+from admission import admission
+from facets import EventFilter
+from pagination import ListFormat, MAX_PAGE_SIZE, cursor_headers, decode_cursor, ndjson_response
+from serialization import event_encoder
+from models import Event, EventCreate, EventFacets, EventChanges, BulkIngestResult
+from ingest import ingest_batch, BATCH_SIZE, MAX_BATCH_SIZE
 
 router = APIRouter()
 
+MAX_REPORTED_ERRORS = 100
+MAX_FACET_SIZE = 100
+MAX_CHANGES = 5000
+
+response_cache.route("/api/events/facets", "events")
+admission.route("/api/events/facets", "analytics")
+
+def event_filter(
+    tag: Optional[List[str]] = Query(None),
+    port: Optional[str] = None,
+    commodity: Optional[str] = None,
+    region: Optional[str] = None,
+    min_severity: Optional[float] = Query(None, ge=0.0, le=1.0),
+    max_severity: Optional[float] = Query(None, ge=0.0, le=1.0),
+) -> EventFilter:
+    """Filters shared by the event listing and its facets; repeated `tag` values must all match"""
+    return EventFilter(tuple(dict.fromkeys(tag or ())), port, commodity, region, min_severity, max_severity)
+
 @router.get("/api/events", response_model=list[Event])
-async def get_events(limit: int = 10):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM events ORDER BY timestamp DESC LIMIT ?', (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    events = [dict(row) for row in rows]
-    return events
+async def get_events(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    format: ListFormat = "json",
+    filters: EventFilter = Depends(event_filter),
+):
+    """Newest events first, paged by an opaque cursor.
+
+    JSON pages default to 10 rows (at most MAX_PAGE_SIZE) and return the next
+    page's cursor in the X-Next-Cursor header. `format=ndjson` streams every
+    row after the cursor, or `limit` rows, without building the list.
+    Rows are encoded straight from the cursor; response_model documents
+    the shape.
+    """
+    position = decode_cursor(cursor)
+    if format == "ndjson":
+        return ndjson_response(partial(event_repo.page, raw=True, filters=filters), position, limit, encoder=event_encoder)
+    limit = min(limit or 10, MAX_PAGE_SIZE)
+    rows = await event_repo.page(limit, position, raw=True, filters=filters)
+    return event_encoder.response(rows, headers=cursor_headers(rows, limit))
+
+@router.get("/api/events/facets", response_model=EventFacets)
+async def get_event_facets(
+    size: int = Query(20, ge=1, le=MAX_FACET_SIZE),
+    filters: EventFilter = Depends(event_filter),
+):
+    """Event counts per tag, commodity, region and port for the same filters as /api/events.
+
+    Each dimension lists its `size` largest values; unfiltered counts come
+    from counters maintained on write.
+    """
+    return await event_repo.facets(filters, size)
+
+@router.get("/api/events/changes", response_model=EventChanges)
+async def get_event_changes(
+    since: int = Query(..., ge=0),
+    limit: int = Query(1000, ge=1, le=MAX_CHANGES),
+):
+    """Event changes after sequence number `since`, oldest first.
+
+    Pass the returned `seq` as the next `since`; `more` means changes are
+    still pending. `reset` means `since` has left the retention window:
+    refetch /api/events, then resume from the returned `seq`.
+    """
+    changes, latest = await change_repo.since(since, limit)
+    if changes is None:
+        return {"seq": latest, "reset": True, "more": False, "changes": []}
+    seq = changes[-1]["seq"] if changes else since
+    return {"seq": seq, "reset": False, "more": seq < latest, "changes": changes}
+
+@router.post("/api/events/bulk", response_model=BulkIngestResult)
+async def bulk_ingest_events(request: Request, batch_size: int = Query(BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE)):
+    """Ingest events from a streamed NDJSON body or a JSON array.
+
+    Valid events are inserted in transactions of `batch_size`; rows matching
+    an existing (port, timestamp, title) are skipped as duplicates and
+    invalid items are reported without failing the rest.
+    """
+    result = {"received": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "errors": []}
+    batch: list[EventCreate] = []
+
+    async def flush():
+        inserted = await ingest_batch(batch)
+        result["inserted"] += len(inserted)
+        result["duplicates"] += len(batch) - len(inserted)
+        batch.clear()
+
+    def reject(position: int, error: str):
+        result["rejected"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"index": position, "error": error})
+
+    async def accept(position: int, item):
+        result["received"] += 1
+        try:
+            batch.append(EventCreate.model_validate(item))
+        except ValidationError as e:
+            reject(position, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            return
+        if len(batch) >= batch_size:
+            await flush()
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            items = json.loads(await request.body() or b"[]")
+        except ValueError as e:
+            # JSONDecodeError and UnicodeDecodeError; nothing can be salvaged from a broken array
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(items, list):
+            items = [items]
+        for position, item in enumerate(items):
+            await accept(position, item)
+    else:
+        # NDJSON: validate and insert line by line without buffering the whole body
+        position = 0
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    await _accept_line(accept, reject, position, line)
+                    position += 1
+        if pending.strip():
+            await _accept_line(accept, reject, position, pending)
+
+    if batch:
+        await flush()
+    return result
+
+async def _accept_line(accept, reject, position: int, line: bytes):
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        reject(position, f"Invalid JSON: {e}")
+        return
+    await accept(position, item)
 
 @router.get("/api/events/{event_id}", response_model=Event)
 async def get_event(event_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM events WHERE id = ?', (event_id,))
-    row = cursor.fetchone()
-    conn.close()
+    event = await event_repo.get(event_id)
     
-    if row:
-        return dict(row)
+    if event:
+        return event
     return {"error": "Event not found"}
@@ -1,39 +1,49 @@
-from fastapi import APIRouter
-from datetime import datetime, timedelta
-import random
-from database import get_db
-from models import Forecast, ForecastPoint
+from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from repositories import sku_repo, forecast_repo
+from forecast_jobs import JOB_HISTORY, forecast_scheduler
+from models import Forecast, ForecastBatchRequest, ForecastJob
+from admission import admission
 
 router = APIRouter()
 
+admission.route("/api/forecast/batch", "read", method="GET")
+admission.route("/api/forecast/{sku_id}", "analytics")
+
+# Batch routes are declared before /api/forecast/{sku_id} so "batch" is not parsed as an id
+
+@router.post("/api/forecast/batch", response_model=ForecastJob, status_code=202)
+async def submit_forecast_batch(request: ForecastBatchRequest = None):
+    """Recompute forecasts in the background for the given SKUs, or for SKUs with new port events.
+
+    The job is queued in the database and run by the worker that runs the
+    scheduled jobs, so its progress reads the same from every worker.
+    """
+    return await forecast_scheduler.submit(request.sku_ids if request else None)
+
+@router.get("/api/forecast/batch", response_model=list[ForecastJob])
+async def list_forecast_batches():
+    """Recent batch jobs, newest first"""
+    return await forecast_repo.jobs(JOB_HISTORY)
+
+@router.get("/api/forecast/batch/{job_id}", response_model=ForecastJob)
+async def get_forecast_batch(job_id: int):
+    """Progress of a batch job"""
+    job = await forecast_repo.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/api/forecast/{sku_id}", response_model=Forecast)
 async def get_forecast(sku_id: int):
-    """Generate mock forecast data for a SKU"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM skus WHERE id = ?', (sku_id,))
-    row = cursor.fetchone()
-    conn.close()
+    """30-day risk forecast for a SKU with 95% prediction bounds"""
+    sku = await sku_repo.get(sku_id)
     
-    if not row:
+    if not sku:
         return {"error": "SKU not found"}
     
-    # Generate 30-day forecast with trend
-    forecast_data = []
-    base_date = datetime.utcnow()
-    base_risk = random.uniform(0.3, 0.8)
-    trend = random.uniform(-0.01, 0.02)
-    
-    for i in range(30):
-        date = base_date + timedelta(days=i)
-        risk = max(0.1, min(0.95, base_risk + (trend * i) + random.uniform(-0.05, 0.05)))
-        
-        forecast_data.append(ForecastPoint(
-            date=date.strftime("%Y-%m-%d"),
-            risk=round(risk, 3)
-        ))
+    forecast_data = await forecast_repo.get(sku_id, datetime.utcnow().strftime("%Y-%m-%d"))
     
-    sku = dict(row)
     return Forecast(
         sku_id=sku_id,
         sku_name=sku["name"],
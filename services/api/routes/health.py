@@ -1,8 +1,21 @@
 from fastapi import APIRouter
 from datetime import datetime
+from database import pool
+from broker import broker
+from changes import change_feed
+from port_risk import risk_engine
+from leader import job_leader
+from query_log import slow_query_log
+from cache import response_cache
+from auth import password_hasher, token_cache, user_cache
+from admission import admission
 
 router = APIRouter()
 
+# Health checks stay answerable when everything else is being shed
+admission.route("/api/health", None)
+admission.route("/api/health/{check}", None)
+
 @router.get("/api/health")
 async def health_check():
     return {
@@ -10,3 +23,38 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "service": "TradeGuardAI API"
     }
+
+@router.get("/api/health/db")
+async def database_health():
+    """Connection pool statistics for sizing"""
+    return pool.stats()
+
+@router.get("/api/health/stream")
+async def stream_health():
+    """WebSocket broker subscriber and queue statistics"""
+    return {**broker.stats(), "changes": change_feed.stats()}
+
+@router.get("/api/health/cache")
+async def cache_health():
+    """Response cache hit/miss counters"""
+    return response_cache.stats()
+
+@router.get("/api/health/auth")
+async def auth_health():
+    """Password hashing queue and auth cache statistics"""
+    return {"hasher": password_hasher.stats(), "tokens": token_cache.stats(), "users": user_cache.stats()}
+
+@router.get("/api/health/admission")
+async def admission_health():
+    """Admission control: in-flight and queued requests and shed counts per cost class"""
+    return admission.stats()
+
+@router.get("/api/health/risk")
+async def risk_health():
+    """Port risk recompute timings, incremental and batch, and whether this worker runs the scheduled jobs"""
+    return {**risk_engine.stats(), "scheduler": job_leader.stats()}
+
+@router.get("/api/health/slow-queries")
+async def slow_query_health():
+    """Recent repository queries over the slow-query threshold, newest first, with their statements and plans"""
+    return {**slow_query_log.stats(), "queries": slow_query_log.entries()}
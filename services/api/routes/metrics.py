@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from database import pool
+from broker import broker
+from cache import response_cache
+from auth import User, current_user
+from metrics import registry
+from profiler import profiler
+from admission import admission
+
+router = APIRouter()
+
+admission.route("/metrics", None)
+admission.route("/metrics/profile", None)
+
+# Read from the components' stats() at scrape time
+registry.gauge("tradeguard_db_pool_connections", "Pooled connections by state",
+               lambda: {(state,): pool.stats()[state] for state in ("open", "in_use", "idle")}, ("state",))
+registry.gauge("tradeguard_db_pool_waits_total", "Checkouts that had to wait for a connection", lambda: pool.stats()["waits"], kind="counter")
+registry.gauge("tradeguard_db_pool_timeouts_total", "Checkouts that timed out", lambda: pool.stats()["timeouts"], kind="counter")
+registry.gauge("tradeguard_ws_subscribers", "Connected WebSocket subscribers", lambda: broker.stats()["subscribers"])
+registry.gauge("tradeguard_ws_queued_messages", "Messages queued across subscribers", lambda: broker.stats()["queued"])
+registry.gauge("tradeguard_ws_max_queue_depth", "Deepest subscriber queue", lambda: broker.stats()["max_queue_depth"])
+registry.gauge("tradeguard_ws_published_total", "Messages published to the broker", lambda: broker.stats()["published"], kind="counter")
+registry.gauge("tradeguard_ws_relayed_total", "Messages relayed from other workers", lambda: broker.stats()["relayed"], kind="counter")
+registry.gauge("tradeguard_ws_unrelayed_total", "Published messages the broadcast backend could not relay",
+               lambda: broker.stats()["broadcast"].get("unrelayed", 0), kind="counter")
+registry.gauge("tradeguard_ws_slow_disconnects_total", "Subscribers disconnected for falling behind",
+               lambda: broker.stats()["slow_disconnects"], kind="counter")
+registry.gauge("tradeguard_cache_lookups_total", "Response cache lookups by result",
+               lambda: {(result,): response_cache.stats()[result] for result in ("hits", "misses", "not_modified", "stale")},
+               ("result",), kind="counter")
+registry.gauge("tradeguard_admission_in_flight", "Admitted requests running, by cost class",
+               lambda: {(name,): cost.in_flight for name, cost in admission.classes.items()}, ("class",))
+registry.gauge("tradeguard_admission_queued", "Requests waiting for admission, by cost class",
+               lambda: {(name,): cost.queued for name, cost in admission.classes.items()}, ("class",))
+registry.gauge("tradeguard_admission_admitted_total", "Requests admitted, by cost class",
+               lambda: {(name,): cost.admitted for name, cost in admission.classes.items()}, ("class",), kind="counter")
+registry.gauge("tradeguard_admission_shed_total", "Requests shed before running, by cost class and reason",
+               lambda: {(name, reason): count for name, cost in admission.classes.items() for reason, count in cost.shed.items()},
+               ("class", "reason"), kind="counter")
+registry.gauge("tradeguard_cache_entries", "Responses held in the cache", lambda: response_cache.stats()["entries"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, query, pool, loop and stream metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/profile", response_class=PlainTextResponse)
+async def get_profile(user: User = Depends(current_user)):
+    """Sampled stacks in folded format ("frame;frame;... count" per line), for flame graphs"""
+    return PlainTextResponse(profiler.folded())
+
+@router.post("/metrics/profile")
+async def toggle_profile(
+    enabled: bool,
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    reset: bool = False,
+    user: User = Depends(current_user),
+):
+    """Start or stop the sampling profiler; `reset` discards the stacks gathered so far"""
+    if reset:
+        profiler.reset()
+    if enabled:
+        profiler.start(interval_ms / 1000 if interval_ms else None)
+    else:
+        profiler.stop()
+    return profiler.stats()
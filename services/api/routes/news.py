@@ -1,37 +1,40 @@
-from fastapi import APIRouter
-from database import get_db
+from fastapi import APIRouter, Query
+from functools import partial
+from typing import Literal, Optional
+from repositories import article_repo
+from cache import response_cache
+from admission import admission
+from pagination import ListFormat, MAX_PAGE_SIZE, cursor_headers, decode_cursor, ndjson_response
+from serialization import article_encoder
 from models import Article
 
 router = APIRouter()
 
+response_cache.route("/api/news/sentiment", "articles")
+admission.route("/api/news/sentiment", "analytics")
+
 @router.get("/api/news", response_model=list[Article])
-async def get_news(limit: int = 20):
-    """Get latest trade-related news articles"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, title, source, url, summary, sentiment, published_at FROM articles ORDER BY published_at DESC LIMIT ?', (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [dict(row) for row in rows]
+async def get_news(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    format: ListFormat = "json",
+):
+    """Get latest trade-related news articles, paged like /api/events"""
+    position = decode_cursor(cursor)
+    if format == "ndjson":
+        return ndjson_response(partial(article_repo.page, raw=True), position, limit, key="published_at", encoder=article_encoder)
+    limit = min(limit or 20, MAX_PAGE_SIZE)
+    rows = await article_repo.page(limit, position, raw=True)
+    return article_encoder.response(rows, headers=cursor_headers(rows, limit, key="published_at"))
 
 @router.get("/api/news/sentiment")
-async def get_sentiment_analysis():
-    """Get overall market sentiment from articles"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT sentiment FROM articles WHERE sentiment IS NOT NULL')
-    rows = cursor.fetchall()
-    conn.close()
-    
-    if not rows:
-        return {"avg_sentiment": 0.5, "articles_count": 0}
-    
-    sentiments = [row[0] for row in rows]
-    avg_sentiment = sum(sentiments) / len(sentiments)
-    
-    return {
-        "avg_sentiment": round(avg_sentiment, 2),
-        "articles_count": len(sentiments),
-        "sentiment_trend": "positive" if avg_sentiment > 0.6 else "negative" if avg_sentiment < 0.4 else "neutral"
-    }
+async def get_sentiment_analysis(
+    window: Optional[Literal["24h", "7d", "30d"]] = None,
+    half_life: Optional[float] = Query(None, gt=0, description="Hours; adds an exponentially decayed score"),
+):
+    """Get market sentiment from articles, overall and per source.
+
+    Served from hourly and daily buckets maintained on article writes;
+    without `window` every article counts.
+    """
+    return await article_repo.sentiment(window, half_life)
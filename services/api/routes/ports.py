@@ -1,49 +1,98 @@
-from fastapi import APIRouter
-from database import get_db
-from models import Port
+from fastapi import APIRouter, HTTPException, Query, Response
+from functools import partial
+from typing import Optional, Union
+from repositories import port_repo, event_repo, sku_repo
+from sku_index import sku_index
+from cache import response_cache, row
+from pagination import ListFormat, MAX_PAGE_SIZE, cursor_headers, decode_cursor, ndjson_response
+from serialization import dumps, event_encoder, port_encoder
+from models import NearbyPort, Port, PortMap
 
 router = APIRouter()
 
-@router.get("/api/ports", response_model=list[Port])
-async def get_ports():
-    """Get all ports with current risk scores"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, name, country, latitude, longitude, risk_score, active_events FROM ports')
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [dict(row) for row in rows]
+response_cache.route("/api/ports", "ports")
+response_cache.route("/api/ports/{port_id}", row("ports", "port_id"))
+response_cache.route("/api/ports/{port_id}/skus", row("ports", "port_id"), "skus")
+
+def parse_bbox(bbox: str) -> tuple:
+    """"min_lon,min_lat,max_lon,max_lat"; min_lon > max_lon crosses the antimeridian"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise HTTPException(status_code=400, detail="bbox needs longitudes in -180..180 and -90 <= min_lat <= max_lat <= 90")
+    return min_lon, min_lat, max_lon, max_lat
+
+@router.get("/api/ports", response_model=Union[list[Port], PortMap])
+async def get_ports(bbox: Optional[str] = None, zoom: Optional[int] = Query(None, ge=0, le=22)):
+    """Get all ports with current risk scores.
+
+    With `bbox` only the ports inside it are returned; adding a map `zoom`
+    below 12 merges ports that share a grid cell into clusters.
+    """
+    if bbox is None:
+        return port_encoder.response(await port_repo.all(raw=True))
+    visible = await port_repo.viewport(parse_bbox(bbox), zoom)
+    body = {"ports": port_encoder.objects(visible["ports"]), "clusters": visible["clusters"]}
+    return Response(dumps(body), media_type="application/json")
+
+@router.get("/api/ports/near", response_model=list[NearbyPort])
+async def get_ports_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=20_040),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Ports within `radius_km` great-circle distance of a point, nearest first"""
+    return await port_repo.near(lat, lon, radius_km, limit)
 
 @router.get("/api/ports/{port_id}", response_model=Port)
 async def get_port(port_id: int):
     """Get specific port details"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, name, country, latitude, longitude, risk_score, active_events FROM ports WHERE id = ?', (port_id,))
-    row = cursor.fetchone()
-    conn.close()
+    port = await port_repo.get(port_id)
     
-    if row:
-        return dict(row)
+    if port:
+        return port
     return {"error": "Port not found"}
 
 @router.get("/api/ports/{port_id}/events")
-async def get_port_events(port_id: int):
-    """Get events for a specific port"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
+async def get_port_events(
+    port_id: int,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    format: ListFormat = "json",
+):
+    """Get events for a specific port, newest first.
+
+    JSON pages default to 100 rows (at most MAX_PAGE_SIZE) and return the
+    next page's cursor in the X-Next-Cursor header, as /api/events does;
+    `format=ndjson` streams the port's full history from the cursor.
+    """
+    position = decode_cursor(cursor)
     # Get port name first
-    cursor.execute('SELECT name FROM ports WHERE id = ?', (port_id,))
-    port = cursor.fetchone()
+    port = await port_repo.get(port_id)
+    
+    if not port:
+        return {"error": "Port not found"}
+    
+    fetch_page = partial(event_repo.page, port=port['name'])
+    if format == "ndjson":
+        return ndjson_response(partial(fetch_page, raw=True), position, limit, encoder=event_encoder)
+    
+    limit = min(limit or 100, MAX_PAGE_SIZE)
+    rows = await fetch_page(limit, position, raw=True)
+    body = {"port": port['name'], "events": event_encoder.objects(rows)}
+    return Response(dumps(body), media_type="application/json", headers=cursor_headers(rows, limit))
+
+@router.get("/api/ports/{port_id}/skus")
+async def get_port_skus(port_id: int):
+    """Get SKUs routed through a specific port, highest risk first"""
+    port = await port_repo.get(port_id)
     
     if not port:
         return {"error": "Port not found"}
     
-    # Get events for this port
-    cursor.execute('SELECT * FROM events WHERE port = ? ORDER BY timestamp DESC', (port['name'],))
-    events = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    skus = await sku_repo.by_ids(sku_index.skus_for(port['name']))
     
-    return {"port": port['name'], "events": events}
+    return {"port": port['name'], "skus": skus}
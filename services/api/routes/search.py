@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Literal, Optional
+from repositories import search_repo
+from cache import response_cache
+from admission import admission
+from fulltext import SCOPES, match_query
+from models import SearchResults
+
+router = APIRouter()
+
+MAX_RESULTS = 100
+DATE = r"^\d{4}-\d{2}-\d{2}"
+
+response_cache.route("/api/search", "events", "articles")
+admission.route("/api/search", "analytics")
+
+@router.get("/api/search", response_model=SearchResults)
+async def search(
+    q: str = Query(..., min_length=1, max_length=256),
+    scope: Optional[Literal["events", "articles"]] = None,
+    port: Optional[str] = None,
+    commodity: Optional[str] = None,
+    since: Optional[str] = Query(None, pattern=DATE),
+    until: Optional[str] = Query(None, pattern=DATE),
+    limit: int = Query(20, ge=1, le=MAX_RESULTS),
+    offset: int = Query(0, ge=0, le=1000),
+):
+    """Full-text search over event and article titles and summaries.
+
+    Every word must match (stemmed; "quoted phrases" and prefix* terms are
+    supported). Results are ranked by BM25 with highlighted snippets; `since`
+    and `until` are inclusive dates or timestamps.
+    """
+    match = match_query(q)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Query has no searchable terms")
+    scopes = (scope,) if scope else SCOPES
+    results = await search_repo.search(match, scopes, port, commodity, since, until, limit, offset)
+    return {"query": q, "results": results}
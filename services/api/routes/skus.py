@@ -1,28 +1,27 @@
 from fastapi import APIRouter
-from database import get_db
+from typing import Optional
+from repositories import sku_repo
+from sku_index import sku_index
+from cache import response_cache, row
+from serialization import sku_encoder
 from models import SKU
 
 router = APIRouter()
 
+response_cache.route("/api/sku", "skus")
+response_cache.route("/api/sku/{sku_id}", row("skus", "sku_id"))
+
 @router.get("/api/sku", response_model=list[SKU])
-async def get_skus():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM skus ORDER BY risk_level DESC')
-    rows = cursor.fetchall()
-    conn.close()
-    
-    skus = [dict(row) for row in rows]
-    return skus
+async def get_skus(port: Optional[str] = None):
+    """All SKUs by risk, or only those routed through `port`"""
+    if port is not None:
+        return sku_encoder.response(await sku_repo.by_ids(sku_index.skus_for(port), raw=True))
+    return sku_encoder.response(await sku_repo.all(raw=True))
 
 @router.get("/api/sku/{sku_id}", response_model=SKU)
 async def get_sku(sku_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM skus WHERE id = ?', (sku_id,))
-    row = cursor.fetchone()
-    conn.close()
+    sku = await sku_repo.get(sku_id)
     
-    if row:
-        return dict(row)
+    if sku:
+        return sku
     return {"error": "SKU not found"}
@@ -1,65 +1,80 @@
-from fastapi import APIRouter, WebSocket
-from datetime import datetime, timedelta
-import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Optional
 import asyncio
-import random
-from database import get_db
-from models import Event
+from broker import broker, connection_message, reset_message, SlowConsumer, MAX_REPLAY
+from repositories import change_repo
 
 router = APIRouter()
 
-# Store active WebSocket connections
-active_connections: list[WebSocket] = []
+def _split(value: Optional[str]):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
 
 @router.websocket("/ws/events")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time event streaming"""
+async def websocket_endpoint(
+    websocket: WebSocket,
+    ports: Optional[str] = None,
+    commodities: Optional[str] = None,
+    min_severity: Optional[float] = None,
+    since: Optional[int] = None,
+):
+    """WebSocket endpoint for real-time event streaming.
+
+    Optional comma-separated `ports` / `commodities` and a `min_severity`
+    threshold limit the stream to relevant events. Event changes carry a
+    sequence number `seq`; a client reconnecting with `since=<last seq>`
+    first gets the matching changes it missed, or a `reset` message when
+    they are no longer retained. Events ingested together arrive as one
+    `batch` message with an `events` list. A client too slow to take every
+    change is closed with code 1013 instead of skipping one, and resumes
+    with `since`.
+    """
     await websocket.accept()
-    active_connections.append(websocket)
+    # Subscribed before the replay is read, so nothing falls between the two
+    subscription = broker.subscribe(websocket, _split(ports), _split(commodities), min_severity)
     
+    sender = receiver = None
     try:
         # Send initial connection message
-        await websocket.send_json({
-            "type": "connection",
-            "message": "Connected to TradeGuardAI event stream",
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        await websocket.send_json(connection_message(broker.delivered_seq))
+        if since is not None:
+            await _replay(websocket, subscription, since)
         
-        # Simulate real-time event streaming every 15 seconds
-        while True:
-            await asyncio.sleep(15)
-            
-            # Get random event from database
-            conn = get_db()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM events ORDER BY RANDOM() LIMIT 1')
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                event_data = {
-                    "type": "event",
-                    "id": row[0],
-                    "title": row[1],
-                    "summary": row[2],
-                    "severity": row[3],
-                    "port": row[4],
-                    "commodity": row[5],
-                    "timestamp": row[10]  # timestamp is at index 10
-                }
-                
-                # Broadcast to all connected clients
-                await broadcast_event(event_data)
+        # Events are produced once by the broker and fanned out to every subscriber
+        sender = asyncio.create_task(broker.serve(subscription))
+        receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
     
+    except SlowConsumer as e:
+        print(f"[v0] Disconnecting slow WebSocket client: {e}")
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print(f"[v0] WebSocket error: {e}")
     finally:
-        active_connections.remove(websocket)
+        broker.unsubscribe(subscription)
+        for task in (sender, receiver):
+            if task is not None:
+                task.cancel()
+
+async def _replay(websocket: WebSocket, subscription, since: int):
+    changes, latest = await change_repo.since(since, MAX_REPLAY + 1)
+    if changes is None or len(changes) > MAX_REPLAY:
+        await websocket.send_json(reset_message(latest))
+        return
+    for message in changes:
+        if subscription.wants(message):
+            await websocket.send_json(message)
+    subscription.replayed = changes[-1]["seq"] if changes else since
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
 
 async def broadcast_event(event: dict):
     """Broadcast event to all connected WebSocket clients"""
-    for connection in active_connections:
-        try:
-            await connection.send_json(event)
-        except Exception as e:
-            print(f"[v0] Failed to send event to client: {e}")
+    broker.publish(event)
@@ -83,6 +83,36 @@ SKUS_DATA = [
     {"name": "Pharmaceutical Products", "commodity": "Pharmaceuticals", "ports": "Dubai,Rotterdam,Singapore"}
 ]
 
+PORTS_DATA = [
+    {"name": "Shanghai", "country": "China", "latitude": 31.23, "longitude": 121.47},
+    {"name": "Singapore", "country": "Singapore", "latitude": 1.26, "longitude": 103.84},
+    {"name": "Hong Kong", "country": "Hong Kong", "latitude": 22.29, "longitude": 114.16},
+    {"name": "Rotterdam", "country": "Netherlands", "latitude": 51.95, "longitude": 4.14},
+    {"name": "Hamburg", "country": "Germany", "latitude": 53.54, "longitude": 9.97},
+    {"name": "Dubai", "country": "United Arab Emirates", "latitude": 25.27, "longitude": 55.29},
+    {"name": "Suez", "country": "Egypt", "latitude": 29.97, "longitude": 32.55},
+    {"name": "Los Angeles", "country": "United States", "latitude": 33.74, "longitude": -118.26},
+    {"name": "Panama City", "country": "Panama", "latitude": 8.95, "longitude": -79.56},
+    {"name": "Santos", "country": "Brazil", "latitude": -23.96, "longitude": -46.33}
+]
+
+def seed_ports(conn):
+    """Seed reference ports if none exist, scored from their current events"""
+    cursor = conn.cursor()
+    if cursor.execute('SELECT 1 FROM ports LIMIT 1').fetchone():
+        return
+    
+    for port in PORTS_DATA:
+        count, avg_severity = cursor.execute(
+            'SELECT COUNT(*), AVG(severity) FROM events WHERE port = ?', (port["name"],)
+        ).fetchone()
+        cursor.execute('''
+            INSERT INTO ports (name, country, latitude, longitude, risk_score, active_events)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (port["name"], port["country"], port["latitude"], port["longitude"], round(avg_severity or 0, 2), count))
+    
+    conn.commit()
+
 def seed_database(conn):
     """Seed database with initial trade data"""
     cursor = conn.cursor()
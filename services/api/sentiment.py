@@ -0,0 +1,118 @@
+import math
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional
+
+WINDOWS = {"24h": timedelta(hours=24), "7d": timedelta(days=7), "30d": timedelta(days=30)}
+POSITIVE = 0.6
+NEGATIVE = 0.4
+
+# (table, bucket column, length of the published_at prefix that keys it)
+BUCKETS = (("article_sentiment_hourly", "hour", 13), ("article_sentiment_daily", "date", 10))
+
+SENTIMENT_TABLES = [
+    f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {column} TEXT NOT NULL,
+            source TEXT NOT NULL,
+            article_count INTEGER NOT NULL,
+            sentiment_sum REAL NOT NULL,
+            PRIMARY KEY ({column}, source)
+        ) WITHOUT ROWID
+    '''
+    for table, column, _ in BUCKETS
+]
+
+def _add(row: str) -> str:
+    return "".join(f'''
+        INSERT INTO {table} ({column}, source, article_count, sentiment_sum)
+        SELECT substr({row}.published_at, 1, {length}), {row}.source, 1, {row}.sentiment WHERE {row}.sentiment IS NOT NULL
+        ON CONFLICT({column}, source) DO UPDATE SET
+            article_count = article_count + 1,
+            sentiment_sum = sentiment_sum + excluded.sentiment_sum;''' for table, column, length in BUCKETS)
+
+def _remove(row: str) -> str:
+    return "".join(f'''
+        UPDATE {table} SET article_count = article_count - 1, sentiment_sum = sentiment_sum - {row}.sentiment
+        WHERE {row}.sentiment IS NOT NULL AND {column} = substr({row}.published_at, 1, {length}) AND source = {row}.source;
+        DELETE FROM {table} WHERE {column} = substr({row}.published_at, 1, {length}) AND source = {row}.source AND article_count <= 0;'''
+        for table, column, length in BUCKETS)
+
+SENTIMENT_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS articles_sentiment_insert AFTER INSERT ON articles BEGIN{_add('NEW')}\n    END",
+    f"CREATE TRIGGER IF NOT EXISTS articles_sentiment_delete AFTER DELETE ON articles BEGIN{_remove('OLD')}\n    END",
+    f"CREATE TRIGGER IF NOT EXISTS articles_sentiment_update AFTER UPDATE OF sentiment, source, published_at ON articles BEGIN{_remove('OLD')}{_add('NEW')}\n    END",
+]
+
+def backfill(conn: sqlite3.Connection):
+    """Recompute the hourly and daily buckets from the articles table"""
+    for table, column, length in BUCKETS:
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'''
+            INSERT INTO {table} ({column}, source, article_count, sentiment_sum)
+            SELECT substr(published_at, 1, {length}), source, COUNT(*), SUM(sentiment)
+            FROM articles WHERE sentiment IS NOT NULL GROUP BY 1, 2
+        ''')
+
+def _midpoint(bucket: str) -> Optional[datetime]:
+    try:
+        if len(bucket) == 13:
+            return datetime.fromisoformat(bucket + ":30")
+        return datetime.fromisoformat(bucket[:10]) + timedelta(hours=12)
+    except ValueError:
+        return None
+
+def _summary(count: int, total: float, weight: float, weighted: float, decayed: bool) -> dict:
+    average = total / count
+    summary = {
+        "avg_sentiment": round(average, 2),
+        "articles_count": count,
+        "sentiment_trend": "positive" if average > POSITIVE else "negative" if average < NEGATIVE else "neutral",
+    }
+    if decayed:
+        summary["decayed_sentiment"] = round(weighted / weight, 2) if weight else None
+    return summary
+
+def aggregate(conn: sqlite3.Connection, window: Optional[str] = None, half_life: Optional[float] = None,
+              now: datetime = None) -> dict:
+    """Average sentiment over `window` (all time if None), overall and per source.
+
+    Reads at most 24 hourly buckets for the partial first day and daily
+    buckets after it, so the cost is O(buckets) rather than O(articles).
+    With `half_life` (hours) each bucket is also weighted by
+    2^(-age / half_life) at its midpoint for `decayed_sentiment`.
+    """
+    now = now or datetime.utcnow()
+    if window is None:
+        rows = conn.execute('SELECT date, source, article_count, sentiment_sum FROM article_sentiment_daily').fetchall()
+    else:
+        since = now - WINDOWS[window]
+        next_day = (since.date() + timedelta(days=1)).isoformat()
+        rows = conn.execute('''
+            SELECT hour, source, article_count, sentiment_sum FROM article_sentiment_hourly WHERE hour >= ? AND hour < ?
+            UNION ALL
+            SELECT date, source, article_count, sentiment_sum FROM article_sentiment_daily WHERE date >= ?
+        ''', (since.strftime("%Y-%m-%dT%H"), next_day, next_day)).fetchall()
+
+    totals = {}
+    for bucket, source, count, total in rows:
+        weight = 1.0
+        if half_life is not None:
+            midpoint = _midpoint(bucket)
+            age = max((now - midpoint).total_seconds() / 3600, 0.0) if midpoint else 0.0
+            weight = math.pow(2.0, -age / half_life)
+        for key in (None, source):
+            entry = totals.setdefault(key, [0, 0.0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += total
+            entry[2] += weight * count
+            entry[3] += weight * total
+
+    overall = totals.pop(None, None)
+    if overall is None:
+        return {"window": window, "avg_sentiment": 0.5, "articles_count": 0, "sources": []}
+    sources = [
+        {"source": source, **_summary(*entry, half_life is not None)}
+        for source, entry in sorted(totals.items(), key=lambda item: -item[1][0])
+    ]
+    return {"window": window, **_summary(*overall, half_life is not None), "sources": sources}
@@ -0,0 +1,105 @@
+import json
+import os
+import time
+import typing
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from models import Event, SKU, Port, Article
+from metrics import serialize_duration
+
+# Validate fast-path payloads against their models, for development
+VALIDATE_RESPONSES = os.getenv("TRADEGUARD_VALIDATE_RESPONSES", "0") == "1"
+
+def decode_tags(tags):
+    """Tags column as a list: JSON arrays, with comma lists from older rows"""
+    if not isinstance(tags, str):
+        return tags
+    try:
+        decoded = json.loads(tags)
+    except ValueError:
+        decoded = None
+    if isinstance(decoded, list):
+        return [str(tag) for tag in decoded]
+    return [tag.strip() for tag in tags.split(",") if tag.strip()]
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON, byte-identical to FastAPI's JSONResponse rendering"""
+    # The same encoder and options as JSONResponse.render, so bodies (and
+    # their ETags) match however they were produced
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+def _float(value):
+    return None if value is None else float(value)
+
+def _int(value):
+    return None if value is None else int(value)
+
+def _coercer(annotation):
+    # Optional[X] -> X
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+        annotation = args[0]
+    if annotation is float:
+        return _float
+    if annotation is int:
+        return _int
+    return None
+
+class ModelEncoder:
+    """Encodes sqlite rows (or dicts) as a JSON list of `model` without building models.
+
+    Fields are emitted in model order with the same numeric coercions
+    pydantic applies (an integer REAL column still renders as 1.0), so the
+    bytes match what response_model validation would have produced. Columns
+    the model does not declare are dropped; `converters` override per field.
+    """
+
+    def __init__(self, model: type[BaseModel], converters: dict = None):
+        self.model = model
+        self.fields = []
+        for name, field in model.model_fields.items():
+            convert = (converters or {}).get(name) or _coercer(field.annotation)
+            self.fields.append((name, convert, None if field.is_required() else field.get_default()))
+        self._adapter = TypeAdapter(list[model])
+
+    def objects(self, rows) -> list[dict]:
+        if not rows:
+            return []
+        columns = {key: index for index, key in enumerate(rows[0].keys())}
+        # Resolve column positions once per result set rather than per row
+        plan = [(name, columns.get(name), convert, default) for name, convert, default in self.fields]
+        if isinstance(rows[0], dict):
+            plan = [(name, name if index is not None else None, convert, default) for name, index, convert, default in plan]
+        objects = []
+        append = objects.append
+        for row in rows:
+            obj = {}
+            for name, index, convert, default in plan:
+                value = default if index is None else row[index]
+                obj[name] = convert(value) if convert is not None and value is not None else value
+            append(obj)
+        return objects
+
+    def encode(self, rows) -> bytes:
+        started = time.perf_counter()
+        objects = self.objects(rows)
+        if VALIDATE_RESPONSES:
+            self._adapter.validate_python(objects)
+        body = dumps(objects)
+        serialize_duration.observe(time.perf_counter() - started, self.model.__name__)
+        return body
+
+    def encode_lines(self, rows) -> bytes:
+        """NDJSON: one object per line"""
+        started = time.perf_counter()
+        body = b"".join(dumps(obj) + b"\n" for obj in self.objects(rows))
+        serialize_duration.observe(time.perf_counter() - started, self.model.__name__)
+        return body
+
+    def response(self, rows, headers: dict = None) -> Response:
+        return Response(content=self.encode(rows), media_type="application/json", headers=headers)
+
+event_encoder = ModelEncoder(Event, converters={"tags": decode_tags})
+sku_encoder = ModelEncoder(SKU)
+port_encoder = ModelEncoder(Port)
+article_encoder = ModelEncoder(Article)
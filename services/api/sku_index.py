@@ -0,0 +1,86 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from forecasting import history_end
+
+RISK_WINDOW_DAYS = 30
+
+# skus.ports stays the source of truth; sku_ports follows it via triggers
+# (see migrations). The comma list is quoted as one JSON string, then split
+# into an array so json_each can walk it; json_quote escapes any quotes and
+# backslashes.
+_SPLIT_PORTS = '''json_each('[' || replace(json_quote(coalesce({ports}, '')), ',', '","') || ']')'''
+
+def backfill(conn: sqlite3.Connection):
+    """Populate sku_ports from the comma-separated skus.ports column"""
+    conn.execute('DELETE FROM sku_ports')
+    conn.execute(f'''
+        INSERT OR IGNORE INTO sku_ports (sku_id, port)
+        SELECT skus.id, trim(value) FROM skus, {_SPLIT_PORTS.format(ports="skus.ports")} WHERE trim(value) != ''
+    ''')
+
+def port_risks(conn: sqlite3.Connection, ports, today=None) -> dict:
+    """Mean event severity per port over the RISK_WINDOW_DAYS ending at the last event day.
+
+    Ports without events in the window score 0.
+    """
+    end = history_end(conn, today or datetime.utcnow().date())
+    since = (end - timedelta(days=RISK_WINDOW_DAYS - 1)).isoformat()
+    risks = {}
+    for port in ports:
+        total, count = conn.execute('''
+            SELECT SUM(severity_sum), SUM(event_count) FROM event_daily_rollup_breakdown
+            WHERE dimension = 'port' AND key = ? AND date >= ? AND date <= ?
+        ''', (port, since, end.isoformat())).fetchone()
+        risks[port] = total / count if count else 0.0
+    return risks
+
+class SkuPortIndex:
+    """In-memory port -> SKU inverted index over sku_ports.
+
+    Lets an event at one port update only the SKUs routed through it: each
+    affected SKU's risk_level becomes the mean windowed risk of its ports.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._skus_by_port: dict[str, set[int]] = {}
+        self._ports_by_sku: dict[int, tuple] = {}
+
+    def rebuild(self, conn: sqlite3.Connection):
+        skus_by_port: dict[str, set[int]] = {}
+        ports_by_sku: dict[int, list] = {}
+        for sku_id, port in conn.execute('SELECT sku_id, port FROM sku_ports'):
+            skus_by_port.setdefault(port, set()).add(sku_id)
+            ports_by_sku.setdefault(sku_id, []).append(port)
+        with self._lock:
+            self._skus_by_port = skus_by_port
+            self._ports_by_sku = {sku_id: tuple(ports) for sku_id, ports in ports_by_sku.items()}
+
+    def skus_for(self, port: str) -> list[int]:
+        with self._lock:
+            return sorted(self._skus_by_port.get(port, ()))
+
+    def affected(self, ports) -> dict[int, tuple]:
+        """SKUs routed through any of `ports`, with each SKU's full port list"""
+        with self._lock:
+            sku_ids = set().union(*(self._skus_by_port.get(port, ()) for port in ports))
+            return {sku_id: self._ports_by_sku[sku_id] for sku_id in sku_ids}
+
+    def propagate(self, conn: sqlite3.Connection, ports) -> list[int]:
+        """Recompute risk_level for SKUs exposed to `ports` and return their ids; the caller commits"""
+        affected = self.affected(ports)
+        if not affected:
+            return []
+        risks = port_risks(conn, set().union(*affected.values()))
+        conn.executemany('UPDATE skus SET risk_level = ? WHERE id = ?', [
+            (round(sum(risks[port] for port in sku_ports) / len(sku_ports), 2), sku_id)
+            for sku_id, sku_ports in affected.items()
+        ])
+        return list(affected)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ports": len(self._skus_by_port), "skus": len(self._ports_by_sku)}
+
+sku_index = SkuPortIndex()
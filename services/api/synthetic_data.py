@@ -0,0 +1,336 @@
+"""Generate a large, reproducible TradeGuard database for load testing.
+
+Usage: python synthetic_data.py OUTPUT.db [--seed 42] [--events 1000000] [--ports 200]
+                                [--skus 5000] [--articles 100000] [--days 365] [--end 2025-06-01]
+
+The same seed and scale parameters always produce the same rows (--end
+defaults to today, so pass it too for byte-identical timestamps). Events
+come in bursty incidents: each incident hits one port (ports are
+Zipf-popular) and one commodity (skewed towards a few), and posts a
+geometric number of updates hours apart whose severity fades from the
+incident's peak. Rows are generated a block of days at a time and inserted
+with batched executemany, so memory stays bounded by --batch-size.
+
+While loading, the indexes and triggers on the loaded tables are dropped
+(as listed in sqlite_master) and journaling is off; afterwards the indexes
+are recreated, every derived table is rebuilt with the same backfills the
+migrations use (port risk scored as of --end), and the triggers are restored.
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+import facets
+import fulltext
+import geo
+import port_risk
+import rollups
+import sentiment
+import sku_index
+from migrations import migrate
+from seed_data import PORTS_DATA
+
+LOAD_TABLES = ("events", "articles", "skus", "ports")
+
+BULK_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA locking_mode=EXCLUSIVE",
+    # Index builds sort through temp files, keeping memory flat as rows grow
+    "PRAGMA temp_store=FILE",
+    "PRAGMA cache_size=-131072",
+)
+
+# Derived tables, rebuilt in dependency order once the base tables are loaded
+BACKFILLS = (
+    sku_index.backfill,
+    rollups.backfill,
+    fulltext.backfill,
+    facets.backfill,
+    sentiment.backfill,
+    geo.backfill,
+)
+
+REGIONS = {
+    # region: (min_lat, max_lat, min_lon, max_lon) for synthetic ports
+    "Asia": (-10.0, 40.0, 95.0, 145.0),
+    "Europe": (36.0, 60.0, -10.0, 30.0),
+    "Middle East": (12.0, 30.0, 32.0, 58.0),
+    "North America": (25.0, 50.0, -125.0, -70.0),
+    "Latin America": (-40.0, 20.0, -90.0, -35.0),
+    "Africa": (-35.0, 30.0, -15.0, 40.0),
+    "Oceania": (-45.0, -10.0, 110.0, 178.0),
+}
+REAL_PORT_REGIONS = {
+    "Shanghai": "Asia", "Singapore": "Asia", "Hong Kong": "Asia", "Rotterdam": "Europe", "Hamburg": "Europe",
+    "Dubai": "Middle East", "Suez": "Middle East", "Los Angeles": "North America",
+    "Panama City": "Latin America", "Santos": "Latin America",
+}
+
+# Share of incidents per commodity
+COMMODITIES = {
+    "Electronics": 0.26, "Oil": 0.18, "Grains": 0.12, "Auto Parts": 0.10, "Pharmaceuticals": 0.07, "Steel": 0.07,
+    "Chemicals": 0.06, "LNG": 0.05, "Textiles": 0.04, "Coal": 0.03, "Fertilizers": 0.02,
+}
+
+# kind: (title, summary template, share of incidents, beta parameters of the peak severity)
+INCIDENTS = {
+    "strike": ("Port Strike", "Dock workers at {port} walked out, halting {commodity} cargo handling.", 0.12, (5, 3)),
+    "weather": ("Severe Weather", "A storm system near {port} suspended berthing; {commodity} vessels are waiting offshore.", 0.20, (3, 3)),
+    "congestion": ("Vessel Congestion", "Queues at {port} lengthened as {commodity} arrivals outpaced yard capacity.", 0.25, (2, 4)),
+    "outage": ("Terminal System Outage", "A terminal operating system failure at {port} disrupted {commodity} gate moves.", 0.10, (3, 4)),
+    "customs": ("Customs Backlog", "New inspection rules at {port} left {commodity} containers awaiting clearance.", 0.13, (2, 5)),
+    "accident": ("Vessel Collision", "Two ships collided in the {port} approach channel, closing a lane to {commodity} traffic.", 0.06, (6, 2)),
+    "maintenance": ("Crane Maintenance", "Unplanned crane repairs at {port} cut {commodity} handling capacity.", 0.10, (2, 6)),
+    "security": ("Security Alert", "Security checks at {port} slowed {commodity} cargo movements.", 0.04, (4, 3)),
+}
+DETAILS = (
+    "Carriers are rerouting some services.", "Operators expect delays of several days.",
+    "Freight rates on the lane rose sharply.", "Authorities said operations will resume gradually.",
+    "Shippers reported missed connections.", "Insurers are monitoring the situation.",
+    "Yard utilisation is above ninety percent.", "Feeder schedules have been revised.",
+)
+SOURCES = ("Reuters", "Bloomberg", "Lloyd's List", "Journal of Commerce", "Splash247", "TradeWinds", "gCaptain", "FreightWaves")
+# Mean updates per incident and mean hours between them
+MEAN_UPDATES = 4.0
+UPDATE_GAP_HOURS = 5.0
+PORT_ZIPF = 1.1
+
+def _zipf_weights(count: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+def _timestamps(seconds: np.ndarray, epoch: datetime) -> list[str]:
+    values = np.datetime64(epoch, "s") + seconds.astype("timedelta64[s]")
+    return [value + "Z" for value in np.datetime_as_string(values, unit="s").tolist()]
+
+def generate_ports(rng: np.random.Generator, count: int) -> list[tuple]:
+    """The reference ports first, then synthetic ones spread over the regions"""
+    rows = [(port["name"], port["country"], port["latitude"], port["longitude"], REAL_PORT_REGIONS[port["name"]])
+            for port in PORTS_DATA[:count]]
+    regions = list(REGIONS)
+    for index in range(len(rows), count):
+        region = regions[rng.integers(len(regions))]
+        min_lat, max_lat, min_lon, max_lon = REGIONS[region]
+        rows.append((f"Port {index:05d}", f"{region} Country {rng.integers(1, 40)}",
+                     round(float(rng.uniform(min_lat, max_lat)), 4), round(float(rng.uniform(min_lon, max_lon)), 4), region))
+    return rows
+
+def generate_events(rng: np.random.Generator, ports: list[tuple], count: int, start: datetime, days: int, batch_size: int):
+    """Yield batches of event rows in (roughly) time order, totalling `count`"""
+    port_weights = _zipf_weights(len(ports), PORT_ZIPF)
+    commodities = list(COMMODITIES)
+    commodity_weights = np.array(list(COMMODITIES.values())) / sum(COMMODITIES.values())
+    kinds = list(INCIDENTS)
+    kind_weights = np.array([INCIDENTS[kind][2] for kind in kinds]) / sum(INCIDENTS[kind][2] for kind in kinds)
+    tags = {(kind, commodity, region): f'["{kind}","{commodity.lower()}","{region.lower()}"]'
+            for kind in kinds for commodity in commodities for region in REGIONS}
+
+    span = days * 86400.0
+    incidents_per_second = count / MEAN_UPDATES / span
+    shape = np.array([INCIDENTS[kind][3] for kind in kinds], dtype=float)
+    # Blocks of about batch_size events, sorted by time within each; late
+    # updates of an incident may land behind the next block's first rows
+    events_per_second = count / span
+    produced, incident_id, block_start = 0, 0, 0.0
+    while produced < count:
+        # The last block only spans the time its remaining events need
+        block = max(min(batch_size, count - produced) / events_per_second, 60.0)
+        incidents = max(int(rng.poisson(incidents_per_second * block)), 1)
+        # Should the rate undershoot, further incidents crowd into the last block
+        starts = min(block_start, max(span - block, 0.0)) + rng.uniform(0, block, incidents)
+        sizes = rng.geometric(1 / MEAN_UPDATES, incidents)
+        incident_ports = rng.choice(len(ports), incidents, p=port_weights)
+        incident_commodities = rng.choice(len(commodities), incidents, p=commodity_weights)
+        incident_kinds = rng.choice(len(kinds), incidents, p=kind_weights)
+        peaks = rng.beta(shape[incident_kinds, 0], shape[incident_kinds, 1])
+        incident_sources = rng.integers(len(SOURCES), size=incidents)
+
+        # One row per update: index of its incident and its position within it
+        owner = np.repeat(np.arange(incidents), sizes)
+        first = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        update = np.arange(len(owner)) - first[owner]
+        gaps = rng.exponential(UPDATE_GAP_HOURS * 3600, len(owner))
+        gaps[first] = 0.0
+        elapsed = np.cumsum(gaps)
+        offsets = elapsed - elapsed[first][owner]
+        seconds = np.minimum(starts[owner] + offsets, span - 1)
+        severities = np.clip(peaks[owner] * 0.9 ** update + rng.normal(0, 0.04, len(owner)), 0.05, 1.0).round(2)
+        sentiments = np.clip(1.0 - severities + rng.normal(0, 0.1, len(owner)), 0.0, 1.0).round(2)
+        details = rng.integers(len(DETAILS), size=len(owner))
+
+        order = np.argsort(seconds, kind="stable")[:count - produced]
+        owners = owner[order]
+        rows = []
+        # Columns as Python lists first: indexing numpy scalars row by row is slow
+        for incident, port, kind, commodity, source, step, detail, severity, sentiment, timestamp in zip(
+            (owners + incident_id).tolist(), incident_ports[owners].tolist(), incident_kinds[owners].tolist(),
+            incident_commodities[owners].tolist(), incident_sources[owners].tolist(), update[order].tolist(),
+            details[order].tolist(), severities[order].tolist(), sentiments[order].tolist(), _timestamps(seconds[order], start),
+        ):
+            name, _, _, _, region = ports[port]
+            kind, commodity = kinds[kind], commodities[commodity]
+            title, template = INCIDENTS[kind][:2]
+            rows.append((
+                f"{name} {title} #{incident}" + (f" - update {step}" if step else ""),
+                template.format(port=name, commodity=commodity) + " " + DETAILS[detail],
+                severity, name, commodity, region, SOURCES[source], sentiment, tags[kind, commodity, region], timestamp,
+            ))
+        produced += len(rows)
+        incident_id += incidents
+        block_start += block
+        yield rows
+
+def generate_skus(rng: np.random.Generator, ports: list[tuple], count: int, batch_size: int):
+    port_weights = _zipf_weights(len(ports), PORT_ZIPF)
+    commodities = list(COMMODITIES)
+    commodity_weights = np.array(list(COMMODITIES.values())) / sum(COMMODITIES.values())
+    for offset in range(0, count, batch_size):
+        size = min(batch_size, count - offset)
+        chosen = rng.choice(len(commodities), size, p=commodity_weights)
+        routes = rng.integers(1, min(4, len(ports)) + 1, size=size)
+        risks = rng.uniform(0.2, 0.85, size).round(2)
+        # Up to four ports per SKU, drawn by popularity; repeats collapse
+        picks = rng.choice(len(ports), (size, 4), p=port_weights).tolist()
+        rows = []
+        for index, (commodity, route, picked, risk) in enumerate(zip(chosen.tolist(), routes.tolist(), picks, risks.tolist()), offset):
+            commodity = commodities[commodity]
+            rows.append((f"{commodity} SKU {index:07d}", commodity,
+                         ",".join(ports[port][0] for port in dict.fromkeys(picked[:route])), risk))
+        yield rows
+
+def generate_articles(rng: np.random.Generator, ports: list[tuple], count: int, start: datetime, days: int, batch_size: int):
+    port_weights = _zipf_weights(len(ports), PORT_ZIPF)
+    kinds = list(INCIDENTS)
+    commodities = list(COMMODITIES)
+    # Each source leans a little positive or negative
+    bias = rng.normal(0, 0.08, len(SOURCES))
+    span = days * 86400.0
+    for offset in range(0, count, batch_size):
+        size = min(batch_size, count - offset)
+        # Evenly advancing slices of the history, sorted within each batch
+        seconds = np.sort(rng.uniform(offset / count * span, min(offset + size, count) / count * span, size))
+        timestamps = _timestamps(seconds, start)
+        chosen_ports = rng.choice(len(ports), size, p=port_weights)
+        chosen_kinds = rng.integers(len(kinds), size=size)
+        chosen_commodities = rng.integers(len(commodities), size=size)
+        sources = rng.integers(len(SOURCES), size=size)
+        sentiments = np.clip(rng.beta(4, 4, size) + bias[sources], 0.0, 1.0).round(2)
+        details = rng.integers(len(DETAILS), size=size)
+        rows = []
+        for index, (port, kind, commodity, source, detail, sentiment, timestamp) in enumerate(zip(
+            chosen_ports.tolist(), chosen_kinds.tolist(), chosen_commodities.tolist(), sources.tolist(),
+            details.tolist(), sentiments.tolist(), timestamps,
+        ), offset):
+            name, kind, commodity = ports[port][0], kinds[kind], commodities[commodity]
+            title, template = INCIDENTS[kind][:2]
+            rows.append((
+                f"{name} {title}: what it means for {commodity}", SOURCES[source], f"https://news.example.com/{index}",
+                template.format(port=name, commodity=commodity) + " " + DETAILS[detail], sentiment, timestamp,
+            ))
+        yield rows
+
+def _load(conn: sqlite3.Connection, sql: str, batches, label: str) -> int:
+    started = time.perf_counter()
+    total = 0
+    for rows in batches:
+        conn.execute('BEGIN')
+        conn.executemany(sql, rows)
+        conn.execute('COMMIT')
+        total += len(rows)
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+    return total
+
+def generate(path: Path, seed: int = 42, events: int = 1_000_000, ports: int = 200, skus: int = 5000,
+             articles: int = 100_000, days: int = 365, end: date = None, batch_size: int = 50_000) -> dict:
+    """Create a migrated database at `path` (which must not exist) and fill it; returns row counts"""
+    end = end or datetime.utcnow().date()
+    start = datetime.combine(end - timedelta(days=days), datetime.min.time())
+    streams = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(4)]
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrate(conn)
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+
+    # Everything maintaining or indexing the base tables is rebuilt after the load
+    deferred = conn.execute(f'''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({", ".join("?" * len(LOAD_TABLES))})
+    ''', LOAD_TABLES).fetchall()
+    for kind, name, _ in deferred:
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+
+    port_rows = generate_ports(streams[0], max(ports, 1))
+    counts = {"ports": _load(conn, 'INSERT INTO ports (name, country, latitude, longitude, risk_score, active_events) VALUES (?, ?, ?, ?, 0, 0)',
+                             [[row[:4] for row in port_rows]], "ports")}
+    counts["events"] = _load(conn, 'INSERT INTO events (title, summary, severity, port, commodity, region, source, sentiment_score, tags, timestamp) '
+                                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             generate_events(streams[1], port_rows, events, start, days, batch_size), "events")
+    counts["skus"] = _load(conn, 'INSERT INTO skus (name, commodity, ports, risk_level) VALUES (?, ?, ?, ?)',
+                           generate_skus(streams[2], port_rows, skus, batch_size), "skus")
+    counts["articles"] = _load(conn, 'INSERT INTO articles (title, source, url, summary, sentiment, published_at) VALUES (?, ?, ?, ?, ?, ?)',
+                               generate_articles(streams[3], port_rows, articles, start, days, batch_size), "articles")
+
+    started = time.perf_counter()
+    for kind, _, sql in deferred:
+        if kind == "index":
+            conn.execute(sql)
+    print(f"indexes: {sum(kind == 'index' for kind, _, _ in deferred)} rebuilt in {time.perf_counter() - started:.1f}s")
+    for backfill in BACKFILLS:
+        started = time.perf_counter()
+        conn.execute('BEGIN')
+        backfill(conn)
+        conn.execute('COMMIT')
+        print(f"{backfill.__module__}: rebuilt in {time.perf_counter() - started:.1f}s")
+    # Scored as of the end of the history rather than the wall clock, so reruns
+    # match; the API's startup recompute brings them up to date
+    conn.execute('BEGIN')
+    port_risk.PortRiskEngine().rebuild(conn, datetime.combine(end, datetime.min.time()))
+    conn.execute('COMMIT')
+    for kind, _, sql in deferred:
+        if kind == "trigger":
+            conn.execute(sql)
+
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA locking_mode=NORMAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.close()
+    return counts
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--ports", type=int, default=200)
+    parser.add_argument("--skus", type=int, default=5000)
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last day of history (default: today)")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--force", action="store_true", help="replace OUTPUT if it exists")
+    args = parser.parse_args()
+
+    if args.output.exists():
+        if not args.force:
+            print(f"{args.output} exists; pass --force to replace it")
+            return 1
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{args.output}{suffix}").unlink(missing_ok=True)
+
+    started = time.perf_counter()
+    counts = generate(args.output, args.seed, args.events, args.ports, args.skus, args.articles, args.days,
+                      args.end, args.batch_size)
+    print(f"generated {', '.join(f'{count:,} {table}' for table, count in counts.items())} "
+          f"in {time.perf_counter() - started:.1f}s -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())